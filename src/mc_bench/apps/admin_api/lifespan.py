@@ -1,6 +1,7 @@
 from contextlib import asynccontextmanager
 
-from mc_bench.events import on_event
+from mc_bench.events import on_events
+from mc_bench.events.stream import register_event_stream
 from mc_bench.events.types import (
     GenerationStateChanged,
     RunStageStateChanged,
@@ -15,9 +16,10 @@ async def lifespan(app):
     session = get_session()
     engine = session.bind
 
-    on_event(RunStageStateChanged, RunStage.state_change_handler)
-    on_event(RunStateChanged, Run.state_change_handler)
-    on_event(GenerationStateChanged, Generation.state_change_handler)
+    on_events(RunStageStateChanged, RunStage.state_change_handler)
+    on_events(RunStateChanged, Run.state_change_handler)
+    on_events(GenerationStateChanged, Generation.state_change_handler)
+    register_event_stream(RunStageStateChanged, RunStateChanged, GenerationStateChanged)
 
     yield
 
@@ -2,6 +2,7 @@ from typing import List, Optional, Union
 
 from fastapi import Depends, HTTPException, Query, status
 from fastapi.routing import APIRouter
+from redis import StrictRedis
 from sqlalchemy import and_, exists, func, select
 from sqlalchemy.orm import Session, selectinload
 
@@ -37,11 +38,17 @@ from mc_bench.models.log import (
     ExperimentalStateRejection,
     PromptObservation,
 )
-from mc_bench.models.prompt import Prompt, PromptExperimentalStateProposal, Tag
+from mc_bench.models.prompt import (
+    Prompt,
+    PromptExperimentalStateProposal,
+    Tag,
+    invalidate_scorable_tag_index,
+)
 from mc_bench.models.user import User
 from mc_bench.server.auth import AuthManager
 from mc_bench.util.logging import get_logger
 from mc_bench.util.postgres import get_managed_session
+from mc_bench.util.redis import RedisDatabase, get_redis_database
 
 logger = get_logger(__name__)
 
@@ -236,6 +243,7 @@ def create_prompt(
     prompt: CreatePromptRequest,
     user_uuid: str = Depends(am.get_current_user_uuid),
     db: Session = Depends(get_managed_session),
+    redis: StrictRedis = Depends(get_redis_database(RedisDatabase.CACHE)),
 ):
     user = db.scalars(select(User).where(User.external_id == user_uuid)).one()
 
@@ -269,6 +277,7 @@ def create_prompt(
         prompt.add_tag(tag, user)
 
     db.flush()
+    invalidate_scorable_tag_index(redis, db)
 
     return {
         "id": prompt.external_id,
@@ -457,6 +466,7 @@ def delete_prompt_tag(
     db: Session = Depends(get_managed_session),
     current_scopes=Depends(am.current_scopes),
     user_uuid: str = Depends(am.get_current_user_uuid),
+    redis: StrictRedis = Depends(get_redis_database(RedisDatabase.CACHE)),
 ):
     user = db.scalars(select(User).where(User.external_id == user_uuid)).one()
     prompt = db.query(Prompt).filter(Prompt.external_id == external_id).first()
@@ -476,6 +486,7 @@ def delete_prompt_tag(
 
     db.flush()
     db.refresh(prompt)
+    invalidate_scorable_tag_index(redis, db)
 
     return {
         "current_tags": [tag.to_dict() for tag in prompt.tags],
@@ -495,6 +506,7 @@ def add_prompt_tag(
     db: Session = Depends(get_managed_session),
     user_uuid: str = Depends(am.get_current_user_uuid),
     current_scopes=Depends(am.current_scopes),
+    redis: StrictRedis = Depends(get_redis_database(RedisDatabase.CACHE)),
 ):
     user = db.scalars(select(User).where(User.external_id == user_uuid)).one()
     prompt = db.query(Prompt).filter(Prompt.external_id == external_id).first()
@@ -520,6 +532,7 @@ def add_prompt_tag(
     db.add(prompt)
     db.flush()
     db.refresh(prompt)
+    invalidate_scorable_tag_index(redis, db)
 
     return {
         "current_tags": [tag.to_dict() for tag in prompt.tags],
@@ -22,7 +22,7 @@ from mc_bench.apps.admin_api.transport_types.responses import (
 )
 from mc_bench.auth.permissions import PERM
 from mc_bench.constants import GENERATION_STATE, RUN_STAGE_STATE, RUN_STATE
-from mc_bench.events import emit_event
+from mc_bench.events import emit_event, event_batch
 from mc_bench.events.types import (
     GenerationStateChanged,
     RunStageStateChanged,
@@ -285,9 +285,7 @@ def get_run_status(
     return {
         "id": run.external_id,
         "status": run.state.slug,
-        "stages": [
-            stage.to_dict(redis=redis) for stage in run.sorted_stages(sort_order)
-        ],
+        "stages": run.stages_to_dict(run.sorted_stages(sort_order), redis=redis),
     }
 
 
@@ -352,18 +350,20 @@ def task_retry(
 
         # Reset progress for stages and mark them as PENDING
         # The scheduler will pick them up and run them in the correct order
-        for stage in stages_to_retry:
-            stage.set_progress(redis, 0, None)
-
-            emit_event(
-                RunStageStateChanged(
-                    stage_id=stage.id, new_state=RUN_STAGE_STATE.PENDING
+        with event_batch(db):
+            for stage in stages_to_retry:
+                stage.set_progress(redis, 0, None)
+
+                emit_event(
+                    RunStageStateChanged(
+                        stage_id=stage.id, new_state=RUN_STAGE_STATE.PENDING
+                    )
                 )
-            )
 
-            logger.info(
-                f"Marked stage {stage.id} ({stage.stage.slug}) as PENDING for retry"
-            )
+                logger.info(
+                    f"Marked stage {stage.id} ({stage.stage.slug}) as PENDING for retry"
+                )
+        db.commit()
 
         # TODO: This is a hack to not set sample pending if we are about to generate a new sample
         if run.samples and task_name != "PROMPT_EXECUTION":
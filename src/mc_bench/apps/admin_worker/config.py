@@ -8,6 +8,33 @@ class Settings:
     HUMANIZE_LOGS = os.environ.get("HUMANIZE_LOGS", "false") == "true"
     LOG_LEVEL_STR = os.environ.get("LOG_LEVEL", "INFO")
     LOG_LEVEL = getattr(logging, LOG_LEVEL_STR.upper(), logging.INFO)
+    # Stream provider responses on one event loop per process, which lets a
+    # worker with a `threads` pool wait on many prompts at once
+    PROMPT_STREAMING_ENABLED = (
+        os.environ.get("PROMPT_STREAMING_ENABLED", "false") == "true"
+    )
+    # Seconds between progress updates of a streamed response
+    PROMPT_STREAMING_PROGRESS_INTERVAL = float(
+        os.environ.get("PROMPT_STREAMING_PROGRESS_INTERVAL", "5")
+    )
+    # Number of responses kept and reused per provider config and rendered
+    # prompt, 0 to always ask the provider
+    PROMPT_CACHE_RESPONSES = int(os.environ.get("PROMPT_CACHE_RESPONSES", "0"))
+    # Batch jobs of prompts, see `mc_bench.clients.batch`. With
+    # PROMPT_BATCH_LOCAL, jobs are run in the worker by the local stand-in
+    PROMPT_BATCH_LOCAL = os.environ.get("PROMPT_BATCH_LOCAL", "false") == "true"
+    # Polls also beat the heartbeats of the stages of the job, so this stays well
+    # under the heartbeat timeout of the scheduler
+    PROMPT_BATCH_POLL_INTERVAL = int(os.environ.get("PROMPT_BATCH_POLL_INTERVAL", "60"))
+    # A little over the 24 hour completion window of the providers
+    PROMPT_BATCH_TIMEOUT = int(os.environ.get("PROMPT_BATCH_TIMEOUT", "90000"))
+    # Batch jobs a prompt gets before its run fails
+    PROMPT_BATCH_MAX_ATTEMPTS = int(os.environ.get("PROMPT_BATCH_MAX_ATTEMPTS", "3"))
+    # Validate code through a long-lived ESLint process instead of the CLI
+    ESLINT_DAEMON_ENABLED = os.environ.get("ESLINT_DAEMON_ENABLED", "true") == "true"
+    ESLINT_DAEMON_SOCKET = os.environ.get(
+        "ESLINT_DAEMON_SOCKET", "/tmp/mc-bench-eslint.sock"
+    )
 
 
 settings = Settings()
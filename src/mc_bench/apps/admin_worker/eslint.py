@@ -0,0 +1,149 @@
+"""
+Code validation through a long-lived ESLint daemon.
+
+Running the eslint CLI starts Node and loads ESLint and its config for every
+script. Instead, the main process of the worker runs `js_scripts/eslintDaemon.js`
+and restarts it whenever it exits, and task processes send it their scripts over
+a Unix socket. Scripts are validated with the CLI as before whenever the daemon
+cannot be reached.
+"""
+
+import json
+import os
+import socket
+import subprocess
+import tempfile
+import threading
+import uuid
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from mc_bench.util.logging import get_logger
+
+logger = get_logger(__name__)
+
+ADMIN_WORKER_DIR = os.path.dirname(os.path.abspath(__file__))
+ESLINT_CONFIG = os.path.join(ADMIN_WORKER_DIR, "script-eslintrc.js")
+MOCK_SCRIPT = os.path.join(ADMIN_WORKER_DIR, "js_scripts", "mockScript.js")
+DAEMON_SCRIPT = os.path.join(ADMIN_WORKER_DIR, "js_scripts", "eslintDaemon.js")
+
+
+@dataclass
+class ValidationResult:
+    valid: bool
+    messages: List[dict] = field(default_factory=list)
+
+
+class EslintDaemon:
+    """Keep the ESLint daemon running on `socket_path` until stopped."""
+
+    def __init__(self, socket_path: str, restart_delay: float = 1):
+        self.socket_path = socket_path
+        self.restart_delay = restart_delay
+        self._process: Optional[subprocess.Popen] = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._supervise, daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+
+    def _supervise(self):
+        env = _node_env()
+        while not self._stopped.is_set():
+            logger.info("Starting ESLint daemon", socket_path=self.socket_path)
+            try:
+                self._process = subprocess.Popen(
+                    ["node", DAEMON_SCRIPT, self.socket_path, ESLINT_CONFIG], env=env
+                )
+                returncode = self._process.wait()
+            except OSError:
+                logger.exception("Error starting ESLint daemon")
+                returncode = None
+
+            if not self._stopped.is_set():
+                logger.warning("ESLint daemon exited", returncode=returncode)
+                self._stopped.wait(self.restart_delay)
+
+
+def validate_code(
+    codes: List[str], socket_path: Optional[str] = None, timeout: float = 30
+) -> List[ValidationResult]:
+    """Validate model code, each prefixed with the mock of the builder API.
+
+    Uses the daemon on `socket_path` if given and reachable, the CLI otherwise.
+    """
+    with open(MOCK_SCRIPT, "r") as f:
+        mock_script = f.read()
+    scripts = [f"{mock_script}\n\n{code}" for code in codes]
+
+    if socket_path is not None:
+        try:
+            return _validate_with_daemon(scripts, socket_path, timeout)
+        except (OSError, ValueError) as e:
+            logger.warning("ESLint daemon unavailable, using the CLI", error=str(e))
+
+    return [_validate_with_cli(script) for script in scripts]
+
+
+def _validate_with_daemon(scripts, socket_path, timeout):
+    request_id = str(uuid.uuid4())
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(socket_path)
+        request = {"id": request_id, "scripts": scripts}
+        connection.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with connection.makefile("rb") as responses:
+            line = responses.readline()
+
+    if not line:
+        raise ValueError("No response from the ESLint daemon")
+
+    response = json.loads(line)
+    if response.get("error") or response.get("id") != request_id:
+        raise ValueError(f"Bad response from the ESLint daemon: {response}")
+
+    return [
+        ValidationResult(valid=result["valid"], messages=result["messages"])
+        for result in response["results"]
+    ]
+
+
+def _validate_with_cli(script):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with open(os.path.join(temp_dir, "code.js"), "w") as f:
+            f.write(script)
+
+        result = subprocess.run(
+            ["eslint", "--config", ESLINT_CONFIG, "code.js"],
+            cwd=temp_dir,
+            capture_output=True,
+            text=True,
+        )
+
+    return ValidationResult(
+        valid=result.returncode == 0,
+        messages=[{"message": result.stdout}] if result.stdout else [],
+    )
+
+
+def _node_env():
+    # eslint is installed globally, which `require` does not search by default
+    env = dict(os.environ)
+    try:
+        global_modules = subprocess.run(
+            ["npm", "root", "-g"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        logger.warning("Could not locate global node modules")
+    else:
+        env["NODE_PATH"] = os.pathsep.join(
+            filter(None, [env.get("NODE_PATH"), global_modules])
+        )
+    return env
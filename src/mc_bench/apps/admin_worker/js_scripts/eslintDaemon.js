@@ -0,0 +1,89 @@
+// Long-lived ESLint service for code validation.
+//
+// Listens on a Unix socket and speaks newline-delimited JSON. Each request is
+// {"id": ..., "scripts": ["...", ...]} and is answered with
+// {"id": ..., "results": [{"valid": true|false, "messages": [...]}, ...]}, one
+// result per script in order. The ESLint instance and its config are loaded once.
+const fs = require("fs");
+const net = require("net");
+const path = require("path");
+const readline = require("readline");
+const { ESLint } = require("eslint");
+
+const SOCKET_PATH = process.argv[2];
+const CONFIG_PATH = process.argv[3];
+
+if (!SOCKET_PATH || !CONFIG_PATH) {
+  console.error("Usage: node eslintDaemon.js <socket path> <config path>");
+  process.exit(2);
+}
+
+const CWD = path.dirname(CONFIG_PATH);
+// Matched by the `files` pattern of the config, never read from disk
+const FILE_PATH = path.join(CWD, "code.js");
+
+const eslint = new ESLint({ cwd: CWD, overrideConfigFile: CONFIG_PATH });
+
+async function lint(script) {
+  const [result] = await eslint.lintText(script, { filePath: FILE_PATH });
+  return {
+    valid: result.errorCount === 0,
+    messages: result.messages.map((message) => ({
+      line: message.line,
+      column: message.column,
+      severity: message.severity,
+      ruleId: message.ruleId,
+      message: message.message,
+    })),
+  };
+}
+
+async function handle(line) {
+  let request;
+  try {
+    request = JSON.parse(line);
+  } catch (error) {
+    return { error: `Invalid request: ${error.message}` };
+  }
+
+  try {
+    const results = [];
+    for (const script of request.scripts) {
+      results.push(await lint(script));
+    }
+    return { id: request.id, results };
+  } catch (error) {
+    return { id: request.id, error: error.message };
+  }
+}
+
+function serve(connection) {
+  const lines = readline.createInterface({ input: connection });
+  // Answer in order even though linting is asynchronous
+  let queue = Promise.resolve();
+  lines.on("line", (line) => {
+    queue = queue.then(async () => {
+      const response = await handle(line);
+      connection.write(JSON.stringify(response) + "\n");
+    });
+  });
+  connection.on("error", (error) => {
+    console.error("Connection error", error.message);
+  });
+}
+
+if (fs.existsSync(SOCKET_PATH)) {
+  fs.unlinkSync(SOCKET_PATH);
+}
+
+const server = net.createServer(serve);
+server.listen(SOCKET_PATH, () => {
+  console.log(`ESLint daemon listening on ${SOCKET_PATH}`);
+});
+
+for (const signal of ["SIGINT", "SIGTERM"]) {
+  process.on(signal, () => {
+    server.close();
+    process.exit(0);
+  });
+}
@@ -1,4 +1,4 @@
-from sqlalchemy import select, text
+from sqlalchemy import select
 
 from mc_bench.constants import GENERATION_STATE, RUN_STATE
 from mc_bench.events import emit_event
@@ -6,8 +6,10 @@ from mc_bench.events.types import GenerationStateChanged
 from mc_bench.models.run import (
     Generation,
     Run,
+    generation_state_id_for,
     run_state_id_for,
 )
+from mc_bench.util.finalization import clear_finalization_request
 from mc_bench.util.logging import get_logger
 from mc_bench.util.postgres import managed_session
 
@@ -29,61 +31,24 @@ def create_runs(
     with managed_session() as db:
         generation = db.scalar(select(Generation).where(Generation.id == generation_id))
 
-        for template_id in template_ids:
-            for prompt_id in prompt_ids:
-                for model_id in model_ids:
-                    for _ in range(num_samples):
-                        run = Run(
-                            generation_id=generation_id,
-                            created_by=generation.created_by,
-                            template_id=template_id,
-                            prompt_id=prompt_id,
-                            model_id=model_id,
-                            state_id=run_state_id_for(db, RUN_STATE.CREATED),
-                        )
-                        db.add(run)
-                        db.flush()
-                        logger.info(
-                            "Run created",
-                            template_id=template_id,
-                            prompt_id=prompt_id,
-                            model_id=model_id,
-                        )
-                        stages = run.make_stages(db)
-                        logger.info(
-                            "Stages created",
-                            template_id=template_id,
-                            prompt_id=prompt_id,
-                            model_id=model_id,
-                            run_id=run.id,
-                        )
-                        db.add_all(stages)
+        # The runs go straight to IN_PROGRESS, with pending stages that the
+        # scheduler picks up and enqueues as appropriate
+        run_ids = Run.create_many(
+            db,
+            generation_id=generation_id,
+            created_by=generation.created_by,
+            template_ids=template_ids,
+            prompt_ids=prompt_ids,
+            model_ids=model_ids,
+            num_samples=num_samples,
+            state=RUN_STATE.IN_PROGRESS,
+        )
         db.commit()
 
-        run_ids = db.scalars(
-            select(Run.id).where(Run.generation_id == generation_id)
-        ).all()
-
-        # No longer directly enqueuing Celery tasks
-        # The scheduler will pick up pending stages and enqueue them as appropriate
         logger.info(
             f"Created {len(run_ids)} runs with pending stages for scheduler to process"
         )
 
-        db.execute(
-            text("""\
-        UPDATE specification.run 
-        SET state_id = :new_state_id 
-        WHERE id = ANY(:run_ids) 
-        AND state_id = :created_state_id;
-        """).bindparams(
-                run_ids=run_ids,
-                new_state_id=run_state_id_for(db, RUN_STATE.IN_PROGRESS),
-                created_state_id=run_state_id_for(db, RUN_STATE.CREATED),
-            )
-        )
-        db.commit()
-
         return {
             "ok": True,
         }
@@ -92,39 +57,38 @@ def create_runs(
 @app.task(name="generation.finalize_generation")
 def finalize_generation(generation_id):
     logger.info("Finalizing generation", generation_id=generation_id)
+    # Changes after this point request another finalization
+    clear_finalization_request(generation_id)
+
     with managed_session() as db:
-        run_states = db.scalars(
-            select(Run.state_id).where(Run.generation_id == generation_id)
-        ).all()
+        counts = Generation.run_state_counts(db, generation_id)
+        total = sum(counts.values())
+        completed = counts.get(run_state_id_for(db, RUN_STATE.COMPLETED), 0)
+        in_retry = counts.get(run_state_id_for(db, RUN_STATE.IN_RETRY), 0)
+        failed = counts.get(run_state_id_for(db, RUN_STATE.FAILED), 0)
 
-        if all(
-            run_state == run_state_id_for(db, RUN_STATE.COMPLETED)
-            for run_state in run_states
-        ):
+        if completed == total:
             logger.info("Generation completed", generation_id=generation_id)
             generation_state = GENERATION_STATE.COMPLETED
-        elif any(
-            run_state == run_state_id_for(db, RUN_STATE.IN_RETRY)
-            for run_state in run_states
-        ):
+        elif in_retry:
             logger.info("Generation in retry", generation_id=generation_id)
             generation_state = GENERATION_STATE.IN_RETRY
-        elif all(
-            run_state == run_state_id_for(db, RUN_STATE.FAILED)
-            for run_state in run_states
-        ):
+        elif failed == total:
             logger.info("Generation failed", generation_id=generation_id)
             generation_state = GENERATION_STATE.FAILED
-        elif any(
-            run_state == run_state_id_for(db, RUN_STATE.FAILED)
-            for run_state in run_states
-        ):
+        elif failed:
             logger.info("Generation partial failed", generation_id=generation_id)
             generation_state = GENERATION_STATE.PARTIAL_FAILED
         else:
             logger.info("Generation in progress", generation_id=generation_id)
             generation_state = GENERATION_STATE.IN_PROGRESS
 
+        current_state_id = db.scalar(
+            select(Generation.state_id).where(Generation.id == generation_id)
+        )
+        if current_state_id == generation_state_id_for(db, generation_state):
+            return
+
         emit_event(
             GenerationStateChanged(
                 generation_id=generation_id, new_state=generation_state
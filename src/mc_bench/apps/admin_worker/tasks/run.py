@@ -1,9 +1,16 @@
 import os
-import subprocess
 import tempfile
 
-from mc_bench.constants import EXPERIMENTAL_STATE
+from celery.signals import worker_ready, worker_shutdown
+from sqlalchemy import func, select
+
+from mc_bench.clients.batch import LocalBatchClient
+from mc_bench.constants import EXPERIMENTAL_STATE, RUN_STAGE_STATE, RUN_STATE
+from mc_bench.events import emit_event, event_batch
+from mc_bench.events.types import RunStageStateChanged, RunStateChanged
 from mc_bench.models.experimental_state import experimental_state_id_for
+from mc_bench.models.prompt_batch import PromptBatch
+from mc_bench.models.prompt_cache import PromptCache, response_hash
 from mc_bench.models.run import (
     Artifact,
     CodeValidation,
@@ -11,22 +18,36 @@ from mc_bench.models.run import (
     PreparingSample,
     PromptExecution,
     ResponseParsing,
+    RunStage,
     Sample,
+    run_stage_state_id_for,
 )
+from mc_bench.util.finalization import request_finalization
 from mc_bench.util.logging import get_logger
 from mc_bench.util.object_store import get_client
+from mc_bench.util.postgres import managed_session
 from mc_bench.util.text import parse_known_parts
-from mc_bench.worker.run_stage import StageContext, run_stage_task
+from mc_bench.worker.run_stage import StageContext, fused_stage_task, run_stage_task
 
 from ..app import app
 from ..config import settings
+from ..eslint import EslintDaemon, validate_code
 
 logger = get_logger(__name__)
 
-HERE = os.path.dirname(os.path.abspath(__file__))
-ADMIN_WORKER_DIR = os.path.dirname(HERE)
-ESLINT_CONFIG = os.path.join(ADMIN_WORKER_DIR, "script-eslintrc.js")
-MOCK_SCRIPT = os.path.join(ADMIN_WORKER_DIR, "js_scripts", "mockScript.js")
+eslint_daemon = EslintDaemon(settings.ESLINT_DAEMON_SOCKET)
+
+
+@worker_ready.connect
+def start_eslint_daemon(**kwargs):
+    """Run the ESLint daemon for code validation alongside the worker."""
+    if settings.ESLINT_DAEMON_ENABLED:
+        eslint_daemon.start()
+
+
+@worker_shutdown.connect
+def stop_eslint_daemon(**kwargs):
+    eslint_daemon.stop()
 
 
 @run_stage_task(
@@ -38,33 +59,292 @@ MOCK_SCRIPT = os.path.join(ADMIN_WORKER_DIR, "js_scripts", "mockScript.js")
     retry_on_failure=True,
 )
 def execute_prompt(stage_context: StageContext):
+    def on_progress(received):
+        stage_context.update_stage_progress(
+            progress=0, note=f"{received} characters received"
+        )
+
+    provider = stage_context.run.model.default_provider
+    prompt = render_prompt(stage_context.run)
+    execute_kwargs = {
+        "stream": settings.PROMPT_STREAMING_ENABLED,
+        "on_progress": on_progress,
+        "progress_interval": settings.PROMPT_STREAMING_PROGRESS_INTERVAL,
+    }
+
+    if settings.PROMPT_CACHE_RESPONSES > 0:
+        prompt_cache = PromptCache(
+            stage_context.db,
+            bucket=settings.INTERNAL_OBJECT_BUCKET,
+            responses=settings.PROMPT_CACHE_RESPONSES,
+        )
+        # A run started over gets a response other than the ones it failed with
+        response, cached = prompt_cache.execute_prompt(
+            provider,
+            prompt,
+            exclude={
+                response_hash(sample.raw)
+                for sample in stage_context.run.samples
+                if sample.raw
+            },
+            **execute_kwargs,
+        )
+        if cached:
+            logger.info("Reused cached prompt response", run_id=stage_context.run_id)
+    else:
+        response = provider.execute_prompt(prompt, **execute_kwargs)
+
+    sample = make_sample(stage_context.db, stage_context.run, response)
+    stage_context.db.add(sample)
+    stage_context.db.commit()
+    stage_context.db.refresh(sample)
+    sample_id = sample.id
+
+    run_id = stage_context.run_id
+
+    return run_id, sample_id
+
+
+@app.task(name="run.execute_prompt_batch", bind=True)
+def execute_prompt_batch(self, metadata):
+    """Submit the prompts of several PROMPT_EXECUTION stages as one batch job.
+
+    The stages share a provider. The job is recorded as a PromptBatch and polled
+    by `run.poll_prompt_batch`. If the job cannot be submitted, the stages are set
+    back to PENDING for the scheduler.
+    """
+    stage_ids = metadata["stage_ids"]
+    logger.info("Starting prompt batch", task_id=self.request.id, stage_ids=stage_ids)
+
+    with managed_session() as db:
+        stages = db.scalars(
+            select(PromptExecution).where(PromptExecution.id.in_(stage_ids))
+        ).all()
+        if not stages:
+            return
+
+        with event_batch(db):
+            for stage in stages:
+                emit_event(
+                    RunStageStateChanged(
+                        stage_id=stage.id, new_state=RUN_STAGE_STATE.IN_PROGRESS
+                    )
+                )
+        RunStage.update_heartbeats(
+            db,
+            stage_ids,
+            state_id=run_stage_state_id_for(db, RUN_STAGE_STATE.IN_PROGRESS),
+        )
+        db.commit()
+
+        client = None
+        batch_id = None
+        try:
+            provider = stages[0].run.model.default_provider
+            client = _batch_client(provider)
+            batch_id = client.submit_batch(
+                {
+                    f"stage-{stage.id}": provider.prompt_kwargs(
+                        render_prompt(stage.run)
+                    )
+                    for stage in stages
+                }
+            )
+            prompt_batch = PromptBatch.create(
+                db, provider.id, batch_id, [stage.id for stage in stages]
+            )
+            db.commit()
+        except Exception:
+            logger.exception("Error submitting prompt batch", stage_ids=stage_ids)
+            db.rollback()
+            if batch_id is not None:
+                _cancel_batch(client, batch_id)
+            with event_batch(db):
+                for stage_id in stage_ids:
+                    emit_event(
+                        RunStageStateChanged(
+                            stage_id=stage_id, new_state=RUN_STAGE_STATE.PENDING
+                        )
+                    )
+            db.commit()
+            raise
+
+        logger.info(
+            "Submitted prompt batch",
+            prompt_batch_id=prompt_batch.id,
+            batch_id=batch_id,
+            size=len(stages),
+        )
+        _enqueue_poll(prompt_batch.id)
+
+
+@app.task(name="run.poll_prompt_batch", bind=True)
+def poll_prompt_batch(self, prompt_batch_id):
+    """Check on a submitted batch job once, and handle its results if it ended.
+
+    While the job runs, the task beats the heartbeats of its stages and enqueues
+    itself again in PROMPT_BATCH_POLL_INTERVAL seconds. Jobs running longer than
+    PROMPT_BATCH_TIMEOUT are cancelled. Each stage is completed with a sample of
+    its response; stages without one are set back to PENDING for another batch,
+    or failed along with their run after PROMPT_BATCH_MAX_ATTEMPTS batches.
+    """
+    with managed_session() as db:
+        prompt_batch = db.get(PromptBatch, prompt_batch_id)
+        if prompt_batch is None or prompt_batch.ended is not None:
+            return
+
+        in_progress_state_id = run_stage_state_id_for(db, RUN_STAGE_STATE.IN_PROGRESS)
+        stages = db.scalars(
+            select(PromptExecution)
+            .where(PromptExecution.id.in_(prompt_batch.stage_ids(db)))
+            .where(PromptExecution.state_id == in_progress_state_id)
+        ).all()
+        client = _batch_client(prompt_batch.provider)
+
+        if not stages:
+            # The scheduler failed the stages when their heartbeats stopped
+            logger.warning(
+                "No stages left for prompt batch, cancelling it",
+                prompt_batch_id=prompt_batch_id,
+            )
+            _cancel_batch(client, prompt_batch.batch_id)
+            prompt_batch.ended = func.now()
+            return
+
+        RunStage.update_heartbeats(
+            db, [stage.id for stage in stages], state_id=in_progress_state_id
+        )
+        db.commit()
+
+        try:
+            results = client.get_batch_results(prompt_batch.batch_id)
+        except Exception:
+            logger.exception(
+                "Error polling prompt batch", prompt_batch_id=prompt_batch_id
+            )
+            results = None
+
+        if results is None:
+            age = db.scalar(
+                select(func.now() - PromptBatch.created).where(
+                    PromptBatch.id == prompt_batch_id
+                )
+            )
+            if age.total_seconds() <= settings.PROMPT_BATCH_TIMEOUT:
+                _enqueue_poll(prompt_batch_id)
+                return
+
+            logger.warning(
+                "Prompt batch timed out, cancelling it",
+                prompt_batch_id=prompt_batch_id,
+                batch_id=prompt_batch.batch_id,
+            )
+            _cancel_batch(client, prompt_batch.batch_id)
+            results = {}
+
+        attempts = PromptBatch.attempts(db, [stage.id for stage in stages])
+        generation_ids = {
+            stage.run.generation_id
+            for stage in stages
+            if stage.run.generation_id is not None
+        }
+        retried = []
+        failed = []
+        with event_batch(db):
+            for stage in stages:
+                result = results.get(f"stage-{stage.id}")
+                if result is not None and result.error is None:
+                    db.add(make_sample(db, stage.run, result.response))
+                    emit_event(
+                        RunStageStateChanged(
+                            stage_id=stage.id, new_state=RUN_STAGE_STATE.COMPLETED
+                        )
+                    )
+                elif attempts.get(stage.id, 0) < settings.PROMPT_BATCH_MAX_ATTEMPTS:
+                    retried.append(stage.id)
+                    emit_event(
+                        RunStageStateChanged(
+                            stage_id=stage.id, new_state=RUN_STAGE_STATE.PENDING
+                        )
+                    )
+                else:
+                    failed.append(stage.id)
+                    emit_event(
+                        RunStageStateChanged(
+                            stage_id=stage.id, new_state=RUN_STAGE_STATE.FAILED
+                        )
+                    )
+                    emit_event(
+                        RunStateChanged(run_id=stage.run_id, new_state=RUN_STATE.FAILED)
+                    )
+        prompt_batch.ended = func.now()
+        db.commit()
+
+        logger.info(
+            "Prompt batch completed",
+            prompt_batch_id=prompt_batch_id,
+            batch_id=prompt_batch.batch_id,
+            size=len(stages),
+            retried_stage_ids=retried,
+            failed_stage_ids=failed,
+        )
+
+    for generation_id in generation_ids:
+        request_finalization(app, generation_id)
+
+
+def _batch_client(provider):
+    client = provider.get_shared_client()
+    if settings.PROMPT_BATCH_LOCAL:
+        client = LocalBatchClient(client)
+    return client
+
+
+def _cancel_batch(client, batch_id):
+    try:
+        client.cancel_batch(batch_id)
+    except Exception:
+        # Jobs that already ended cannot be cancelled
+        logger.exception("Error cancelling prompt batch", batch_id=batch_id)
+
+
+def _enqueue_poll(prompt_batch_id):
+    # Polls beat the heartbeats of the stages of the job, so they run on the admin
+    # queue of short tasks rather than wait behind prompts on the prompt queue
+    app.signature(
+        "run.poll_prompt_batch", args=[prompt_batch_id], queue="admin"
+    ).apply_async(countdown=settings.PROMPT_BATCH_POLL_INTERVAL)
+
+
+def render_prompt(run):
     render_kwargs = {
-        "build_specification": stage_context.run.prompt.build_specification,
+        "build_specification": run.prompt.build_specification,
     }
 
-    if stage_context.run.prompt.build_size is not None:
-        render_kwargs["build_size"] = stage_context.run.prompt.build_size
+    if run.prompt.build_size is not None:
+        render_kwargs["build_size"] = run.prompt.build_size
 
-    response = stage_context.run.model.default_provider.execute_prompt(
-        prompt=stage_context.run.template.render(**render_kwargs)
-    )
+    return run.template.render(**render_kwargs)
 
+
+def make_sample(db, run, response):
+    """A new sample of `run` with the raw `response` of its model."""
     sample_kwargs = {
-        "created_by": stage_context.run.created_by,
-        "run_id": stage_context.run.id,
+        "created_by": run.created_by,
+        "run_id": run.id,
         "raw": response,
-        "comparison_correlation_id": stage_context.run.generate_correlation_id(),
+        "comparison_correlation_id": run.generate_correlation_id(),
     }
 
     experimental_states = [
-        stage_context.run.template.experimental_state.name
-        if stage_context.run.template.experimental_state
+        run.template.experimental_state.name
+        if run.template.experimental_state
         else EXPERIMENTAL_STATE.EXPERIMENTAL.value,
-        stage_context.run.model.experimental_state.name
-        if stage_context.run.model.experimental_state
+        run.model.experimental_state.name
+        if run.model.experimental_state
         else EXPERIMENTAL_STATE.EXPERIMENTAL.value,
-        stage_context.run.prompt.experimental_state.name
-        if stage_context.run.prompt.experimental_state
+        run.prompt.experimental_state.name
+        if run.prompt.experimental_state
         else EXPERIMENTAL_STATE.EXPERIMENTAL.value,
     ]
 
@@ -72,25 +352,17 @@ def execute_prompt(stage_context: StageContext):
         [state == EXPERIMENTAL_STATE.RELEASED.value for state in experimental_states]
     ):
         sample_kwargs["experimental_state_id"] = experimental_state_id_for(
-            stage_context.db, EXPERIMENTAL_STATE.RELEASED
+            db, EXPERIMENTAL_STATE.RELEASED
         )
     else:
         sample_kwargs["experimental_state_id"] = experimental_state_id_for(
-            stage_context.db, EXPERIMENTAL_STATE.EXPERIMENTAL
+            db, EXPERIMENTAL_STATE.EXPERIMENTAL
         )
 
-    if stage_context.generation.default_test_set_id is not None:
-        sample_kwargs["test_set_id"] = stage_context.generation.default_test_set_id
-
-    sample = Sample(**sample_kwargs)
-    stage_context.db.add(sample)
-    stage_context.db.commit()
-    stage_context.db.refresh(sample)
-    sample_id = sample.id
-
-    run_id = stage_context.run_id
+    if run.generation.default_test_set_id is not None:
+        sample_kwargs["test_set_id"] = run.generation.default_test_set_id
 
-    return run_id, sample_id
+    return Sample(**sample_kwargs)
 
 
 @run_stage_task(
@@ -158,27 +430,23 @@ def parse_prompt(
 def code_validation(stage_context: StageContext):
     code = stage_context.sample.result_code_text
 
-    with tempfile.TemporaryDirectory() as temp_dir:
-        with open(MOCK_SCRIPT, "r") as f:
-            mock_script = f.read()
-
-        with open(os.path.join(temp_dir, "code.js"), "w") as f:
-            full_code = f"{mock_script}\n\n{code}"
-            f.write(full_code)
+    logger.info(
+        "Validating code", run_id=stage_context.run.id
+    )  # Keep as info - signals start of important process
+    [result] = validate_code(
+        [code],
+        socket_path=settings.ESLINT_DAEMON_SOCKET
+        if settings.ESLINT_DAEMON_ENABLED
+        else None,
+    )
 
-        logger.info(
-            "Validating code", run_id=stage_context.run.id
-        )  # Keep as info - signals start of important process
-        result = subprocess.run(
-            ["eslint", "--config", ESLINT_CONFIG, "code.js"],
-            cwd=temp_dir,
-            capture_output=True,
-            text=True,
+    if not result.valid:
+        logger.error(
+            "Code validation failed",
+            run_id=stage_context.run.id,
+            messages=result.messages,
         )
-
-        if result.returncode != 0:
-            logger.error("Code validation failed", run_id=stage_context.run.id)
-            raise RuntimeError("Code validation failed.")
+        raise RuntimeError("Code validation failed.")
 
     run_id = stage_context.run_id
     sample_id = stage_context.sample.id
@@ -250,3 +518,18 @@ def prepare_sample(stage_context: StageContext):
     sample_id = stage_context.sample.id
 
     return run_id, sample_id
+
+
+parse_and_validate = fused_stage_task(
+    name="run.parse_and_validate",
+    app=app,
+    stages=[ResponseParsing, CodeValidation],
+    max_retries=0,
+)
+
+post_process_and_prepare = fused_stage_task(
+    name="run.post_process_and_prepare",
+    app=app,
+    stages=[PostProcessing, PreparingSample],
+    max_retries=0,
+)
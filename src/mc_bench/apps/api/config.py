@@ -26,5 +26,18 @@ class Settings:
     LOG_LEVEL_STR = os.environ.get("LOG_LEVEL", "INFO")
     LOG_LEVEL = getattr(logging, LOG_LEVEL_STR.upper(), logging.INFO)
 
+    # Comparison pair pool settings
+    COMPARISON_POOL_ENABLED = (
+        os.environ.get("COMPARISON_POOL_ENABLED", "true") == "true"
+    )
+    COMPARISON_POOL_LOW_WATERMARK = int(
+        os.environ.get("COMPARISON_POOL_LOW_WATERMARK", "200")
+    )
+
+    # Record votes through a Redis Stream drained by the vote ingestion worker
+    COMPARISON_WRITE_BEHIND_ENABLED = (
+        os.environ.get("COMPARISON_WRITE_BEHIND_ENABLED", "false") == "true"
+    )
+
 
 settings = Settings()
@@ -1,8 +1,20 @@
+import datetime
+import json
 import uuid
 from typing import List, Optional
 
 import sqlalchemy
-from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
 from redis import StrictRedis
 from sqlalchemy import func, select
 from sqlalchemy.orm import Session, selectinload
@@ -24,10 +36,15 @@ from mc_bench.models.run import Artifact, Run, Sample, TestSet
 from mc_bench.models.user import User
 from mc_bench.server.auth import AuthManager
 from mc_bench.models.experimental_state import ExperimentalState
+from mc_bench.util import comparison_pool, comparison_votes, leaderboard_deltas
 from mc_bench.util.cache import timed_cache
 from mc_bench.util.logging import get_logger
 from mc_bench.util.postgres import get_managed_session
-from mc_bench.util.redis import RedisDatabase, get_redis_database
+from mc_bench.util.redis import (
+    RedisDatabase,
+    get_async_redis_client,
+    get_redis_database,
+)
 
 from ..celery import send_task
 from ..transport_types.requests import NewComparisonBatchRequest, UserComparisonRequest
@@ -59,6 +76,7 @@ logger = get_logger(__name__)
 comparison_router = APIRouter()
 
 MAX_BATCH_SIZE = 10
+LEADERBOARD_UPDATES_KEEPALIVE_MS = 15000
 
 am = AuthManager(
     jwt_secret=settings.JWT_SECRET_KEY,
@@ -112,31 +130,42 @@ def get_comparison_batch(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # try:
-    sample_data = db.execute(
-        sqlalchemy.text(
-            "EXECUTE comparison_batch_query(:test_set_id, :sample_count)"
-        ).bindparams(
-            sample_count=request.batch_size,
-            test_set_id=test_set_id,
-        )
-    ).fetchall()
+    pairs = []
+    if settings.COMPARISON_POOL_ENABLED:
+        pairs = comparison_pool.pop_pairs(redis, test_set_id, request.batch_size)
+
+        if comparison_pool.should_refill(
+            redis, test_set_id, settings.COMPARISON_POOL_LOW_WATERMARK
+        ):
+            logger.info("Enqueuing comparison pool refill", test_set_id=test_set_id)
+            send_task("refill_comparison_pool", args=[test_set_id])
+
+    if len(pairs) < request.batch_size:
+        # The pool is cold or drained, fall back to the live query for the rest
+        sample_data = db.execute(
+            sqlalchemy.text(
+                "EXECUTE comparison_batch_query(:test_set_id, :sample_count)"
+            ).bindparams(
+                sample_count=request.batch_size - len(pairs),
+                test_set_id=test_set_id,
+            )
+        ).fetchall()
+        pairs.extend(comparison_pool.pair_from_row(row) for row in sample_data)
 
     comparison_tokens = []
-    for (
-        sample_1,
-        sample_1_key,
-        sample_2,
-        sample_2_key,
-        build_specification,
-    ) in sample_data:
+    for pair in pairs:
+        sample_1 = pair["sample_1"]
+        sample_1_key = pair["sample_1_key"]
+        sample_2 = pair["sample_2"]
+        sample_2_key = pair["sample_2_key"]
+        build_specification = pair["build_specification"]
         token = uuid.uuid4()
 
         # Store in Redis with expiration
         redis.setex(
-            f"active_comparison:{token}",
-            3600,  # 1 hour expiration
-            f"{metric.external_id}:{sample_1}:{sample_2}",
+            comparison_votes.active_comparison_key(token),
+            comparison_votes.ACTIVE_COMPARISON_TTL_SECONDS,
+            comparison_votes.encode_token_payload(metric.external_id, pair),
         )
 
         assets = [
@@ -185,6 +214,38 @@ def post_comparison(
     user_uuid: Optional[str] = Depends(am.maybe_authenticated),
     redis: StrictRedis = Depends(get_redis_database(RedisDatabase.COMPARISON)),
 ):
+    key = comparison_votes.active_comparison_key(request.comparison_details.token)
+    token_data = redis.getdel(key)
+    if not token_data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No active comparisons found",
+        )
+
+    payload = comparison_votes.decode_token_payload(token_data)
+    ranks = comparison_votes.flatten_ranks(request.ordered_sample_ids)
+    if not {sample_id for _, sample_id in ranks} <= {
+        payload["sample_1"],
+        payload["sample_2"],
+    }:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Ranked samples do not match the comparison",
+        )
+
+    model_names = comparison_votes.model_names(payload)
+    if settings.COMPARISON_WRITE_BEHIND_ENABLED and model_names is not None:
+        return _enqueue_comparison(
+            request,
+            request_obj,
+            response,
+            user_uuid,
+            redis,
+            payload,
+            ranks,
+            model_names,
+        )
+
     # Process session and identification headers
     user = None
     can_vote = True  # Default for anonymous users
@@ -201,16 +262,8 @@ def post_comparison(
             request_obj, response, db
         )
 
-    key = f"active_comparison:{request.comparison_details.token}"
-    token_data = redis.getdel(key)
-    if not token_data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="No active comparisons found",
-        )
-
-    metric_id, sample_data = token_data.decode("utf-8").split(":", 1)
-    sample_1_id, sample_2_id = map(uuid.UUID, sample_data.split(":", 1))
+    sample_1_id = uuid.UUID(payload["sample_1"])
+    sample_2_id = uuid.UUID(payload["sample_2"])
     samples = list(
         db.scalars(
             select(Sample).where(
@@ -219,23 +272,13 @@ def post_comparison(
         )
     )
 
-    sample_lookup = {sample.comparison_sample_id: sample for sample in samples}
-    sample_1 = sample_lookup[sample_1_id]
-    sample_2 = sample_lookup[sample_2_id]
-
-    ranks = []
-    for idx, sample_or_samples in enumerate(request.ordered_sample_ids):
-        rank = idx + 1
-
-        if isinstance(sample_or_samples, list):
-            for ranked_sample_id in sample_or_samples:
-                ranks.append((rank, sample_lookup[ranked_sample_id]))
-        else:
-            ranks.append((rank, sample_lookup[sample_or_samples]))
+    sample_lookup = {str(sample.comparison_sample_id): sample for sample in samples}
+    sample_1 = sample_lookup[payload["sample_1"]]
+    sample_2 = sample_lookup[payload["sample_2"]]
 
     metric = db.scalar(
         select(Metric).where(
-            Metric.external_id == metric_id,
+            Metric.external_id == payload["metric_id"],
         )
     )
 
@@ -250,6 +293,7 @@ def post_comparison(
     if can_vote:
         # Create a comparison record
         comparison = Comparison(
+            comparison_id=request.comparison_details.token,
             user_id=user.id if user else None,  # None for anonymous users
             metric_id=metric.id,
             test_set_id=test_set_id,
@@ -260,11 +304,11 @@ def post_comparison(
         db.flush()
 
         # Add rank records for each sample
-        for rank, sample in ranks:
+        for rank, sample_id in ranks:
             db.add(
                 ComparisonRank(
                     comparison_id=comparison.id,
-                    sample_id=sample.id,
+                    sample_id=sample_lookup[sample_id].id,
                     rank=rank,
                 )
             )
@@ -283,6 +327,37 @@ def post_comparison(
     }
 
 
+def _enqueue_comparison(
+    request, request_obj, response, user_uuid, redis, payload, ranks, model_names
+):
+    """Record a vote through the write-behind stream instead of the database.
+
+    Resolving users, identification tokens, samples and voting permissions is
+    left to the vote ingestion worker, so this path only touches Redis.
+    """
+    session_id, _ = am.process_session_headers(request_obj, response)
+    identification_token = am.process_identification_header(request_obj, response)
+
+    comparison_votes.append_vote(
+        redis,
+        {
+            "token": str(request.comparison_details.token),
+            "metric_id": payload["metric_id"],
+            "ranks": ranks,
+            "user_id": user_uuid,
+            "session_id": str(session_id),
+            "identification_token": str(identification_token),
+            "created": datetime.datetime.utcnow().isoformat(),
+        },
+    )
+
+    if comparison_votes.acquire_ingestion_lock(redis):
+        logger.info("Enqueuing vote ingestion task")
+        send_task("ingest_votes")
+
+    return model_names
+
+
 @timed_cache(hours=12)
 def _cached_metrics(db: Session):
     """Cache the metrics to avoid hitting the database repeatedly."""
@@ -505,6 +580,72 @@ def get_leaderboard(
     )
 
 
+@comparison_router.get("/api/leaderboard/updates")
+async def stream_leaderboard_updates(
+    request: Request,
+    metricName: Optional[str] = Query(None, description="Only updates for this metric"),
+    testSetName: Optional[str] = Query(
+        None, description="Only updates for this test set"
+    ),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    """
+    Stream leaderboard rating changes as Server-Sent Events.
+
+    Each `leaderboard_delta` event carries the model, prompt and sample entries
+    changed by one batch of ELO processing, with their new score and the change
+    in score and votes. Reconnecting clients that send `Last-Event-ID` receive
+    the events they missed.
+    """
+    return StreamingResponse(
+        _leaderboard_delta_events(request, metricName, testSetName, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _leaderboard_delta_events(request, metric_name, test_set_name, last_event_id):
+    redis = get_async_redis_client(RedisDatabase.COMPARISON)
+    try:
+        if leaderboard_deltas.is_stream_id(last_event_id):
+            stream_id = last_event_id
+        else:
+            # Start from the newest entry so nothing published from here on is missed
+            latest = await redis.xrevrange(
+                leaderboard_deltas.LEADERBOARD_DELTA_STREAM_KEY, count=1
+            )
+            stream_id = latest[0][0].decode("utf-8") if latest else "0-0"
+
+        while not await request.is_disconnected():
+            response = await redis.xread(
+                {leaderboard_deltas.LEADERBOARD_DELTA_STREAM_KEY: stream_id},
+                count=100,
+                block=LEADERBOARD_UPDATES_KEEPALIVE_MS,
+            )
+            if not response:
+                yield ": keep-alive\n\n"
+                continue
+
+            _, entries = response[0]
+            for entry_id, fields in entries:
+                stream_id = entry_id.decode("utf-8")
+                deltas = leaderboard_deltas.filter_deltas(
+                    json.loads(fields[b"deltas"]),
+                    metric_name=metric_name,
+                    test_set_name=test_set_name,
+                )
+                if not any(deltas.values()):
+                    continue
+
+                yield (
+                    f"id: {stream_id}\n"
+                    "event: leaderboard_delta\n"
+                    f"data: {json.dumps(deltas)}\n\n"
+                )
+    finally:
+        await redis.aclose()
+
+
 @comparison_router.get(
     "/api/leaderboard/model/stats",
     response_model=ModelSampleStatsResponse,
@@ -36,6 +36,24 @@ class Settings:
     LOG_LEVEL_STR = os.environ.get("LOG_LEVEL", "INFO")
     LOG_LEVEL = getattr(logging, LOG_LEVEL_STR.upper(), logging.INFO)
 
+    # Size the server queue by the free build slots that server worker hosts report
+    # instead of MAX_TASKS_server
+    SERVER_CAPACITY_AWARE = (
+        os.environ.get("SCHEDULER_SERVER_CAPACITY_AWARE", "false") == "true"
+    )
+    # Ignore capacity reports older than this
+    SERVER_CAPACITY_MAX_AGE = int(
+        os.environ.get("SCHEDULER_SERVER_CAPACITY_MAX_AGE", "120")
+    )
+
+    # Run consecutive cheap stages back to back in one task, see FUSED_STAGES
+    FUSE_STAGES = os.environ.get("SCHEDULER_FUSE_STAGES", "false") == "true"
+
+    # Execute the prompts of providers with a batch API as batch jobs of up to
+    # PROMPT_BATCH_SIZE prompts, each job taking one task of the prompt queue
+    BATCH_PROMPTS = os.environ.get("SCHEDULER_BATCH_PROMPTS", "false") == "true"
+    PROMPT_BATCH_SIZE = int(os.environ.get("SCHEDULER_PROMPT_BATCH_SIZE", "1000"))
+
     # Run sorting strategy
     RUN_SORTING_STRATEGY = "CREATED_ASC"  # Default to created ascending
 
@@ -60,6 +78,10 @@ class Settings:
     MAX_SCHEDULER_LOOPS_KEY = "MAX_SCHEDULER_LOOPS"
     SUBPROCESS_GRACEFUL_TIMEOUT_KEY = "SUBPROCESS_GRACEFUL_TIMEOUT"
     SUBPROCESS_RESTART_DELAY_KEY = "SUBPROCESS_RESTART_DELAY"
+    SERVER_CAPACITY_AWARE_KEY = "SERVER_CAPACITY_AWARE"
+    FUSE_STAGES_KEY = "FUSE_STAGES"
+    BATCH_PROMPTS_KEY = "BATCH_PROMPTS"
+    PROMPT_BATCH_SIZE_KEY = "PROMPT_BATCH_SIZE"
 
     # queue specific settings
     MAX_TASKS_PROMPT_KEY = "MAX_TASKS_prompt"
@@ -120,6 +142,14 @@ class Settings:
         self.SUBPROCESS_RESTART_DELAY = controls.get(
             self.SUBPROCESS_RESTART_DELAY_KEY, self.SUBPROCESS_RESTART_DELAY
         )
+        self.SERVER_CAPACITY_AWARE = controls.get(
+            self.SERVER_CAPACITY_AWARE_KEY, self.SERVER_CAPACITY_AWARE
+        )
+        self.FUSE_STAGES = controls.get(self.FUSE_STAGES_KEY, self.FUSE_STAGES)
+        self.BATCH_PROMPTS = controls.get(self.BATCH_PROMPTS_KEY, self.BATCH_PROMPTS)
+        self.PROMPT_BATCH_SIZE = controls.get(
+            self.PROMPT_BATCH_SIZE_KEY, self.PROMPT_BATCH_SIZE
+        )
 
         # Queue-specific settings
         self.MAX_TASKS_PROMPT = controls.get(
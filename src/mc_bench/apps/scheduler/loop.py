@@ -12,7 +12,9 @@ from sqlalchemy.orm import Session, selectinload
 from mc_bench.apps.scheduler.config import refresh_settings, settings
 from mc_bench.auth.permissions import PERM
 from mc_bench.constants import RUN_STAGE_STATE, RUN_STATE, STAGE
+from mc_bench.models.model import Model
 from mc_bench.models.run import (
+    PromptExecution,
     Run,
     RunStage,
     run_stage_state_id_for,
@@ -20,10 +22,12 @@ from mc_bench.models.run import (
     stage_id_for,
 )
 from mc_bench.models.user import User
+from mc_bench.util.capacity import free_slots
 from mc_bench.util.celery import make_client_celery_app
+from mc_bench.util.finalization import request_finalization
 from mc_bench.util.logging import get_logger
 from mc_bench.util.postgres import managed_session
-from mc_bench.util.redis import get_redis_client
+from mc_bench.util.redis import RedisDatabase, get_redis_client
 
 logger = get_logger(__name__)
 
@@ -49,6 +53,13 @@ PREVIOUS_STAGE_MAPPING = {
 
 REVERSE_QUEUE_MAPPING = {v: k for k, v in QUEUE_MAPPING.items()}
 
+# Cheap stages that a single task runs right after the stage they follow, by that
+# stage, with the name of the task
+FUSED_STAGES = {
+    STAGE.RESPONSE_PARSING: ("run.parse_and_validate", [STAGE.CODE_VALIDATION]),
+    STAGE.POST_PROCESSING: ("run.post_process_and_prepare", [STAGE.PREPARING_SAMPLE]),
+}
+
 
 def create_access_token(user_external_id: str) -> str:
     """
@@ -101,7 +112,7 @@ def get_queue_capacities(redis, max_queued_tasks: Dict[str, int]) -> List[str]:
 
 
 def get_pending_runs_for_stage_id(
-    db: Session, stage: STAGE, limit: int = 1
+    db: Session, stage: STAGE, limit: int = 1, options=()
 ) -> List[RunStage]:
     logger.info("Finding pending runs for stage", stage=stage.value)
     stage_id = stage_id_for(db, stage)
@@ -119,7 +130,7 @@ def get_pending_runs_for_stage_id(
             | (Run.state_id == run_state_id_for(db, RUN_STATE.IN_RETRY))
         )
         .filter(Run.id.in_(pending_stage_runs))
-        .options(selectinload(Run.stages))
+        .options(selectinload(Run.stages), *options)
         .with_for_update(skip_locked=True)
     )
 
@@ -176,6 +187,87 @@ def get_pending_runs_for_stage_id(
     return runs
 
 
+def get_fused_stages(db: Session, stage: RunStage, followers: List[STAGE]):
+    """The pending stages of the run of `stage` that are among `followers`."""
+    return db.scalars(
+        select(RunStage).where(
+            RunStage.run_id == stage.run_id,
+            RunStage.stage_slug.in_([follower.value for follower in followers]),
+            RunStage.state_id == run_stage_state_id_for(db, RUN_STAGE_STATE.PENDING),
+        )
+    ).all()
+
+
+def enqueue_stage(celery_app, db: Session, stage: RunStage, progress_token, fused):
+    """Enqueue the task of `stage`, together with its fused stages if `fused`."""
+    fused_stages = get_fused_stages(db, stage, fused[1]) if fused else []
+    for enqueued_stage in [stage, *fused_stages]:
+        enqueued_stage.state_id = run_stage_state_id_for(db, RUN_STAGE_STATE.ENQUEUED)
+    db.commit()
+    if fused_stages:
+        task_signature = stage.get_fused_task_signature(
+            celery_app, progress_token, fused[0]
+        )
+    else:
+        task_signature = stage.get_task_signature(
+            celery_app, progress_token, pass_args=True
+        )
+    task = task_signature.apply_async()
+    for enqueued_stage in [stage, *fused_stages]:
+        enqueued_stage.task_id = task.id
+    db.commit()
+
+
+def enqueue_prompt_batches(
+    celery_app, db: Session, queue_capacity: int, progress_token
+) -> None:
+    """Enqueue pending prompt stages, grouped into batch tasks by provider.
+
+    Each batch task takes up one place in the queue, like the task of a single
+    stage. Stages whose provider has no batch API are enqueued one by one.
+    """
+    stages = get_pending_runs_for_stage_id(
+        db,
+        STAGE.PROMPT_EXECUTION,
+        limit=queue_capacity * settings.PROMPT_BATCH_SIZE,
+        # Loaded with the runs rather than run by run below
+        options=[selectinload(Run.model).selectinload(Model.providers)],
+    )
+
+    batches: Dict[int, List[RunStage]] = {}
+    singles = []
+    for stage in stages:
+        provider = stage.run.model.default_provider
+        if provider.BATCH_API:
+            batches.setdefault(provider.id, []).append(stage)
+        else:
+            singles.append(stage)
+
+    chunks = [
+        provider_stages[start : start + settings.PROMPT_BATCH_SIZE]
+        for provider_stages in batches.values()
+        for start in range(0, len(provider_stages), settings.PROMPT_BATCH_SIZE)
+    ]
+    enqueued_state_id = run_stage_state_id_for(db, RUN_STAGE_STATE.ENQUEUED)
+    for chunk in chunks[:queue_capacity]:
+        for stage in chunk:
+            stage.state_id = enqueued_state_id
+        db.commit()
+        task = PromptExecution.get_batch_task_signature(
+            celery_app, progress_token, chunk
+        ).apply_async()
+        for stage in chunk:
+            stage.task_id = task.id
+        db.commit()
+        logger.info("Enqueued prompt batch", task_id=task.id, size=len(chunk))
+
+    for stage in singles[: max(queue_capacity - len(chunks), 0)]:
+        enqueue_stage(celery_app, db, stage, progress_token, None)
+
+    # Releases the stages left for a later loop
+    db.commit()
+
+
 def find_and_handle_stalled_tasks(celery_app, db: Session) -> bool:
     """
     Find any IN_PROGRESS stages that have missed their heartbeat,
@@ -370,20 +462,10 @@ def find_and_handle_failed_stages(celery_app, db: Session) -> bool:
 
         for generation_id in generation_tasks:
             try:
-                finalize_task = celery_app.signature(
-                    "generation.finalize_generation",
-                    args=[generation_id],
-                    queue="generation",
-                    headers={
-                        "enqueued_timestamp": datetime.datetime.now(
-                            tz=datetime.timezone.utc
-                        ).isoformat()
-                    },
-                )
-                finalize_task.apply_async()
-                logger.debug(
-                    f"Generation finalization task enqueued for generation {generation_id}"
-                )
+                if request_finalization(celery_app, generation_id):
+                    logger.debug(
+                        f"Generation finalization task enqueued for generation {generation_id}"
+                    )
             except Exception as e:
                 logger.exception(
                     f"Error enqueueing generation finalization task for generation {generation_id}: {str(e)}"
@@ -429,6 +511,7 @@ def scheduler_loop(max_loops=10):
     signal.signal(signal.SIGINT, child_signal_handler)
 
     redis = get_redis_client()
+    registry_redis = get_redis_client(RedisDatabase.MINECRAFT_SERVER_REGISTRY)
     loop_count = 0
     celery_app = make_client_celery_app()
 
@@ -450,6 +533,13 @@ def scheduler_loop(max_loops=10):
                 )
                 for queue in QUEUE_MAPPING.values()
             }
+            # Control values may be stored as JSON booleans or strings
+            if str(settings.SERVER_CAPACITY_AWARE).lower() == "true":
+                server_slots = free_slots(
+                    registry_redis, settings.SERVER_CAPACITY_MAX_AGE
+                )
+                logger.info("Free server slots", server_slots=server_slots)
+                max_queued_tasks["server"] = sum(server_slots.values())
             interval = settings.SCHEDULER_INTERVAL
 
             if settings.get_scheduler_mode(db) != "on":
@@ -463,22 +553,25 @@ def scheduler_loop(max_loops=10):
             queue_capacities = get_queue_capacities(redis, max_queued_tasks)
             logger.info("Queue Capacities", queue_capacities=dict(queue_capacities))
 
+            fuse_stages = str(settings.FUSE_STAGES).lower() == "true"
+            batch_prompts = str(settings.BATCH_PROMPTS).lower() == "true"
             for queue_name, queue_capacity in queue_capacities:
                 stage = REVERSE_QUEUE_MAPPING[queue_name]
+                if stage == STAGE.PROMPT_EXECUTION and batch_prompts:
+                    enqueue_prompt_batches(
+                        celery_app,
+                        db,
+                        queue_capacity,
+                        create_access_token(system_user_external_id),
+                    )
+                    continue
+
+                fused = FUSED_STAGES.get(stage) if fuse_stages else None
                 stages = get_pending_runs_for_stage_id(db, stage, limit=queue_capacity)
                 if stages:
                     for stage in stages:
-                        stage.state_id = run_stage_state_id_for(
-                            db, RUN_STAGE_STATE.ENQUEUED
-                        )
-                        db.commit()
                         progress_token = create_access_token(system_user_external_id)
-                        task_signature = stage.get_task_signature(
-                            celery_app, progress_token, pass_args=True
-                        )
-                        task = task_signature.apply_async()
-                        stage.task_id = task.id
-                        db.commit()
+                        enqueue_stage(celery_app, db, stage, progress_token, fused)
                 else:
                     logger.info("No stages to enqueue", queue_name=queue_name)
                     db.rollback()
@@ -1,4 +1,5 @@
-from mc_bench.events import on_event
+from mc_bench.events import on_events
+from mc_bench.events.stream import register_event_stream
 from mc_bench.events.types import (
     GenerationStateChanged,
     RunStageStateChanged,
@@ -15,6 +16,7 @@ configure_logging(humanize=settings.HUMANIZE_LOGS, level=settings.LOG_LEVEL)
 app = make_worker_celery_app()
 
 # Event handler registration
-on_event(RunStageStateChanged, RunStage.state_change_handler)
-on_event(RunStateChanged, Run.state_change_handler)
-on_event(GenerationStateChanged, Generation.state_change_handler)
+on_events(RunStageStateChanged, RunStage.state_change_handler)
+on_events(RunStateChanged, Run.state_change_handler)
+on_events(GenerationStateChanged, Generation.state_change_handler)
+register_event_stream(RunStageStateChanged, RunStateChanged, GenerationStateChanged)
@@ -5,6 +5,8 @@ import os
 class Settings:
     INTERNAL_OBJECT_BUCKET = os.environ["INTERNAL_OBJECT_BUCKET"]
     EXPORT_STRUCTURE_VIEWS = os.environ.get("EXPORT_STRUCTURE_VIEWS", "true") == "true"
+    # Capture the side views on a second server while the timelapse is recorded
+    EXPORT_PARALLEL_VIEWS = os.environ.get("EXPORT_PARALLEL_VIEWS", "false") == "true"
     EXPOSE_SERVER_PORTS = os.environ.get("EXPOSE_SERVER_PORTS", "false") == "true"
     HUMANIZE_LOGS = os.environ.get("HUMANIZE_LOGS", "false") == "true"
     BUILD_DELAY = os.environ.get("BUILD_DELAY_MS", "25")
@@ -17,5 +19,69 @@ class Settings:
         os.environ.get("LOG_INTERVAL_EXPORT_PERCENT", "10")
     )
 
+    # Keep warm Minecraft servers per version instead of starting one per task
+    MINECRAFT_SERVER_POOL_ENABLED = (
+        os.environ.get("MINECRAFT_SERVER_POOL_ENABLED", "false") == "true"
+    )
+    # Idle servers to keep per Minecraft version on each Docker host
+    MINECRAFT_SERVER_POOL_SIZE = int(os.environ.get("MINECRAFT_SERVER_POOL_SIZE", "2"))
+    # Leases a pooled server serves before it is recycled
+    MINECRAFT_SERVER_POOL_MAX_USES = int(
+        os.environ.get("MINECRAFT_SERVER_POOL_MAX_USES", "10")
+    )
+    # Command run in a released server to reset its world; servers are recycled
+    # after every lease when this is empty
+    MINECRAFT_SERVER_POOL_RESET_COMMAND = os.environ.get(
+        "MINECRAFT_SERVER_POOL_RESET_COMMAND", ""
+    )
+    MINECRAFT_SERVER_POOL_LEASE_TTL_SECONDS = int(
+        os.environ.get("MINECRAFT_SERVER_POOL_LEASE_TTL_SECONDS", "21600")
+    )
+    # Pin the server and builder images to digests instead of pulling them for
+    # every container
+    DOCKER_IMAGE_CACHE_ENABLED = (
+        os.environ.get("DOCKER_IMAGE_CACHE_ENABLED", "true") == "true"
+    )
+    DOCKER_IMAGE_REFRESH_SECONDS = int(
+        os.environ.get("DOCKER_IMAGE_REFRESH_SECONDS", "300")
+    )
+    # Minecraft versions whose server images are pulled when the worker starts
+    PREPULL_MINECRAFT_VERSIONS = [
+        version
+        for version in os.environ.get("PREPULL_MINECRAFT_VERSIONS", "1.21.1").split(",")
+        if version
+    ]
+    # CPU and memory limits of the server and builder containers, e.g. "2" and
+    # "4g"; empty for no limit
+    SERVER_CONTAINER_CPUS = float(os.environ.get("SERVER_CONTAINER_CPUS") or 0)
+    SERVER_CONTAINER_MEMORY = os.environ.get("SERVER_CONTAINER_MEMORY", "")
+    BUILDER_CONTAINER_CPUS = float(os.environ.get("BUILDER_CONTAINER_CPUS") or 0)
+    BUILDER_CONTAINER_MEMORY = os.environ.get("BUILDER_CONTAINER_MEMORY", "")
+    # Limit concurrent builds and exports on a host to what its resources fit,
+    # given the container limits above, and report the slots to the scheduler
+    BUILD_SLOTS_ENABLED = os.environ.get("BUILD_SLOTS_ENABLED", "false") == "true"
+    BUILD_SLOTS_RESERVED_CPUS = float(os.environ.get("BUILD_SLOTS_RESERVED_CPUS", "1"))
+    BUILD_SLOTS_RESERVED_MEMORY = os.environ.get("BUILD_SLOTS_RESERVED_MEMORY", "2g")
+    BUILD_SLOTS_MAX = int(os.environ.get("BUILD_SLOTS_MAX", "0"))
+    BUILD_SLOT_WAIT_SECONDS = int(os.environ.get("BUILD_SLOT_WAIT_SECONDS", "600"))
+    BUILD_SLOTS_REPORT_INTERVAL = int(
+        os.environ.get("BUILD_SLOTS_REPORT_INTERVAL", "30")
+    )
+    # Container log lines handed over per batch, and batches buffered before the
+    # log readers wait for the task to catch up
+    LOG_BATCH_SIZE = int(os.environ.get("LOG_BATCH_SIZE", "256"))
+    LOG_MAX_BATCHES = int(os.environ.get("LOG_MAX_BATCHES", "64"))
+    # Snapshot the world directory of the server after a build, so the export can
+    # capture the side views from it instead of replaying the commands. Only the
+    # parallel views job reads the snapshot, as the timelapse is recorded while the
+    # commands replay, so snapshots are not taken without EXPORT_PARALLEL_VIEWS
+    WORLD_SNAPSHOT_ENABLED = (
+        EXPORT_PARALLEL_VIEWS
+        and os.environ.get("WORLD_SNAPSHOT_ENABLED", "false") == "true"
+    )
+    WORLD_SNAPSHOT_PATH = os.environ.get("WORLD_SNAPSHOT_PATH", "/data/world")
+    # Parallel uploads when moving build and export artifacts to object storage
+    ARTIFACT_UPLOAD_WORKERS = int(os.environ.get("ARTIFACT_UPLOAD_WORKERS", "8"))
+
 
 settings = Settings()
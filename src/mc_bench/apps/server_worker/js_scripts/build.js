@@ -15,6 +15,8 @@ const STRUCTURE_NAME =
   process.env.STRUCTURE_NAME ||
   `structure_${new Date().toISOString().replace(/[:.]/g, "-")}`;
 const OUTDIR = process.env.OUTDIR || "out";
+// Flush the world to disk when done so it can be snapshotted for the export
+const SAVE_WORLD = process.env.SAVE_WORLD === "true";
 
 const mcdata = minecraftData(VERSION);
 // Create Set of valid block names for O(1) lookup
@@ -431,6 +433,10 @@ bot.once("spawn", async () => {
     // Verify the save worked
     await commandQueue.add(`//schem list`);
 
+    if (SAVE_WORLD) {
+      await commandQueue.add("/save-all flush");
+    }
+
     await commandQueue.waitForAll();
     // TODO: Fix waitForAll() to definitely work. We are seeing exits before //schem save command actually executes!
     console.log("Waiting 30 seconds to be sure everything is done!");
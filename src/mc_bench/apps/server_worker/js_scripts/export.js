@@ -27,6 +27,13 @@ const STRUCTURE_NAME =
   `structure_${new Date().toISOString().replace(/[:.]/g, "-")}`;
 const OUTDIR = process.env.OUTDIR || "out";
 const COMMANDS_PER_FRAME = parseInt(process.env.COMMANDS_PER_FRAME || "1");
+// "all" records the timelapse and then the cardinal views, "timelapse" and
+// "views" capture only one of them so both can run on separate servers
+const EXPORT_MODE = process.env.EXPORT_MODE || "all";
+const CAPTURE_TIMELAPSE = EXPORT_MODE !== "views";
+const CAPTURE_VIEWS = EXPORT_MODE !== "timelapse";
+// Servers restored from a snapshot of the built world already hold the build
+const REPLAY_COMMANDS = process.env.REPLAY_COMMANDS !== "false";
 
 class Recorder {
   constructor(options = {}) {
@@ -314,7 +321,7 @@ class CommandQueue {
         await bot.chat(command);
         this.lastExecutionTime = Date.now();
 
-        if (coordinates) {
+        if (coordinates && CAPTURE_TIMELAPSE) {
           this.commandCount++;
 
           if (this.commandCount >= COMMANDS_PER_FRAME) {
@@ -761,13 +768,13 @@ bot.once("spawn", async () => {
     );
 
     // 1 second of initial video
-    for (let i = 0; i < 30; i++) {
+    for (let i = 0; CAPTURE_TIMELAPSE && i < 30; i++) {
       await recorder.captureFrame();
       // Small delay between frames to prevent overwhelming the system
       await new Promise((resolve) => setTimeout(resolve, 50));
     }
 
-    for (const command of commandList) {
+    for (const command of REPLAY_COMMANDS ? commandList : []) {
       if (command.kind === "fill") {
         commandQueue.add(
           command.command,
@@ -796,30 +803,42 @@ bot.once("spawn", async () => {
     }
     await commandQueue.waitForAll();
 
-    // After building is complete, capture a full rotation
-    console.log("Build complete, starting rotation capture...");
+    if (CAPTURE_TIMELAPSE) {
+      // After building is complete, capture a full rotation
+      console.log("Build complete, starting rotation capture...");
 
-    // Calculate how many frames we need for a full rotation
-    const framesForFullRotation = recorder.totalRotationFrames;
+      // Calculate how many frames we need for a full rotation
+      const framesForFullRotation = recorder.totalRotationFrames;
 
-    // Capture frames for the full rotation
-    for (let i = 0; i < framesForFullRotation; i++) {
-      await recorder.captureFrame();
-      // Small delay between frames to prevent overwhelming the system
-      await new Promise((resolve) => setTimeout(resolve, 50));
+      // Capture frames for the full rotation
+      for (let i = 0; i < framesForFullRotation; i++) {
+        await recorder.captureFrame();
+        // Small delay between frames to prevent overwhelming the system
+        await new Promise((resolve) => setTimeout(resolve, 50));
+      }
+
+      console.log("Rotation capture complete");
+    } else {
+      // Without the rotation, give the last block updates time to arrive
+      console.log("Build complete, waiting for the world to settle...");
+      await new Promise((resolve) => setTimeout(resolve, 1000 * 5));
     }
 
-    console.log("Rotation capture complete, capturing cardinal views...");
+    if (CAPTURE_VIEWS) {
+      console.log("Capturing cardinal views...");
 
-    // Capture cardinal direction views
-    const directions = ["north", "east", "south", "west"];
-    for (const direction of directions) {
-      await recorder.captureCardinalView(direction);
-      // Small delay between captures
-      await new Promise((resolve) => setTimeout(resolve, 100));
+      // Capture cardinal direction views
+      const directions = ["north", "east", "south", "west"];
+      for (const direction of directions) {
+        await recorder.captureCardinalView(direction);
+        // Small delay between captures
+        await new Promise((resolve) => setTimeout(resolve, 100));
+      }
+
+      console.log("Cardinal views captured");
     }
 
-    console.log("Cardinal views captured, processing video...");
+    console.log("Processing video...");
 
     await commandQueue.waitForAll();
 
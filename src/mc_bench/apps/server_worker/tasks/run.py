@@ -1,27 +1,41 @@
 import json
+import logging
 import os
+import posixpath
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from io import BytesIO
 
+from celery.signals import worker_ready
+
 from mc_bench.minecraft.server import (
     calculate_expected_frames,
     cleanup,
-    copy_from_container,
     create_network,
-    create_volume,
     get_file_from_container,
     run_builder,
     start_server,
-    wait_for_server,
+)
+from mc_bench.minecraft.server.images import ImageCache, container_images
+from mc_bench.minecraft.server.pool import ServerPool
+from mc_bench.minecraft.server.slots import ContainerLimits, HostSlots
+from mc_bench.minecraft.server.transfer import (
+    ContainerArtifact,
+    upload_archive,
+    upload_from_containers,
 )
 from mc_bench.models.run import (
     Artifact,
     Building,
     ExportingContent,
 )
-from mc_bench.util.docker import wait_for_containers
+from mc_bench.util.docker import ContainerSupervisor, LineMatcher
 from mc_bench.util.logging import get_logger
 from mc_bench.util.object_store import get_client
+from mc_bench.util.redis import RedisDatabase, get_redis_client
 from mc_bench.worker.run_stage import StageContext, run_stage_task
 
 from ..app import app
@@ -30,6 +44,16 @@ from ..templates import build_template, export_template
 
 logger = get_logger(__name__)
 
+BUILD_COMMAND_PATTERN = rb"/setblock|/fill"
+
+EXPORT_VIEW_KEYS = [
+    "northside_capture",
+    "southside_capture",
+    "eastside_capture",
+    "westside_capture",
+]
+EXPORT_ALL_KEYS = EXPORT_VIEW_KEYS + ["timelapse"]
+
 
 def _get_server_image(minecraft_version: str) -> str:
     default_image = f"registry.digitalocean.com/mcbench/gameservers:minecraft-{minecraft_version}-latest"
@@ -43,6 +67,350 @@ def _get_builder_image() -> str:
     )
 
 
+@lru_cache
+def _get_image_cache():
+    """Image cache of the process, shared by its tasks, or None if disabled."""
+    if os.environ.get("NO_IMAGE_PULL") or not settings.DOCKER_IMAGE_CACHE_ENABLED:
+        return None
+
+    return ImageCache(
+        get_redis_client(RedisDatabase.CACHE),
+        refresh_interval=settings.DOCKER_IMAGE_REFRESH_SECONDS,
+    )
+
+
+@worker_ready.connect
+def prepull_images(**kwargs):
+    """Pull the server and builder images in the background as the worker starts."""
+    image_cache = _get_image_cache()
+    if image_cache is None:
+        return
+
+    images = [_get_builder_image()] + [
+        _get_server_image(minecraft_version)
+        for minecraft_version in settings.PREPULL_MINECRAFT_VERSIONS
+    ]
+
+    def prepull():
+        pinned = image_cache.prepull(images)
+        logger.info("Pinned docker images", images=pinned)
+
+    threading.Thread(target=prepull, daemon=True).start()
+
+
+def _log_container_images(server_id, builder_id, **context):
+    """Log the pinned images a build or export ran with."""
+    try:
+        images = container_images([server_id, builder_id])
+    except Exception:
+        logger.exception("Error looking up container images", **context)
+        return
+
+    logger.info(
+        "Container images",
+        server_image=images[server_id],
+        builder_image=images[builder_id],
+        **context,
+    )
+
+
+def _server_limits():
+    return ContainerLimits(
+        cpus=settings.SERVER_CONTAINER_CPUS, memory=settings.SERVER_CONTAINER_MEMORY
+    )
+
+
+def _builder_limits():
+    return ContainerLimits(
+        cpus=settings.BUILDER_CONTAINER_CPUS, memory=settings.BUILDER_CONTAINER_MEMORY
+    )
+
+
+def _get_host_slots():
+    if not settings.BUILD_SLOTS_ENABLED:
+        return None
+
+    return HostSlots(
+        get_redis_client(RedisDatabase.MINECRAFT_SERVER_REGISTRY),
+        server=_server_limits(),
+        builder=_builder_limits(),
+        reserved_cpus=settings.BUILD_SLOTS_RESERVED_CPUS,
+        reserved_memory=settings.BUILD_SLOTS_RESERVED_MEMORY or None,
+        max_slots=settings.BUILD_SLOTS_MAX,
+        slots_per_task=2 if settings.EXPORT_PARALLEL_VIEWS else 1,
+    )
+
+
+@contextmanager
+def _build_slot(holder, count=1):
+    """Hold `count` build slots of this Docker host, if slots are enabled."""
+    host_slots = _get_host_slots()
+    if host_slots is None:
+        yield
+        return
+
+    with host_slots.slot(holder, timeout=settings.BUILD_SLOT_WAIT_SECONDS, count=count):
+        yield
+
+
+def _export_slots():
+    """Slots an export takes: one per server and builder pair it runs at once."""
+    if not settings.EXPORT_PARALLEL_VIEWS:
+        return 1
+
+    # Hosts too small for both jobs at once run them one after the other
+    host_slots = _get_host_slots()
+    if host_slots is not None and host_slots.capacity < 2:
+        return 1
+
+    return 2
+
+
+@worker_ready.connect
+def report_build_slots(**kwargs):
+    """Keep publishing the build slots of this host while the worker runs."""
+    host_slots = _get_host_slots()
+    if host_slots is None:
+        return
+
+    def report():
+        while True:
+            host_slots.report()
+            time.sleep(settings.BUILD_SLOTS_REPORT_INTERVAL)
+
+    threading.Thread(target=report, daemon=True).start()
+
+
+def _get_server_pool():
+    if not settings.MINECRAFT_SERVER_POOL_ENABLED:
+        return None
+
+    return ServerPool(
+        get_redis_client(RedisDatabase.MINECRAFT_SERVER_REGISTRY),
+        size=settings.MINECRAFT_SERVER_POOL_SIZE,
+        max_uses=settings.MINECRAFT_SERVER_POOL_MAX_USES,
+        reset_command=settings.MINECRAFT_SERVER_POOL_RESET_COMMAND or None,
+        lease_ttl_seconds=settings.MINECRAFT_SERVER_POOL_LEASE_TTL_SECONDS,
+        expose_ports=settings.EXPOSE_SERVER_PORTS,
+        image_cache=_get_image_cache(),
+        resources=_server_limits().container_kwargs(),
+    )
+
+
+def _lease_server(server_pool, minecraft_version):
+    if server_pool is None:
+        return None
+
+    try:
+        return server_pool.lease(minecraft_version)
+    except Exception:
+        logger.exception("Error leasing pooled server, starting ephemeral server")
+        return None
+
+
+def _return_server(server_pool, lease, minecraft_version, reusable):
+    """Release the leased server and top up the pool once the task is done with it."""
+    if server_pool is None:
+        return
+
+    try:
+        if lease is not None:
+            server_pool.release(lease, reusable=reusable)
+        else:
+            server_pool.ensure_warm(
+                minecraft_version, _get_server_image(minecraft_version)
+            )
+    except Exception:
+        logger.exception("Error returning server to the pool")
+
+
+def _log_container_lines(container_lookup, batch):
+    # Keep individual container logs at DEBUG level - very high cardinality
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+
+    container_name = container_lookup[batch.container_id]
+    for log_line in batch.lines:
+        logger.debug(
+            "Container log",
+            container_name=container_name,
+            container_id=batch.container_id,
+            log_line=log_line,
+        )
+
+
+def _object_name(spec):
+    return spec["object_prototype"].materialize(**spec["object_parts"]).get_path()
+
+
+def _upload_from_containers(file_spec, files):
+    """Upload (container id, file spec key) pairs straight from the containers."""
+    upload_from_containers(
+        get_client(),
+        settings.INTERNAL_OBJECT_BUCKET,
+        [
+            ContainerArtifact(
+                container_id=container_id,
+                container_path=file_spec[file_key]["container_path"],
+                object_name=_object_name(file_spec[file_key]),
+            )
+            for container_id, file_key in files
+        ],
+        max_workers=settings.ARTIFACT_UPLOAD_WORKERS,
+    )
+
+
+def _add_artifacts(db, file_spec, run_id, sample_id):
+    db.add_all(
+        [
+            Artifact(
+                kind=spec["artifact_kind"],
+                run_id=run_id,
+                sample_id=sample_id,
+                bucket=settings.INTERNAL_OBJECT_BUCKET,
+                key=_object_name(spec),
+            )
+            for spec in file_spec.values()
+        ]
+    )
+
+
+def _run_export_job(
+    minecraft_version,
+    suffix,
+    export_script,
+    structure_name,
+    file_spec,
+    env,
+    mode,
+    artifact_keys,
+    on_batch=None,
+    on_progress=None,
+    world_snapshot=None,
+):
+    """Run the export script in `mode` on its own server and upload its artifacts.
+
+    `mode` is "all", "timelapse" or "views" and selects what the script captures.
+    `on_batch` is called with the builder container id for every batch of logs and
+    `on_progress` with stage notes. With a `world_snapshot` artifact, the server
+    starts from the built world and the commands are not replayed. The caller holds
+    the build slots of the job.
+    """
+    on_progress = on_progress or (lambda note: None)
+    # Pooled servers have already loaded their own world
+    server_pool = _get_server_pool() if world_snapshot is None else None
+    lease = _lease_server(server_pool, minecraft_version)
+    network_name = lease.network_name if lease else create_network(suffix)
+
+    # set here in case we fail in the try/except below before they get set
+    builder_id = None
+    server_id = None
+    succeeded = False
+    # Pooled servers have logged earlier tasks' commands already
+    logs_since = time.time() if lease else None
+
+    try:
+        if lease:
+            server_id = lease.container_id
+        elif world_snapshot is not None:
+            on_progress("restoring built world")
+            server_id = _start_snapshot_server(
+                minecraft_version, network_name, suffix, world_snapshot
+            )
+            env = {"REPLAY_COMMANDS": "false", **env}
+        else:
+            on_progress("starting ephemeral minecraft server")
+            server_id = _start_ephemeral_server(
+                minecraft_version, network_name, suffix
+            )
+
+        on_progress("starting build")
+
+        builder = run_builder(
+            image=_get_builder_image(),
+            network_name=network_name,
+            server_container_id=server_id,
+            suffix=suffix,
+            build_script=export_script,
+            structure_name=structure_name,
+            env={"EXPORT_MODE": mode, **env},
+            image_cache=_get_image_cache(),
+            **_builder_limits().container_kwargs(),
+        )
+        builder_id = builder.id
+        _log_container_images(
+            server_id, builder_id, structure_name=structure_name, mode=mode
+        )
+
+        container_lookup = {
+            builder_id: "builder",
+            server_id: "server",
+        }
+
+        with ContainerSupervisor(
+            [builder_id, server_id],
+            since=logs_since,
+            max_batches=settings.LOG_MAX_BATCHES,
+            batch_size=settings.LOG_BATCH_SIZE,
+        ) as supervisor:
+            for batch in supervisor.batches():
+                _log_container_lines(container_lookup, batch)
+                if on_batch is not None:
+                    on_batch(builder_id)
+
+        on_progress("uploading content")
+        _upload_from_containers(
+            file_spec, [(builder_id, key) for key in artifact_keys]
+        )
+        succeeded = True
+    finally:
+        if lease:
+            cleanup(None, None, builder_id)
+        else:
+            cleanup(network_name, server_id, builder_id)
+        _return_server(server_pool, lease, minecraft_version, reusable=succeeded)
+
+
+def _start_snapshot_server(minecraft_version, network_name, suffix, world_snapshot):
+    """Start an ephemeral server whose world is restored from a build snapshot."""
+    response = get_client().get_object(
+        bucket_name=world_snapshot.bucket,
+        object_name=world_snapshot.key,
+    )
+    try:
+        return _start_ephemeral_server(
+            minecraft_version,
+            network_name,
+            suffix,
+            archive=response,
+            archive_path=posixpath.dirname(settings.WORLD_SNAPSHOT_PATH),
+        )
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def _start_ephemeral_server(minecraft_version, network_name, suffix, **kwargs):
+    server_args = dict(
+        image=_get_server_image(minecraft_version),
+        network_name=network_name,
+        suffix=suffix,
+        image_cache=_get_image_cache(),
+        resources=_server_limits().container_kwargs(),
+        **kwargs,
+    )
+
+    if settings.EXPOSE_SERVER_PORTS:
+        import random
+
+        server_args["ports"] = {
+            "25565/tcp": random.choice(range(26565, 27565 + 1000)),
+        }
+
+    server = start_server(**server_args, wait=True)
+    return server.id
+
+
 @run_stage_task(
     name="run.build_structure",
     app=app,
@@ -52,6 +420,11 @@ def _get_builder_image() -> str:
     restart_run_on_failure=True,
 )
 def build_structure(stage_context: StageContext):
+    with _build_slot(f"{stage_context.task_id}-build"):
+        return _build_structure(stage_context)
+
+
+def _build_structure(stage_context: StageContext):
     sample = stage_context.sample
     run = stage_context.run
     minecraft_version = run.template.minecraft_version
@@ -60,47 +433,39 @@ def build_structure(stage_context: StageContext):
     run_id = run.id
 
     suffix = f"{stage_context.task_id}-{int(time.time())}"
-    network_name = create_network(suffix)
+    server_pool = _get_server_pool()
+    lease = _lease_server(server_pool, minecraft_version)
+    network_name = lease.network_name if lease else create_network(suffix)
     structure_name = f"sample_{sample_id}"
 
     file_spec = sample.build_artifact_spec(
         db=stage_context.db,
         structure_name=structure_name,
+        world_snapshot_path=(
+            settings.WORLD_SNAPSHOT_PATH if settings.WORLD_SNAPSHOT_ENABLED else None
+        ),
     )
 
     build_script = build_template.replace(
         "async function buildCreation(startX, startY, startZ) {}", code
     )
 
-    volume = create_volume(build_script)
-
     # set here in case we fail in the try/except below before they get set
     builder_id = None
     server_id = None
+    succeeded = False
+    # Pooled servers have logged earlier tasks' commands already
+    logs_since = time.time() if lease else None
 
     try:
-        stage_context.update_stage_progress(
-            progress=0,
-            note="starting ephemeral minecraft server",
-        )
-
-        server_args = dict(
-            image=_get_server_image(minecraft_version),
-            network_name=network_name,
-            suffix=suffix,
-        )
-
-        if settings.EXPOSE_SERVER_PORTS:
-            import random
-
-            server_args["ports"] = {
-                "25565/tcp": random.choice(range(26565, 27565 + 1000)),
-            }
-
-        server = start_server(**server_args)
-        server_id = server.id
-
-        wait_for_server(server_id)
+        if lease:
+            server_id = lease.container_id
+        else:
+            stage_context.update_stage_progress(
+                progress=0,
+                note="starting ephemeral minecraft server",
+            )
+            server_id = _start_ephemeral_server(minecraft_version, network_name, suffix)
 
         stage_context.update_stage_progress(
             progress=0,
@@ -112,16 +477,20 @@ def build_structure(stage_context: StageContext):
             network_name=network_name,
             server_container_id=server_id,
             suffix=suffix,
-            build_script_volume=volume,
+            build_script=build_script,
             structure_name=structure_name,
             env={
                 "VERSION": minecraft_version,
                 "DELAY": settings.BUILD_DELAY,
+                "SAVE_WORLD": "true" if "world_snapshot" in file_spec else "false",
             },
+            image_cache=_get_image_cache(),
+            **_builder_limits().container_kwargs(),
         )
 
         builder = run_builder(**builder_args)
         builder_id = builder.id
+        _log_container_images(server_id, builder_id, run_id=run_id, sample_id=sample_id)
 
         build_command_count = 0
 
@@ -130,22 +499,26 @@ def build_structure(stage_context: StageContext):
             server_id: "server",
         }
 
-        for log_item in wait_for_containers([builder_id, server_id]):
-            container_id, log_line = log_item.container_id, log_item.log_line
-            container_name = container_lookup[container_id]
-            decoded_log_line = log_line.decode("utf-8")
-            # Keep individual container logs at DEBUG level - very high cardinality
-            logger.debug(f"{container_name}({container_id}): {decoded_log_line}")
-            last_command_count_logged = build_command_count
-
-            if container_name == "server":
-                if "/setblock" in decoded_log_line or "/fill" in decoded_log_line:
-                    build_command_count += 1
+        with ContainerSupervisor(
+            [builder_id, server_id],
+            since=logs_since,
+            matchers=[
+                LineMatcher(
+                    "build_commands", BUILD_COMMAND_PATTERN, container_ids=[server_id]
+                )
+            ],
+            max_batches=settings.LOG_MAX_BATCHES,
+            batch_size=settings.LOG_BATCH_SIZE,
+        ) as supervisor:
+            for batch in supervisor.batches():
+                _log_container_lines(container_lookup, batch)
+                last_command_count_logged = build_command_count
+                build_command_count = supervisor.counts["build_commands"]
 
                 if (
-                    build_command_count != last_command_count_logged
-                    and build_command_count > 1
-                    and build_command_count % settings.LOG_INTERVAL_COMMANDS == 0
+                    build_command_count > 1
+                    and build_command_count // settings.LOG_INTERVAL_COMMANDS
+                    > last_command_count_logged // settings.LOG_INTERVAL_COMMANDS
                 ):
                     # Add INFO log with configurable interval
                     logger.info(
@@ -155,40 +528,38 @@ def build_structure(stage_context: StageContext):
                         progress=0,
                         note=f"building... ({build_command_count} build commands executed)",
                     )
-                    last_command_count_logged = build_command_count
 
         stage_context.update_stage_progress(
             progress=0.9,
             note="build complete, uploading artifacts",
         )
 
-        for container_id, file_key in [
-            (server_id, "schematic"),
-            (builder_id, "command_list"),
-            (builder_id, "build_summary"),
-        ]:
-            copy_from_container(
-                container_name=container_id,
-                container_path=file_spec[file_key]["container_path"],
-                host_path=file_spec[file_key]["host_path_directory"],
+        _upload_from_containers(
+            file_spec,
+            [
+                (server_id, "schematic"),
+                (builder_id, "command_list"),
+                (builder_id, "build_summary"),
+            ],
+        )
+        if "world_snapshot" in file_spec:
+            upload_archive(
+                get_client(),
+                settings.INTERNAL_OBJECT_BUCKET,
+                server_id,
+                file_spec["world_snapshot"]["container_path"],
+                _object_name(file_spec["world_snapshot"]),
             )
+        succeeded = True
     finally:
-        cleanup(network_name, server_id, builder_id, volume)
+        if lease:
+            cleanup(None, None, builder_id)
+        else:
+            cleanup(network_name, server_id, builder_id)
+        _return_server(server_pool, lease, minecraft_version, reusable=succeeded)
 
     object_client = get_client()
 
-    for file_key in ["schematic", "command_list", "build_summary"]:
-        object_client.fput_object(
-            bucket_name=settings.INTERNAL_OBJECT_BUCKET,
-            object_name=file_spec[file_key]["object_prototype"]
-            .materialize(**file_spec[file_key]["object_parts"])
-            .get_path(),
-            file_path=os.path.join(
-                file_spec[file_key]["host_path_directory"],
-                file_spec[file_key]["host_file"],
-            ),
-        )
-
     object_client.put_object(
         bucket_name=settings.INTERNAL_OBJECT_BUCKET,
         object_name=file_spec["build_script"]["object_prototype"]
@@ -198,15 +569,7 @@ def build_structure(stage_context: StageContext):
         length=len(build_script.encode("utf-8")),
     )
 
-    for file_key, spec in file_spec.items():
-        artifact = Artifact(
-            kind=spec["artifact_kind"],
-            run_id=run_id,
-            sample_id=sample_id,
-            bucket=settings.INTERNAL_OBJECT_BUCKET,
-            key=spec["object_prototype"].materialize(**spec["object_parts"]).get_path(),
-        )
-        stage_context.db.add(artifact)
+    _add_artifacts(stage_context.db, file_spec, run_id, sample_id)
     stage_context.db.commit()
 
     return stage_context.run_id, stage_context.sample.id
@@ -228,6 +591,7 @@ def export_structure_views(stage_context: StageContext):
     run_id = run.id
     command_list_artifact = sample.get_command_list_artifact()
     summary_artifact = sample.get_build_summary_artifact()
+    world_snapshot = sample.get_world_snapshot_artifact()
 
     structure_name = f"sample_{sample_id}"
 
@@ -257,119 +621,84 @@ def export_structure_views(stage_context: StageContext):
         return stage_context.run_id, stage_context.sample_id
 
     suffix = f"{stage_context.task_id}-{int(time.time())}"
-    network_name = create_network(suffix)
-
-    volume = create_volume(export_script)
-
-    # set here in case we fail in the try/except below before they get set
-    builder_id = None
-    server_id = None
-
-    try:
-        stage_context.update_stage_progress(
-            progress=0,
-            note="starting ephemeral minecraft server",
-        )
-
-        server_args = dict(
-            image=_get_server_image(minecraft_version),
-            network_name=network_name,
-            suffix=suffix,
-        )
-
-        if settings.EXPOSE_SERVER_PORTS:
-            import random
-
-            server_args["ports"] = {
-                "25565/tcp": random.choice(range(26565, 27565 + 1000)),
-            }
+    expected_frame_count = calculate_expected_frames(
+        command_list=command_list,
+    )
 
-        server = start_server(**server_args)
-        server_id = server.id
-        progress = 0.0
+    logger.info(
+        "Expected frame count", expected_frame_count=expected_frame_count
+    )  # Keep as info - important configuration detail
 
-        wait_for_server(server_id)
+    progress = 0.0
+    last_retrieved_time = time.monotonic()
 
-        stage_context.update_stage_progress(
-            progress=progress,
-            note="starting build",
-        )
-
-        builder = run_builder(
-            image=_get_builder_image(),
-            network_name=network_name,
-            server_container_id=server_id,
-            suffix=suffix,
-            build_script_volume=volume,
-            structure_name=structure_name,
-            env={"COMMANDS_PER_FRAME": str(get_frames_per_command(len(command_list)))},
-        )
-        builder_id = builder.id
+    def report_progress(builder_id):
+        nonlocal progress, last_retrieved_time
+        if time.monotonic() - last_retrieved_time <= 20:
+            return
 
         last_retrieved_time = time.monotonic()
-        expected_frame_count = calculate_expected_frames(
-            command_list=command_list,
+        frame_count_data = get_file_from_container(
+            builder_id, file_path="/data/frame_count.txt"
         )
-
-        logger.info(
-            "Expected frame count", expected_frame_count=expected_frame_count
-        )  # Keep as info - important configuration detail
-
-        container_lookup = {
-            builder_id: "builder",
-            server_id: "server",
-        }
-
-        for log_item in wait_for_containers([builder_id, server_id]):
-            container_id, log_line = log_item.container_id, log_item.log_line
-            container_name = container_lookup[container_id]
-            decoded_log_line = log_line.decode("utf-8")
-            if time.monotonic() - last_retrieved_time > 20:
-                last_retrieved_time = time.monotonic()
-                frame_count_data = get_file_from_container(
-                    builder_id, file_path="/data/frame_count.txt"
+        if frame_count_data:
+            frame_count = int(frame_count_data.strip())
+            progress = frame_count / expected_frame_count
+            stage_context.update_stage_progress(
+                progress=progress,
+                note=f"exporting cinematic frames (~{frame_count}/{expected_frame_count})",
+            )
+            # Add INFO log with frame count at configurable percentage intervals
+            interval_frames = (
+                expected_frame_count * settings.LOG_INTERVAL_EXPORT_PERCENT // 100
+            )
+            if interval_frames > 0 and frame_count % interval_frames == 0:
+                logger.info(
+                    f"Export progress: {frame_count}/{expected_frame_count} frames ({progress:.1%})"
                 )
-                if frame_count_data:
-                    frame_count = int(frame_count_data.strip())
-                    progress = frame_count / expected_frame_count
-                    stage_context.update_stage_progress(
-                        progress=progress,
-                        note=f"exporting cinematic frames (~{frame_count}/{expected_frame_count})",
-                    )
-                    # Add INFO log with frame count at configurable percentage intervals
-                    interval_frames = (
-                        expected_frame_count
-                        * settings.LOG_INTERVAL_EXPORT_PERCENT
-                        // 100
-                    )
-                    if interval_frames > 0 and frame_count % interval_frames == 0:
-                        logger.info(
-                            f"Export progress: {frame_count}/{expected_frame_count} frames ({progress:.1%})"
-                        )
-
-            # Keep individual container logs at DEBUG level - very high cardinality
-            logger.debug(f"{container_name}({container_id}): {decoded_log_line}")
-
-        stage_context.update_stage_progress(
-            progress=progress,
-            note="uploading content",
-        )
 
-        copy_from_container(
-            container_name=builder.id,
-            container_path=file_spec["timelapse"]["container_path"],
-            host_path=file_spec["timelapse"]["host_path_directory"],
-        )
+    def update_progress(note):
+        stage_context.update_stage_progress(progress=progress, note=note)
 
-        for side in ["north", "south", "east", "west"]:
-            copy_from_container(
-                container_name=builder.id,
-                container_path=file_spec[f"{side}side_capture"]["container_path"],
-                host_path=file_spec[f"{side}side_capture"]["host_path_directory"],
-            )
+    timelapse_job = dict(
+        minecraft_version=minecraft_version,
+        suffix=suffix,
+        export_script=export_script,
+        structure_name=structure_name,
+        file_spec=file_spec,
+        env={"COMMANDS_PER_FRAME": str(get_frames_per_command(len(command_list)))},
+        on_batch=report_progress,
+        on_progress=update_progress,
+    )
 
-    finally:
-        cleanup(network_name, server_id, builder_id, volume)
+    # Both jobs run under one hold of all their slots, so an export never holds
+    # a slot while it waits for another
+    export_slots = _export_slots()
+    with _build_slot(suffix, count=export_slots):
+        if export_slots == 1:
+            _run_export_job(**timelapse_job, mode="all", artifact_keys=EXPORT_ALL_KEYS)
+        else:
+            # The views job only replays the commands, or restores the world built
+            # in the build stage, and renders four frames, so it runs beside the
+            # timelapse on its own server. Stage progress is reported
+            # from this thread only, as the stage context is not thread safe.
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                views = executor.submit(
+                    _run_export_job,
+                    minecraft_version=minecraft_version,
+                    suffix=f"{suffix}-views",
+                    export_script=export_script,
+                    structure_name=structure_name,
+                    file_spec=file_spec,
+                    env={"DELAY": settings.BUILD_DELAY},
+                    mode="views",
+                    artifact_keys=EXPORT_VIEW_KEYS,
+                    world_snapshot=world_snapshot,
+                )
+                _run_export_job(
+                    **timelapse_job, mode="timelapse", artifact_keys=["timelapse"]
+                )
+                views.result()
 
     object_client = get_client()
 
@@ -382,33 +711,7 @@ def export_structure_views(stage_context: StageContext):
         length=len(export_script.encode("utf-8")),
     )
 
-    for key in [
-        "northside_capture",
-        "southside_capture",
-        "eastside_capture",
-        "westside_capture",
-        "timelapse",
-    ]:
-        object_client.fput_object(
-            bucket_name=settings.INTERNAL_OBJECT_BUCKET,
-            object_name=file_spec[key]["object_prototype"]
-            .materialize(**file_spec[key]["object_parts"])
-            .get_path(),
-            file_path=os.path.join(
-                file_spec[key]["host_path_directory"],
-                file_spec[key]["host_file"],
-            ),
-        )
-
-    for key, spec in file_spec.items():
-        artifact = Artifact(
-            kind=spec["artifact_kind"],
-            run_id=run_id,
-            sample_id=sample_id,
-            bucket=settings.INTERNAL_OBJECT_BUCKET,
-            key=spec["object_prototype"].materialize(**spec["object_parts"]).get_path(),
-        )
-        stage_context.db.add(artifact)
+    _add_artifacts(stage_context.db, file_spec, run_id, sample_id)
 
     run_id = stage_context.run_id
     sample_id = stage_context.sample.id
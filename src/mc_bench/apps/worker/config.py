@@ -12,6 +12,28 @@ class Settings:
     ELO_K_FACTOR = float(os.environ.get("ELO_K_FACTOR", "32.0"))
     ELO_DEFAULT_SCORE = float(os.environ.get("ELO_DEFAULT_SCORE", "1000.0"))
     ELO_MIN_SCORE = float(os.environ.get("ELO_MIN_SCORE", "100.0"))
+    ELO_PUBLISH_DELTAS = os.environ.get("ELO_PUBLISH_DELTAS", "true") == "true"
+
+    # Write-behind vote ingestion settings
+    VOTE_INGESTION_BATCH_SIZE = int(os.environ.get("VOTE_INGESTION_BATCH_SIZE", "500"))
+    # Entries delivered this many times without being acknowledged are dead lettered
+    VOTE_INGESTION_MAX_DELIVERIES = int(
+        os.environ.get("VOTE_INGESTION_MAX_DELIVERIES", "5")
+    )
+
+    # Comparison pair pool settings
+    COMPARISON_POOL_TARGET_SIZE = int(
+        os.environ.get("COMPARISON_POOL_TARGET_SIZE", "1000")
+    )
+    COMPARISON_POOL_TTL_SECONDS = int(
+        os.environ.get("COMPARISON_POOL_TTL_SECONDS", "3600")
+    )
+    # Either "random" or "information_gain"
+    COMPARISON_POOL_STRATEGY = os.environ.get("COMPARISON_POOL_STRATEGY", "random")
+    # How many candidates to score per pooled pair with the information_gain strategy
+    COMPARISON_POOL_CANDIDATE_MULTIPLIER = int(
+        os.environ.get("COMPARISON_POOL_CANDIDATE_MULTIPLIER", "4")
+    )
 
 
 settings = Settings()
@@ -0,0 +1,173 @@
+"""
+Batch-level accumulation of tag-specific leaderboard updates.
+
+Every comparison fans out into one model and one prompt leaderboard update per
+scorable tag shared by the two samples, which made tag entries the largest
+multiplier on ELO query count. Instead of reading and writing those rows once per
+vote, the ELO task records tag-level matches here, applies them in order to
+in-memory ratings and writes every touched row once at the end of the batch.
+"""
+
+from collections import namedtuple
+
+from sqlalchemy import insert, select, update
+
+from mc_bench.models.comparison import ModelLeaderboard, PromptLeaderboard
+from mc_bench.util.elo import expected_score, update_elo
+from mc_bench.util.leaderboard_deltas import MODEL, PROMPT
+
+from .config import settings
+
+# Minimal stand-in for a leaderboard entry as seen by LeaderboardDeltaTracker
+EntrySnapshot = namedtuple("EntrySnapshot", ["id", "elo_score", "vote_count"])
+
+_TABLES = {
+    MODEL: (
+        ModelLeaderboard,
+        ("model_id", "metric_id", "test_set_id", "tag_id"),
+    ),
+    PROMPT: (
+        PromptLeaderboard,
+        ("prompt_id", "model_id", "metric_id", "test_set_id", "tag_id"),
+    ),
+}
+
+_COUNTERS = ("elo_score", "vote_count", "win_count", "loss_count", "tie_count")
+
+
+class TagLeaderboardBatch:
+    """Tag-specific model and prompt leaderboard rows touched by one ELO batch.
+
+    Keys follow the conventions of `process_comparison_for_elo`:
+    (model_id, metric_id, test_set_id, tag_id) for models and
+    (prompt_id, model_id, metric_id, test_set_id, tag_id) for prompts.
+    """
+
+    def __init__(self):
+        # (kind, key) -> row state, loaded at most once per batch
+        self._rows = {}
+        # Matches of the comparison currently being processed
+        self._pending = []
+
+    def record_match(self, kind, key_a, key_b, actual_a):
+        """Queue a tag-level match; `actual_a` is 1.0, 0.0 or 0.5 for a tie."""
+        self._pending.append((kind, key_a, key_b, actual_a))
+
+    def discard_pending(self):
+        """Drop the matches of a comparison that failed to process."""
+        self._pending = []
+
+    def apply_pending(self, db):
+        """Apply the matches of a successfully processed comparison in order."""
+        for kind, key_a, key_b, actual_a in self._pending:
+            row_a = self._get_row(db, kind, key_a)
+            row_b = self._get_row(db, kind, key_b)
+
+            rating_a = row_a["elo_score"]
+            rating_b = row_b["elo_score"]
+
+            for row, rating, opponent_rating, actual in (
+                (row_a, rating_a, rating_b, actual_a),
+                (row_b, rating_b, rating_a, 1.0 - actual_a),
+            ):
+                row["vote_count"] += 1
+                if actual == 1.0:
+                    row["win_count"] += 1
+                elif actual == 0.0:
+                    row["loss_count"] += 1
+                else:
+                    row["tie_count"] += 1
+
+                row["elo_score"] = update_elo(
+                    rating,
+                    expected_score(rating, opponent_rating),
+                    actual,
+                    settings.ELO_K_FACTOR,
+                    settings.ELO_MIN_SCORE,
+                )
+
+        self._pending = []
+
+    def flush(self, db, now, delta_tracker=None):
+        """Write every touched row once and report the changes to the tracker."""
+        for kind, (model, columns) in _TABLES.items():
+            rows = [
+                (key, row)
+                for (row_kind, key), row in self._rows.items()
+                if row_kind == kind
+            ]
+
+            new_rows = [(key, row) for key, row in rows if row["id"] is None]
+            existing_rows = [row for _, row in rows if row["id"] is not None]
+
+            if new_rows:
+                new_ids = db.scalars(
+                    insert(model).returning(model.id, sort_by_parameter_order=True),
+                    [
+                        {
+                            **dict(zip(columns, key)),
+                            **{counter: row[counter] for counter in _COUNTERS},
+                            "last_updated": now,
+                        }
+                        for key, row in new_rows
+                    ],
+                ).all()
+                for (_, row), new_id in zip(new_rows, new_ids):
+                    row["id"] = new_id
+
+            if existing_rows:
+                db.execute(
+                    update(model),
+                    [
+                        {
+                            "id": row["id"],
+                            **{counter: row[counter] for counter in _COUNTERS},
+                            "last_updated": now,
+                        }
+                        for row in existing_rows
+                    ],
+                )
+
+            if delta_tracker is not None:
+                delta_tracker.observe_before(
+                    kind,
+                    [EntrySnapshot(row["id"], *row["before"]) for _, row in rows],
+                )
+                delta_tracker.observe_after(
+                    kind,
+                    [
+                        EntrySnapshot(row["id"], row["elo_score"], row["vote_count"])
+                        for _, row in rows
+                    ],
+                )
+
+        self._rows = {}
+
+    def _get_row(self, db, kind, key):
+        if (kind, key) not in self._rows:
+            model, columns = _TABLES[kind]
+            existing = db.execute(
+                select(model.id, *[getattr(model, c) for c in _COUNTERS]).where(
+                    *[
+                        getattr(model, column) == value
+                        for column, value in zip(columns, key)
+                    ]
+                )
+            ).one_or_none()
+
+            if existing is None:
+                row = {
+                    "id": None,
+                    "elo_score": settings.ELO_DEFAULT_SCORE,
+                    "vote_count": 0,
+                    "win_count": 0,
+                    "loss_count": 0,
+                    "tie_count": 0,
+                }
+            else:
+                row = dict(existing._mapping)
+
+            row["before"] = (row["elo_score"], row["vote_count"])
+            self._rows[(kind, key)] = row
+
+        return self._rows[(kind, key)]
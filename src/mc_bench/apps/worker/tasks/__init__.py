@@ -1,5 +1,9 @@
+from .comparison_pool import refill_comparison_pool
 from .elo_calculation import elo_calculation
+from .vote_ingestion import ingest_votes
 
 __all__ = [
     "elo_calculation",
+    "ingest_votes",
+    "refill_comparison_pool",
 ]
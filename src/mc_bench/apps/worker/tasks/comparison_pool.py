@@ -0,0 +1,85 @@
+from mc_bench.util.comparison_pool import (
+    pool_size,
+    push_pairs,
+    query_pairs,
+    release_refill_lock,
+)
+from mc_bench.util.logging import get_logger
+from mc_bench.util.pair_selection import (
+    information_gain_scores,
+    load_pair_features,
+    select_weighted,
+)
+from mc_bench.util.postgres import managed_session
+from mc_bench.util.redis import RedisDatabase, get_redis_client
+
+from ..app import app
+from ..config import settings
+
+logger = get_logger(__name__)
+
+
+@app.task(name="refill_comparison_pool")
+def refill_comparison_pool(test_set_id):
+    redis = get_redis_client(RedisDatabase.COMPARISON)
+    added = 0
+
+    try:
+        current_size = pool_size(redis, test_set_id)
+        missing = settings.COMPARISON_POOL_TARGET_SIZE - current_size
+        logger.info(
+            "Refilling comparison pool",
+            test_set_id=test_set_id,
+            current_size=current_size,
+            missing=missing,
+        )
+
+        if missing > 0:
+            with managed_session() as db:
+                if settings.COMPARISON_POOL_STRATEGY == "information_gain":
+                    pairs = _select_informative_pairs(db, test_set_id, missing)
+                else:
+                    pairs = query_pairs(
+                        db, test_set_id=test_set_id, sample_count=missing
+                    )
+
+            added = push_pairs(
+                redis,
+                test_set_id,
+                pairs,
+                ttl_seconds=settings.COMPARISON_POOL_TTL_SECONDS,
+            )
+
+        logger.info("Comparison pool refilled", test_set_id=test_set_id, added=added)
+    finally:
+        try:
+            release_refill_lock(redis, test_set_id)
+        finally:
+            redis.close()
+
+    return {"added": added}
+
+
+def _select_informative_pairs(db, test_set_id, count):
+    candidates = query_pairs(
+        db,
+        test_set_id=test_set_id,
+        sample_count=count * settings.COMPARISON_POOL_CANDIDATE_MULTIPLIER,
+    )
+    if len(candidates) <= count:
+        return candidates
+
+    features = load_pair_features(
+        db,
+        test_set_id,
+        candidates,
+        default_rating=settings.ELO_DEFAULT_SCORE,
+    )
+    selected = select_weighted(information_gain_scores(**features), count)
+    logger.info(
+        "Selected informative comparison pairs",
+        test_set_id=test_set_id,
+        candidates=len(candidates),
+        selected=len(selected),
+    )
+    return [candidates[idx] for idx in selected]
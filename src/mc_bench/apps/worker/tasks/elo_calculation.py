@@ -11,14 +11,18 @@ from mc_bench.models.comparison import (
     PromptLeaderboard,
     SampleLeaderboard,
 )
+from mc_bench.models.prompt import scorable_tag_ids_by_prompt
 from mc_bench.models.run import Sample
+from mc_bench.util import leaderboard_deltas
 from mc_bench.util.elo import expected_score, update_elo
+from mc_bench.util.leaderboard_deltas import LeaderboardDeltaTracker
 from mc_bench.util.logging import get_logger
 from mc_bench.util.postgres import managed_session
 from mc_bench.util.redis import RedisDatabase, get_redis_client
 
 from ..app import app
 from ..config import settings
+from ..tag_leaderboards import TagLeaderboardBatch
 
 logger = get_logger(__name__)
 
@@ -115,11 +119,28 @@ def get_or_create_sample_leaderboard(db, sample_id, metric_id, test_set_id):
     return entry
 
 
-def process_comparison_for_elo(db, comparison_id):
+def process_comparison_for_elo(
+    db, comparison_id, delta_tracker=None, tag_batch=None, scorable_tags=None
+):
     """Process a single comparison to update ELO scores.
 
     Simplified to handle only binary comparisons (one winner, one loser) or ties.
+    If a `delta_tracker` is given, the touched leaderboard entries are recorded
+    on it so the batch's rating changes can be published.
+
+    Tag-specific updates are recorded on `tag_batch` and written when the caller
+    flushes it, together with the rest of the batch. Without a `tag_batch` the
+    comparison is processed standalone and committed immediately.
+    `scorable_tags` maps prompt ids to their scorable tag ids and is loaded when
+    not given.
     """
+    standalone = tag_batch is None
+    if standalone:
+        tag_batch = TagLeaderboardBatch()
+
+    if scorable_tags is None:
+        scorable_tags = load_scorable_tags(db)
+
     # Get the comparison
     comparison = db.scalar(select(Comparison).where(Comparison.id == comparison_id))
     if not comparison:
@@ -164,14 +185,9 @@ def process_comparison_for_elo(db, comparison_id):
             if not sample:
                 continue
 
-            # Fetch prompt tags
+            # Only tags with calculate_score=True get their own leaderboards
             prompt_id = sample.run.prompt_id
-            prompt_tag_query = text("""
-                SELECT pt.tag_id 
-                FROM specification.prompt_tag pt
-                WHERE pt.prompt_id = :prompt_id
-            """).bindparams(prompt_id=prompt_id)
-            tag_ids = db.execute(prompt_tag_query).scalars().all()
+            tag_ids = scorable_tags.get(prompt_id, frozenset())
 
             sample_data[sample_id] = {
                 "model_id": sample.run.model_id,
@@ -195,7 +211,7 @@ def process_comparison_for_elo(db, comparison_id):
             db, sample_id, comparison.metric_id, comparison.test_set_id
         )
 
-    # Get model leaderboard entries (both global and tag-specific)
+    # Get global model leaderboard entries, tag-specific ones live in tag_batch
     for sample_id, info in sample_data.items():
         model_id = info["model_id"]
 
@@ -206,20 +222,7 @@ def process_comparison_for_elo(db, comparison_id):
                 db, model_id, comparison.metric_id, comparison.test_set_id, None
             )
 
-        # Tag-specific model entries
-        for tag_id in info["tag_ids"]:
-            tag_model_key = (
-                model_id,
-                comparison.metric_id,
-                comparison.test_set_id,
-                tag_id,
-            )
-            if tag_model_key not in model_entries:
-                model_entries[tag_model_key] = get_or_create_model_leaderboard(
-                    db, model_id, comparison.metric_id, comparison.test_set_id, tag_id
-                )
-
-    # Get prompt leaderboard entries (both global and tag-specific)
+    # Get global prompt leaderboard entries, tag-specific ones live in tag_batch
     for sample_id, info in sample_data.items():
         prompt_id = info["prompt_id"]
 
@@ -242,24 +245,10 @@ def process_comparison_for_elo(db, comparison_id):
                 None,
             )
 
-        # Tag-specific prompt entries
-        for tag_id in info["tag_ids"]:
-            tag_prompt_key = (
-                prompt_id,
-                model_id,
-                comparison.metric_id,
-                comparison.test_set_id,
-                tag_id,
-            )
-            if tag_prompt_key not in prompt_entries:
-                prompt_entries[tag_prompt_key] = get_or_create_prompt_leaderboard(
-                    db,
-                    prompt_id,
-                    model_id,
-                    comparison.metric_id,
-                    comparison.test_set_id,
-                    tag_id,
-                )
+    if delta_tracker is not None:
+        delta_tracker.observe_before(leaderboard_deltas.MODEL, model_entries.values())
+        delta_tracker.observe_before(leaderboard_deltas.PROMPT, prompt_entries.values())
+        delta_tracker.observe_before(leaderboard_deltas.SAMPLE, sample_entries.values())
 
     # SIMPLIFIED PROCESSING OF WIN/LOSS OR TIE
 
@@ -444,130 +433,44 @@ def process_comparison_for_elo(db, comparison_id):
                 prompt_entries[prompt_a_key].elo_score = prompt_a_new_rating
                 prompt_entries[prompt_b_key].elo_score = prompt_b_new_rating
 
-                # Update tag-specific entries
-                # Get the intersection of tags for both samples
-                tags_a = set(sample_a["tag_ids"])
-                tags_b = set(sample_b["tag_ids"])
-                common_tags = tags_a.intersection(tags_b)
-
-                # Get list of tags that have calculate_score=True
-                calculate_score_tags_query = text("""
-                    SELECT t.id 
-                    FROM specification.tag t
-                    WHERE t.id = ANY(:tag_ids) AND t.calculate_score = TRUE
-                """).bindparams(tag_ids=list(common_tags))
-                scorable_tag_ids = set(
-                    db.execute(calculate_score_tags_query).scalars().all()
-                )
-
-                # Only process tags that are marked for score calculation
-                for tag_id in scorable_tag_ids:
-                    # MODEL TAG UPDATE
-                    tag_model_a_key = (
-                        model_a_id,
-                        comparison.metric_id,
-                        comparison.test_set_id,
-                        tag_id,
-                    )
-                    tag_model_b_key = (
-                        model_b_id,
-                        comparison.metric_id,
-                        comparison.test_set_id,
-                        tag_id,
-                    )
-
-                    # Update vote count
-                    model_entries[tag_model_a_key].vote_count += 1
-                    model_entries[tag_model_b_key].vote_count += 1
-
-                    # Update tie count
-                    model_entries[tag_model_a_key].tie_count += 1
-                    model_entries[tag_model_b_key].tie_count += 1
-
-                    # Calculate ELO
-                    tag_model_a_rating = model_entries[tag_model_a_key].elo_score
-                    tag_model_b_rating = model_entries[tag_model_b_key].elo_score
-
-                    tag_model_a_expected = expected_score(
-                        tag_model_a_rating, tag_model_b_rating
-                    )
-                    tag_model_b_expected = expected_score(
-                        tag_model_b_rating, tag_model_a_rating
-                    )
-
-                    # Update ELO scores
-                    tag_model_a_new_rating = update_elo(
-                        tag_model_a_rating,
-                        tag_model_a_expected,
-                        0.5,  # tie
-                        settings.ELO_K_FACTOR,
-                        settings.ELO_MIN_SCORE,
-                    )
-                    tag_model_b_new_rating = update_elo(
-                        tag_model_b_rating,
-                        tag_model_b_expected,
-                        0.5,  # tie
-                        settings.ELO_K_FACTOR,
-                        settings.ELO_MIN_SCORE,
-                    )
-
-                    model_entries[tag_model_a_key].elo_score = tag_model_a_new_rating
-                    model_entries[tag_model_b_key].elo_score = tag_model_b_new_rating
-
-                    # PROMPT TAG UPDATE
-                    tag_prompt_a_key = (
-                        prompt_a_id,
-                        model_a_id,
-                        comparison.metric_id,
-                        comparison.test_set_id,
-                        tag_id,
-                    )
-                    tag_prompt_b_key = (
-                        prompt_b_id,
-                        model_b_id,
-                        comparison.metric_id,
-                        comparison.test_set_id,
-                        tag_id,
-                    )
-
-                    # Update vote count
-                    prompt_entries[tag_prompt_a_key].vote_count += 1
-                    prompt_entries[tag_prompt_b_key].vote_count += 1
-
-                    # Update tie count
-                    prompt_entries[tag_prompt_a_key].tie_count += 1
-                    prompt_entries[tag_prompt_b_key].tie_count += 1
-
-                    # Calculate ELO
-                    tag_prompt_a_rating = prompt_entries[tag_prompt_a_key].elo_score
-                    tag_prompt_b_rating = prompt_entries[tag_prompt_b_key].elo_score
-
-                    tag_prompt_a_expected = expected_score(
-                        tag_prompt_a_rating, tag_prompt_b_rating
-                    )
-                    tag_prompt_b_expected = expected_score(
-                        tag_prompt_b_rating, tag_prompt_a_rating
-                    )
-
-                    # Update ELO scores
-                    tag_prompt_a_new_rating = update_elo(
-                        tag_prompt_a_rating,
-                        tag_prompt_a_expected,
+                # Update tag-specific entries for the scorable tags both samples share
+                common_tags = set(sample_a["tag_ids"]).intersection(sample_b["tag_ids"])
+                for tag_id in common_tags:
+                    tag_batch.record_match(
+                        leaderboard_deltas.MODEL,
+                        (
+                            model_a_id,
+                            comparison.metric_id,
+                            comparison.test_set_id,
+                            tag_id,
+                        ),
+                        (
+                            model_b_id,
+                            comparison.metric_id,
+                            comparison.test_set_id,
+                            tag_id,
+                        ),
                         0.5,  # tie
-                        settings.ELO_K_FACTOR,
-                        settings.ELO_MIN_SCORE,
                     )
-                    tag_prompt_b_new_rating = update_elo(
-                        tag_prompt_b_rating,
-                        tag_prompt_b_expected,
+                    tag_batch.record_match(
+                        leaderboard_deltas.PROMPT,
+                        (
+                            prompt_a_id,
+                            model_a_id,
+                            comparison.metric_id,
+                            comparison.test_set_id,
+                            tag_id,
+                        ),
+                        (
+                            prompt_b_id,
+                            model_b_id,
+                            comparison.metric_id,
+                            comparison.test_set_id,
+                            tag_id,
+                        ),
                         0.5,  # tie
-                        settings.ELO_K_FACTOR,
-                        settings.ELO_MIN_SCORE,
                     )
 
-                    prompt_entries[tag_prompt_a_key].elo_score = tag_prompt_a_new_rating
-                    prompt_entries[tag_prompt_b_key].elo_score = tag_prompt_b_new_rating
-
     else:
         # Win/loss case - we have two different ranks
         # First rank has the winners, second rank has the losers
@@ -749,146 +652,44 @@ def process_comparison_for_elo(db, comparison_id):
                 prompt_entries[winner_prompt_key].elo_score = winner_prompt_new_rating
                 prompt_entries[loser_prompt_key].elo_score = loser_prompt_new_rating
 
-                # Update tag-specific entries
-                # Get the intersection of tags for both samples
-                winner_tags = set(winner["tag_ids"])
-                loser_tags = set(loser["tag_ids"])
-                common_tags = winner_tags.intersection(loser_tags)
-
-                # Get list of tags that have calculate_score=True
-                calculate_score_tags_query = text("""
-                    SELECT t.id 
-                    FROM specification.tag t
-                    WHERE t.id = ANY(:tag_ids) AND t.calculate_score = TRUE
-                """).bindparams(tag_ids=list(common_tags))
-                scorable_tag_ids = set(
-                    db.execute(calculate_score_tags_query).scalars().all()
-                )
-
-                # Only process tags that are marked for score calculation
-                for tag_id in scorable_tag_ids:
-                    # MODEL TAG UPDATE
-                    tag_winner_model_key = (
-                        winner_model_id,
-                        comparison.metric_id,
-                        comparison.test_set_id,
-                        tag_id,
-                    )
-                    tag_loser_model_key = (
-                        loser_model_id,
-                        comparison.metric_id,
-                        comparison.test_set_id,
-                        tag_id,
-                    )
-
-                    # Update vote count
-                    model_entries[tag_winner_model_key].vote_count += 1
-                    model_entries[tag_loser_model_key].vote_count += 1
-
-                    # Update win/loss count
-                    model_entries[tag_winner_model_key].win_count += 1
-                    model_entries[tag_loser_model_key].loss_count += 1
-
-                    # Calculate ELO
-                    tag_winner_model_rating = model_entries[
-                        tag_winner_model_key
-                    ].elo_score
-                    tag_loser_model_rating = model_entries[
-                        tag_loser_model_key
-                    ].elo_score
-
-                    tag_winner_model_expected = expected_score(
-                        tag_winner_model_rating, tag_loser_model_rating
-                    )
-                    tag_loser_model_expected = expected_score(
-                        tag_loser_model_rating, tag_winner_model_rating
-                    )
-
-                    # Update ELO scores
-                    tag_winner_model_new_rating = update_elo(
-                        tag_winner_model_rating,
-                        tag_winner_model_expected,
+                # Update tag-specific entries for the scorable tags both samples share
+                common_tags = set(winner["tag_ids"]).intersection(loser["tag_ids"])
+                for tag_id in common_tags:
+                    tag_batch.record_match(
+                        leaderboard_deltas.MODEL,
+                        (
+                            winner_model_id,
+                            comparison.metric_id,
+                            comparison.test_set_id,
+                            tag_id,
+                        ),
+                        (
+                            loser_model_id,
+                            comparison.metric_id,
+                            comparison.test_set_id,
+                            tag_id,
+                        ),
                         1.0,  # win
-                        settings.ELO_K_FACTOR,
-                        settings.ELO_MIN_SCORE,
-                    )
-                    tag_loser_model_new_rating = update_elo(
-                        tag_loser_model_rating,
-                        tag_loser_model_expected,
-                        0.0,  # loss
-                        settings.ELO_K_FACTOR,
-                        settings.ELO_MIN_SCORE,
-                    )
-
-                    model_entries[
-                        tag_winner_model_key
-                    ].elo_score = tag_winner_model_new_rating
-                    model_entries[
-                        tag_loser_model_key
-                    ].elo_score = tag_loser_model_new_rating
-
-                    # PROMPT TAG UPDATE
-                    tag_winner_prompt_key = (
-                        winner_prompt_id,
-                        winner_model_id,
-                        comparison.metric_id,
-                        comparison.test_set_id,
-                        tag_id,
-                    )
-                    tag_loser_prompt_key = (
-                        loser_prompt_id,
-                        loser_model_id,
-                        comparison.metric_id,
-                        comparison.test_set_id,
-                        tag_id,
-                    )
-
-                    # Update vote count
-                    prompt_entries[tag_winner_prompt_key].vote_count += 1
-                    prompt_entries[tag_loser_prompt_key].vote_count += 1
-
-                    # Update win/loss count
-                    prompt_entries[tag_winner_prompt_key].win_count += 1
-                    prompt_entries[tag_loser_prompt_key].loss_count += 1
-
-                    # Calculate ELO
-                    tag_winner_prompt_rating = prompt_entries[
-                        tag_winner_prompt_key
-                    ].elo_score
-                    tag_loser_prompt_rating = prompt_entries[
-                        tag_loser_prompt_key
-                    ].elo_score
-
-                    tag_winner_prompt_expected = expected_score(
-                        tag_winner_prompt_rating, tag_loser_prompt_rating
-                    )
-                    tag_loser_prompt_expected = expected_score(
-                        tag_loser_prompt_rating, tag_winner_prompt_rating
                     )
-
-                    # Update ELO scores
-                    tag_winner_prompt_new_rating = update_elo(
-                        tag_winner_prompt_rating,
-                        tag_winner_prompt_expected,
+                    tag_batch.record_match(
+                        leaderboard_deltas.PROMPT,
+                        (
+                            winner_prompt_id,
+                            winner_model_id,
+                            comparison.metric_id,
+                            comparison.test_set_id,
+                            tag_id,
+                        ),
+                        (
+                            loser_prompt_id,
+                            loser_model_id,
+                            comparison.metric_id,
+                            comparison.test_set_id,
+                            tag_id,
+                        ),
                         1.0,  # win
-                        settings.ELO_K_FACTOR,
-                        settings.ELO_MIN_SCORE,
-                    )
-                    tag_loser_prompt_new_rating = update_elo(
-                        tag_loser_prompt_rating,
-                        tag_loser_prompt_expected,
-                        0.0,  # loss
-                        settings.ELO_K_FACTOR,
-                        settings.ELO_MIN_SCORE,
                     )
 
-                    prompt_entries[
-                        tag_winner_prompt_key
-                    ].elo_score = tag_winner_prompt_new_rating
-                    prompt_entries[
-                        tag_loser_prompt_key
-                    ].elo_score = tag_loser_prompt_new_rating
-
     # Update the last_updated timestamp for all modified entries
     now = datetime.datetime.now()
 
@@ -901,11 +702,46 @@ def process_comparison_for_elo(db, comparison_id):
     for entry in sample_entries.values():
         entry.last_updated = now
 
-    # Commit all changes
-    db.commit()
+    if delta_tracker is not None:
+        delta_tracker.observe_after(leaderboard_deltas.MODEL, model_entries.values())
+        delta_tracker.observe_after(leaderboard_deltas.PROMPT, prompt_entries.values())
+        delta_tracker.observe_after(leaderboard_deltas.SAMPLE, sample_entries.values())
+
+    if standalone:
+        tag_batch.apply_pending(db)
+        tag_batch.flush(db, now, delta_tracker)
+
+        # Commit all changes
+        db.commit()
+
     return True
 
 
+def load_scorable_tags(db):
+    """Load the prompt -> scorable tag ids index, reusing it while tags are unchanged."""
+    redis = get_redis_client(RedisDatabase.CACHE)
+    try:
+        return scorable_tag_ids_by_prompt(db, redis)
+    finally:
+        redis.close()
+
+
+def publish_batch_deltas(db, delta_tracker):
+    """Publish the rating changes of a batch. Failures never fail the batch."""
+    redis = get_redis_client(RedisDatabase.COMPARISON)
+    try:
+        deltas = leaderboard_deltas.resolve_deltas(db, delta_tracker)
+        leaderboard_deltas.publish_deltas(redis, deltas)
+        logger.info(
+            "Published leaderboard deltas",
+            **{kind: len(kind_deltas) for kind, kind_deltas in deltas.items()},
+        )
+    except Exception:
+        logger.exception("Failed to publish leaderboard deltas")
+    finally:
+        redis.close()
+
+
 # Use batch size from settings
 
 
@@ -967,15 +803,30 @@ def elo_calculation():
 
                 batch_processed = 0
                 batch_errors = 0
+                delta_tracker = (
+                    LeaderboardDeltaTracker() if settings.ELO_PUBLISH_DELTAS else None
+                )
+                # Tag-level rows are read and written once per batch, see flush below
+                tag_batch = TagLeaderboardBatch()
+                scorable_tags = load_scorable_tags(db)
 
                 for comparison_id in unprocessed_comparison_ids:
                     try:
-                        # Process the comparison
-                        process_comparison_for_elo(db, comparison_id)
+                        # Each comparison gets a savepoint so a failure only undoes itself
+                        with db.begin_nested():
+                            # Process the comparison
+                            process_comparison_for_elo(
+                                db,
+                                comparison_id,
+                                delta_tracker,
+                                tag_batch=tag_batch,
+                                scorable_tags=scorable_tags,
+                            )
 
-                        # Mark as processed
-                        db.add(ProcessedComparison(comparison_id=comparison_id))
-                        db.commit()
+                            # Mark as processed
+                            db.add(ProcessedComparison(comparison_id=comparison_id))
+
+                        tag_batch.apply_pending(db)
 
                         batch_processed += 1
                         if batch_processed % 100 == 0:
@@ -988,11 +839,16 @@ def elo_calculation():
                         logger.error(
                             f"Error processing comparison {comparison_id}: {e}"
                         )
-                        db.rollback()  # Rollback on error
+                        tag_batch.discard_pending()
+
+                tag_batch.flush(db, datetime.datetime.now(), delta_tracker)
+                db.commit()
 
                 logger.info(
                     f"Batch completed. Processed: {batch_processed}, Errors: {batch_errors}"
                 )
+                if delta_tracker:
+                    publish_batch_deltas(db, delta_tracker)
                 total_processed += batch_processed
                 total_errors += batch_errors
 
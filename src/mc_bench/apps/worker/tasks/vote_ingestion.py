@@ -0,0 +1,262 @@
+import datetime
+import uuid
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import selectinload
+
+from mc_bench.auth.permissions import PERM
+from mc_bench.models.comparison import Comparison, ComparisonRank, Metric
+from mc_bench.models.run import Sample
+from mc_bench.models.user import Role, User, UserIdentificationToken
+from mc_bench.util.comparison_votes import (
+    ack_votes,
+    acquire_ingestion_lock,
+    dead_letter_redelivered_votes,
+    dead_letter_votes,
+    ensure_consumer_group,
+    pending_vote_count,
+    read_votes,
+    release_ingestion_lock,
+    vote_error,
+)
+from mc_bench.util.logging import get_logger
+from mc_bench.util.postgres import managed_session
+from mc_bench.util.redis import RedisDatabase, get_redis_client
+
+from ..app import app
+from ..config import settings
+
+logger = get_logger(__name__)
+
+
+def insert_votes(db, entries):
+    """Bulk insert a batch of `(entry_id, vote)` entries read from the vote stream.
+
+    Mirrors what the synchronous `/api/comparison/result` path does per vote, but
+    resolves metrics, samples, users and identification tokens once per batch.
+    Votes whose token is already recorded are skipped, which makes replaying a
+    partially acknowledged batch safe.
+
+    Returns the number of comparisons inserted, and the entries that can never be
+    ingested with the reason why.
+    """
+    rejected = []
+    votes = []
+    for entry_id, vote in entries:
+        error = vote_error(vote)
+        if error is None:
+            votes.append(vote)
+        else:
+            rejected.append((entry_id, error))
+
+    if not votes:
+        return 0, rejected
+
+    entry_ids = {id(vote): entry_id for entry_id, vote in entries}
+    tokens = [uuid.UUID(vote["token"]) for vote in votes]
+    already_recorded = set(
+        db.scalars(
+            select(Comparison.comparison_id).where(Comparison.comparison_id.in_(tokens))
+        )
+    )
+
+    metrics = {
+        str(external_id): metric_id
+        for external_id, metric_id in db.execute(
+            select(Metric.external_id, Metric.id).where(
+                Metric.external_id.in_({vote["metric_id"] for vote in votes})
+            )
+        )
+    }
+
+    samples = {
+        str(sample.comparison_sample_id): sample
+        for sample in db.scalars(
+            select(Sample).where(
+                Sample.comparison_sample_id.in_(
+                    {sample_id for vote in votes for _, sample_id in vote["ranks"]}
+                )
+            )
+        )
+    }
+
+    users = {
+        str(user.external_id): user
+        for user in db.scalars(
+            select(User)
+            .where(
+                User.external_id.in_(
+                    {vote["user_id"] for vote in votes if vote["user_id"]}
+                )
+            )
+            .options(selectinload(User.roles).selectinload(Role.permissions))
+        )
+    }
+
+    identification_tokens = {}
+    for identification_token in db.scalars(
+        select(UserIdentificationToken).where(
+            UserIdentificationToken.token.in_(
+                {uuid.UUID(vote["identification_token"]) for vote in votes}
+            )
+        )
+    ):
+        identification_tokens[
+            (identification_token.token, identification_token.user_id)
+        ] = identification_token
+
+    accepted = []
+    for token, vote in zip(tokens, votes):
+        if token in already_recorded:
+            continue
+
+        user = users.get(vote["user_id"]) if vote["user_id"] else None
+        if vote["user_id"] and (user is None or PERM.VOTING.VOTE not in user.scopes):
+            continue
+
+        if vote["metric_id"] not in metrics:
+            rejected.append((entry_ids[id(vote)], "unknown metric"))
+            continue
+
+        vote_samples = [samples.get(sample_id) for _, sample_id in vote["ranks"]]
+        if any(sample is None for sample in vote_samples):
+            logger.warning("Dropping vote for unknown samples", token=str(token))
+            continue
+
+        created = datetime.datetime.fromisoformat(vote["created"])
+        identification_token = _get_or_create_identification_token(
+            db,
+            identification_tokens,
+            uuid.UUID(vote["identification_token"]),
+            user,
+            created,
+        )
+        accepted.append(
+            (token, vote, user, vote_samples, created, identification_token)
+        )
+
+    # Get ids for any new identification tokens
+    db.flush()
+
+    comparisons = []
+    ranks = []
+    for token, vote, user, vote_samples, created, identification_token in accepted:
+        comparisons.append(
+            Comparison(
+                comparison_id=token,
+                created=created,
+                user_id=user.id if user else None,
+                metric_id=metrics[vote["metric_id"]],
+                test_set_id=next(
+                    (
+                        sample.test_set_id
+                        for sample in vote_samples
+                        if sample.test_set_id
+                    ),
+                    None,
+                ),
+                session_id=uuid.UUID(vote["session_id"]),
+                identification_token_id=identification_token.id,
+            )
+        )
+        ranks.append(
+            [(rank, sample) for (rank, _), sample in zip(vote["ranks"], vote_samples)]
+        )
+
+    db.add_all(comparisons)
+    db.flush()
+
+    rank_rows = [
+        dict(comparison_id=comparison.id, sample_id=sample.id, rank=rank)
+        for comparison, comparison_ranks in zip(comparisons, ranks)
+        for rank, sample in comparison_ranks
+    ]
+    if rank_rows:
+        db.execute(insert(ComparisonRank), rank_rows)
+
+    return len(comparisons), rejected
+
+
+def _get_or_create_identification_token(db, cache, token, user, last_used_at):
+    user_id = user.id if user else None
+    identification_token = cache.get((token, user_id))
+    if identification_token is None:
+        identification_token = UserIdentificationToken(token=token, user_id=user_id)
+        db.add(identification_token)
+        cache[(token, user_id)] = identification_token
+
+    identification_token.last_used_at = last_used_at
+    return identification_token
+
+
+@app.task(name="ingest_votes")
+def ingest_votes():
+    redis = get_redis_client(RedisDatabase.COMPARISON)
+    total_inserted = 0
+    batch_size = settings.VOTE_INGESTION_BATCH_SIZE
+
+    completed = False
+
+    try:
+        logger.info("Starting vote ingestion")
+        ensure_consumer_group(redis)
+
+        # Entries that keep failing would otherwise be retried forever
+        dead_lettered = dead_letter_redelivered_votes(
+            redis, settings.VOTE_INGESTION_MAX_DELIVERIES
+        )
+        if dead_lettered:
+            logger.warning("Dead lettered redelivered votes", count=dead_lettered)
+
+        # Recover entries delivered to a previous run that never got acknowledged
+        pending = True
+        while True:
+            entries = read_votes(redis, batch_size, pending=pending)
+            if not entries:
+                if pending:
+                    pending = False
+                    continue
+                break
+
+            with managed_session() as db:
+                inserted, rejected = insert_votes(db, entries)
+
+            if rejected:
+                logger.warning("Dead lettering rejected votes", rejected=rejected)
+                dead_letter_votes(redis, rejected)
+
+            rejected_ids = {entry_id for entry_id, _ in rejected}
+            ack_votes(
+                redis,
+                [entry_id for entry_id, _ in entries if entry_id not in rejected_ids],
+            )
+            total_inserted += inserted
+            logger.info("Ingested vote batch", read=len(entries), inserted=inserted)
+
+        logger.info("Vote ingestion completed", inserted=total_inserted)
+        completed = True
+
+    finally:
+        try:
+            release_ingestion_lock(redis)
+
+            # Votes appended after our last read would otherwise wait for the next
+            # vote. After a failure, the entries left pending wait for the next vote
+            # instead, rather than failing again right away.
+            if (
+                completed
+                and pending_vote_count(redis)
+                and acquire_ingestion_lock(redis)
+            ):
+                logger.info("Votes arrived during ingestion, re-enqueuing")
+                app.send_task("ingest_votes", queue="default")
+
+            if total_inserted and redis.set(
+                "elo_calculation_in_progress", "1", ex=300, nx=True
+            ):
+                logger.info("Enqueuing elo calculation task")
+                app.send_task("elo_calculation", queue="default")
+        finally:
+            redis.close()
+
+    return {"inserted": total_inserted}
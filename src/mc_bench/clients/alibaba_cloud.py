@@ -2,8 +2,10 @@ import os
 
 import openai
 
+from .streaming import ChatCompletionsStreamingMixin
 
-class AlibabaCloudClient:
+
+class AlibabaCloudClient(ChatCompletionsStreamingMixin):
     def __init__(self):
         self.client = openai.OpenAI(
             api_key=os.environ["ALIBABA_CLOUD_API_KEY"],
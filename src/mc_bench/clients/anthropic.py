@@ -1,7 +1,11 @@
 import os
+from functools import cached_property
 
 import anthropic
 
+from .batch import BatchResult
+from .streaming import chat_kwargs
+
 
 class AnthropicClient:
     def __init__(self):
@@ -27,3 +31,47 @@ class AnthropicClient:
         message = self.client.messages.create(**kwargs)
 
         return message.content[0].text
+
+    @cached_property
+    def async_client(self):
+        return anthropic.AsyncAnthropic(api_key=self.client.api_key)
+
+    async def stream_prompt(self, on_text=None, **kwargs):
+        parts = []
+        async with self.async_client.messages.stream(**chat_kwargs(kwargs)) as stream:
+            async for text in stream.text_stream:
+                parts.append(text)
+                if on_text is not None:
+                    on_text(text)
+        return "".join(parts)
+
+    def submit_batch(self, requests):
+        batch = self.client.messages.batches.create(
+            requests=[
+                {"custom_id": custom_id, "params": chat_kwargs(kwargs)}
+                for custom_id, kwargs in requests.items()
+            ]
+        )
+        return batch.id
+
+    def get_batch_results(self, batch_id):
+        batch = self.client.messages.batches.retrieve(batch_id)
+        if batch.processing_status != "ended":
+            return None
+
+        results = {}
+        for entry in self.client.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                results[entry.custom_id] = BatchResult(
+                    response=entry.result.message.content[0].text
+                )
+            else:
+                # Errored, canceled or expired
+                error = getattr(entry.result, "error", None)
+                results[entry.custom_id] = BatchResult(
+                    error=str(error) if error is not None else entry.result.type
+                )
+        return results
+
+    def cancel_batch(self, batch_id):
+        self.client.messages.batches.cancel(batch_id)
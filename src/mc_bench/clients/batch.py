@@ -0,0 +1,75 @@
+"""
+Batch execution of prompts.
+
+Some providers take many prompts as one asynchronous batch job and answer them
+within a completion window, at much higher throughput limits than their
+synchronous APIs. Their provider classes set `BATCH_API`, and their clients
+implement three more methods:
+
+- `submit_batch(requests)` takes `send_prompt` kwargs by custom id, submits them as
+  one job and returns the id of the job
+- `get_batch_results(batch_id)` returns None while the job runs, and a BatchResult
+  by custom id once it has ended
+- `cancel_batch(batch_id)` stops a job that is no longer waited on
+
+Custom ids are made of letters, digits, "_" and "-", at most 64 of them.
+"""
+
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from mc_bench.util.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class BatchResult:
+    response: Optional[str] = None
+    error: Optional[str] = None
+
+
+class LocalBatchClient:
+    """Stand-in for a batch API, for tests and local development.
+
+    Jobs end on their `polls`th poll, when their prompts are sent one by one with
+    `send_prompt` of the wrapped client. Jobs are kept in the memory of the
+    process; a job polled from another process has ended without results.
+    """
+
+    _jobs: Dict[str, dict] = {}
+
+    def __init__(self, client, polls: int = 1):
+        self.client = client
+        self.polls = polls
+
+    def submit_batch(self, requests: Dict[str, dict]) -> str:
+        batch_id = f"local-{uuid.uuid4()}"
+        self._jobs[batch_id] = {"requests": dict(requests), "polls": 0}
+        return batch_id
+
+    def get_batch_results(self, batch_id: str) -> Optional[Dict[str, BatchResult]]:
+        job = self._jobs.get(batch_id)
+        if job is None:
+            return {}
+
+        job["polls"] += 1
+        if job["polls"] < self.polls:
+            return None
+
+        results = {}
+        for custom_id, kwargs in job["requests"].items():
+            try:
+                response = self.client.send_prompt(**dict(kwargs))
+            except Exception as e:
+                logger.exception("Error in local batch prompt", custom_id=custom_id)
+                results[custom_id] = BatchResult(error=str(e))
+            else:
+                results[custom_id] = BatchResult(response=response)
+
+        del self._jobs[batch_id]
+        return results
+
+    def cancel_batch(self, batch_id: str) -> None:
+        self._jobs.pop(batch_id, None)
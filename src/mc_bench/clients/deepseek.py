@@ -2,8 +2,10 @@ import os
 
 import openai
 
+from .streaming import ChatCompletionsStreamingMixin
 
-class DeepSeekClient:
+
+class DeepSeekClient(ChatCompletionsStreamingMixin):
     def __init__(self):
         self.client = openai.OpenAI(
             api_key=os.environ["DEEPSEEK_API_KEY"],
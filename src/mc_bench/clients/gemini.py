@@ -2,8 +2,10 @@ import os
 
 import openai
 
+from .streaming import ChatCompletionsStreamingMixin
 
-class GeminiClient:
+
+class GeminiClient(ChatCompletionsStreamingMixin):
     def __init__(self):
         self.client = openai.OpenAI(
             api_key=os.environ["GOOGLE_API_KEY"],
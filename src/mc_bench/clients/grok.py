@@ -2,8 +2,10 @@ import os
 
 from openai import OpenAI
 
+from .streaming import ChatCompletionsStreamingMixin
 
-class GrokClient:
+
+class GrokClient(ChatCompletionsStreamingMixin):
     def __init__(self):
         self.client = OpenAI(
             api_key=os.environ["XAI_API_KEY"], base_url="https://api.x.ai/v1"
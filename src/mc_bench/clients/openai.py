@@ -1,12 +1,96 @@
+import json
 import os
+from functools import cached_property
+
 import openai
 
+from .batch import BatchResult
+
+# Batch jobs in any of these states have ended
+BATCH_ENDED = ("completed", "failed", "expired", "cancelled")
+
 
 class OpenAIClient:
-    def _init_(self):
+    def __init__(self):
         self.client = openai.OpenAI(api_key=os.environ["OPENAI_API_KEY"])
 
+    @cached_property
+    def async_client(self):
+        return openai.AsyncOpenAI(api_key=self.client.api_key)
+
     def send_prompt(self, **kwargs):
+        response_kwargs = self._response_kwargs(kwargs)
+
+        # Use the official OpenAI SDK responses.create() method
+        response = self.client.responses.create(**response_kwargs)
+
+        # The SDK provides a convenient output_text property that aggregates all text outputs
+        # This is the simple, direct way to get the text output
+        return response.output_text
+
+    async def stream_prompt(self, on_text=None, **kwargs):
+        stream = await self.async_client.responses.create(
+            stream=True, **self._response_kwargs(kwargs)
+        )
+
+        parts = []
+        async for event in stream:
+            if event.type == "response.output_text.delta":
+                parts.append(event.delta)
+                if on_text is not None:
+                    on_text(event.delta)
+        return "".join(parts)
+
+    def submit_batch(self, requests):
+        lines = [
+            json.dumps(
+                {
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": "/v1/responses",
+                    "body": self._response_kwargs(dict(kwargs)),
+                }
+            )
+            for custom_id, kwargs in requests.items()
+        ]
+        batch_file = self.client.files.create(
+            file=("batch.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch"
+        )
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/responses",
+            completion_window="24h",
+        )
+        return batch.id
+
+    def get_batch_results(self, batch_id):
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status not in BATCH_ENDED:
+            return None
+
+        results = {}
+        # Failed requests are written to the error file rather than the output file
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                response = entry.get("response") or {}
+                if entry.get("error") or response.get("status_code") != 200:
+                    error = entry.get("error") or response.get("body")
+                    results[entry["custom_id"]] = BatchResult(error=json.dumps(error))
+                else:
+                    results[entry["custom_id"]] = BatchResult(
+                        response=_output_text(response["body"])
+                    )
+        return results
+
+    def cancel_batch(self, batch_id):
+        self.client.batches.cancel(batch_id)
+
+    def _response_kwargs(self, kwargs):
         prompt_in_kwargs = "prompt" in kwargs
         messages_in_kwargs = "messages" in kwargs
         assert not (messages_in_kwargs and prompt_in_kwargs)
@@ -55,10 +139,16 @@ class OpenAIClient:
         elif "reasoning" in kwargs:
             # Allow passing the full reasoning object
             response_kwargs["reasoning"] = kwargs["reasoning"]
-        
-        # Use the official OpenAI SDK responses.create() method
-        response = self.client.responses.create(**response_kwargs)
-        
-        # The SDK provides a convenient output_text property that aggregates all text outputs
-        # This is the simple, direct way to get the text output
-        return response.output_text
\ No newline at end of file
+
+        return response_kwargs
+
+
+def _output_text(body):
+    """The text of a responses API response body, as `output_text` of the SDK."""
+    return "".join(
+        content["text"]
+        for item in body.get("output", [])
+        if item.get("type") == "message"
+        for content in item.get("content", [])
+        if content.get("type") == "output_text"
+    )
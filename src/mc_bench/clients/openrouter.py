@@ -2,8 +2,10 @@ import os
 
 import openai
 
+from .streaming import ChatCompletionsStreamingMixin
 
-class OpenRouterClient:
+
+class OpenRouterClient(ChatCompletionsStreamingMixin):
     def __init__(self):
         self.client = openai.OpenAI(
             base_url="https://openrouter.ai/api/v1",
@@ -0,0 +1,117 @@
+"""
+Streamed, asynchronous execution of provider prompts.
+
+Every process runs one event loop in a background thread. Asynchronous provider
+clients live on that loop and keep their HTTP connections open across prompts,
+and prompts submitted from any number of threads, e.g. by a Celery worker with a
+`threads` pool, wait on their providers concurrently. Responses are streamed and
+`on_text` is called with every chunk of text as it arrives, on the loop thread, so
+it must not block. Anything slow, such as reporting progress, belongs in the
+`on_wait` callback of `PromptRunner.run`, which runs on the waiting thread.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+from functools import cached_property, lru_cache
+from typing import Callable, Coroutine, Optional
+
+TextCallback = Optional[Callable[[str], None]]
+
+
+def chat_kwargs(kwargs: dict) -> dict:
+    """Turn a `prompt` argument into the `messages` of a chat request."""
+    prompt_in_kwargs = "prompt" in kwargs
+    messages_in_kwargs = "messages" in kwargs
+    assert not (messages_in_kwargs and prompt_in_kwargs)
+    assert messages_in_kwargs or prompt_in_kwargs
+    assert "model" in kwargs
+
+    kwargs = dict(kwargs)
+    if prompt_in_kwargs:
+        kwargs["messages"] = [
+            {
+                "role": "user",
+                "content": kwargs.pop("prompt"),
+            }
+        ]
+    return kwargs
+
+
+class ChatCompletionsStreamingMixin:
+    """`stream_prompt` for clients whose `self.client` is an OpenAI SDK client of a
+    chat completions API."""
+
+    @cached_property
+    def async_client(self):
+        import openai
+
+        return openai.AsyncOpenAI(
+            api_key=self.client.api_key, base_url=self.client.base_url
+        )
+
+    async def stream_prompt(self, on_text: TextCallback = None, **kwargs) -> str:
+        stream = await self.async_client.chat.completions.create(
+            stream=True, **chat_kwargs(kwargs)
+        )
+
+        parts = []
+        async for chunk in stream:
+            text = chunk.choices[0].delta.content if chunk.choices else None
+            if text:
+                parts.append(text)
+                if on_text is not None:
+                    on_text(text)
+        return "".join(parts)
+
+
+class PromptRunner:
+    """Event loop thread on which the prompts of a process run."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def run(
+        self,
+        coroutine: Coroutine,
+        timeout: Optional[float] = None,
+        on_wait: Optional[Callable[[], None]] = None,
+        wait_interval: float = 5,
+    ):
+        """Run `coroutine` on the loop and wait for its result.
+
+        While waiting, `on_wait` is called every `wait_interval` seconds on the
+        calling thread. If the wait ends early, on a timeout or an exception raised
+        in the calling thread such as a soft time limit, the prompt is cancelled.
+        """
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        try:
+            return self._wait(future, timeout, on_wait, wait_interval)
+        except BaseException:
+            # Leave no prompt streaming on the loop for a task that has given up
+            future.cancel()
+            raise
+
+    def _wait(self, future, timeout, on_wait, wait_interval):
+        if on_wait is None:
+            return future.result(timeout)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = wait_interval
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.monotonic(), 0))
+            try:
+                return future.result(wait)
+            except concurrent.futures.TimeoutError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+                on_wait()
+
+
+@lru_cache
+def get_prompt_runner() -> PromptRunner:
+    return PromptRunner()
@@ -2,8 +2,10 @@ import os
 
 import openai
 
+from .streaming import ChatCompletionsStreamingMixin
 
-class ZhipuAIClient:
+
+class ZhipuAIClient(ChatCompletionsStreamingMixin):
     def __init__(self):
         self.client = openai.OpenAI(
             api_key=os.environ["ZHIPUAI_API_KEY"],
@@ -1,8 +1,16 @@
-from typing import Any, Callable, Dict, List, Type
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Type
+
+from sqlalchemy.orm import Session
 
 from .types import E, Event
 
 _handlers: Dict[Type[Event], List[Callable]] = {}
+_batch_handlers: Dict[Type[Event], List[Callable]] = {}
+
+# Events queued by the innermost active `event_batch`, if any
+_batch: ContextVar[Optional[List[Event]]] = ContextVar("event_batch", default=None)
 
 
 def on_event(event_type: Type[E], fn: Callable[[E], Any]) -> None:
@@ -12,9 +20,73 @@ def on_event(event_type: Type[E], fn: Callable[[E], Any]) -> None:
     _handlers[event_type].append(fn)
 
 
+def on_events(
+    event_type: Type[E], fn: Callable[[List[E], Optional[Session]], Any]
+) -> None:
+    """Register a handler that receives all events of a type in a batch at once.
+
+    The handler is called with the events and the session of the batch, and must
+    use that session when one is given rather than committing on its own.
+    """
+    if event_type not in _batch_handlers:
+        _batch_handlers[event_type] = []
+    _batch_handlers[event_type].append(fn)
+
+
 def emit_event(event: Event) -> None:
-    """Emit an event to all registered handlers"""
-    event_type = type(event)
-    if event_type in _handlers:
-        for handler in _handlers[event_type]:
+    """Emit an event to all registered handlers, or queue it in the active batch"""
+    batch = _batch.get()
+    if batch is not None:
+        batch.append(event)
+    else:
+        _dispatch([event], None)
+
+
+@contextmanager
+def event_batch(db: Optional[Session] = None):
+    """Queue the events emitted in the block and handle them together on exit.
+
+    With `db`, batch handlers apply the events in that session, so they are
+    committed, or rolled back, with the rest of the caller's transaction. Without
+    it they share a single session of their own. Events of a block that raises are
+    dropped. Nested batches join the outermost one.
+    """
+    if _batch.get() is not None:
+        yield
+        return
+
+    events = []
+    token = _batch.set(events)
+    try:
+        yield
+    finally:
+        _batch.reset(token)
+
+    _dispatch(events, db)
+
+
+def _dispatch(events: List[Event], db: Optional[Session]) -> None:
+    if not events:
+        return
+
+    by_type: Dict[Type[Event], List[Event]] = {}
+    for event in events:
+        by_type.setdefault(type(event), []).append(event)
+
+    if db is None and any(event_type in _batch_handlers for event_type in by_type):
+        import mc_bench.util.postgres as postgres
+
+        with postgres.managed_session() as own_db:
+            _call_batch_handlers(by_type, own_db)
+    else:
+        _call_batch_handlers(by_type, db)
+
+    for event in events:
+        for handler in _handlers.get(type(event), []):
             handler(event)
+
+
+def _call_batch_handlers(by_type, db):
+    for event_type, typed_events in by_type.items():
+        for handler in _batch_handlers.get(event_type, []):
+            handler(typed_events, db)
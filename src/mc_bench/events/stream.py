@@ -0,0 +1,88 @@
+"""
+Optional outbox of events in a capped Redis Stream.
+
+Subscribers such as the scheduler or SSE endpoints can follow state changes from
+the stream instead of polling the database. Events handled in a caller's session
+are only published once that session commits, so the stream never shows a change
+that was rolled back.
+"""
+
+import os
+from typing import List, Optional, Type
+
+from redis import RedisError, StrictRedis
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy.orm import Session
+
+from mc_bench.util.logging import get_logger
+from mc_bench.util.redis import RedisDatabase, get_redis_client
+
+from . import on_events
+from .types import Event
+
+logger = get_logger(__name__)
+
+EVENT_STREAM_ENABLED = os.environ.get("EVENT_STREAM_ENABLED") == "true"
+EVENT_STREAM_KEY = "events"
+EVENT_STREAM_MAXLEN = 10000
+
+
+class EventStream:
+    """Batch event handler appending events to a Redis Stream."""
+
+    def __init__(self, redis: StrictRedis, key: str = EVENT_STREAM_KEY):
+        self.redis = redis
+        self.key = key
+
+    def __call__(self, events: List[Event], db: Optional[Session]) -> None:
+        if db is None:
+            self.publish(events)
+            return
+
+        # Held in the session until its transaction ends one way or the other
+        if not db.info.get(self._listening_key):
+            sqlalchemy_event.listen(db, "after_commit", self._after_commit)
+            sqlalchemy_event.listen(db, "after_rollback", self._after_rollback)
+            db.info[self._listening_key] = True
+        db.info.setdefault(self._pending_key, []).extend(events)
+
+    def publish(self, events: List[Event]) -> None:
+        try:
+            pipeline = self.redis.pipeline(transaction=False)
+            for event in events:
+                pipeline.xadd(
+                    self.key,
+                    {"type": type(event).__name__, "data": event.model_dump_json()},
+                    maxlen=EVENT_STREAM_MAXLEN,
+                    approximate=True,
+                )
+            pipeline.execute()
+        except RedisError:
+            # The database is the source of truth, subscribers can catch up from it
+            logger.exception("Error publishing events", count=len(events))
+
+    def _after_commit(self, db: Session) -> None:
+        events = db.info.pop(self._pending_key, None)
+        if events:
+            self.publish(events)
+
+    def _after_rollback(self, db: Session) -> None:
+        db.info.pop(self._pending_key, None)
+
+    @property
+    def _pending_key(self) -> str:
+        return f"event_stream:{self.key}:pending"
+
+    @property
+    def _listening_key(self) -> str:
+        return f"event_stream:{self.key}:listening"
+
+
+def register_event_stream(*event_types: Type[Event]) -> None:
+    """Publish events of `event_types` to the stream if EVENT_STREAM_ENABLED."""
+    if not EVENT_STREAM_ENABLED:
+        return
+
+    stream = EventStream(get_redis_client(RedisDatabase.CACHE))
+    for event_type in event_types:
+        on_events(event_type, stream)
@@ -0,0 +1,82 @@
+"""Add prompt batch tables
+
+Revision ID: 3e7a9d2c5f18
+Revises: 7d41c9a8e2f6
+Create Date: 2026-10-19 18:21:44.930517
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3e7a9d2c5f18"
+down_revision: Union[str, None] = "7d41c9a8e2f6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "prompt_batch",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column(
+            "created", sa.TIMESTAMP(), server_default=sa.text("now()"), nullable=False
+        ),
+        sa.Column("provider_id", sa.BigInteger(), nullable=False),
+        sa.Column(
+            "batch_id",
+            sa.String(),
+            nullable=False,
+            comment="Id of the batch job at the provider",
+        ),
+        sa.Column(
+            "ended",
+            sa.TIMESTAMP(),
+            nullable=True,
+            comment="When the results were handled or the job was given up on",
+        ),
+        sa.ForeignKeyConstraint(
+            ["provider_id"],
+            ["specification.provider.id"],
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        schema="specification",
+    )
+    op.create_table(
+        "prompt_batch_stage",
+        sa.Column("prompt_batch_id", sa.BigInteger(), nullable=False),
+        sa.Column("run_stage_id", sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["prompt_batch_id"],
+            ["specification.prompt_batch.id"],
+            ondelete="CASCADE",
+        ),
+        sa.ForeignKeyConstraint(
+            ["run_stage_id"],
+            ["specification.run_stage.id"],
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("prompt_batch_id", "run_stage_id"),
+        schema="specification",
+    )
+    op.create_index(
+        "idx_prompt_batch_stage_run_stage_id",
+        "prompt_batch_stage",
+        ["run_stage_id"],
+        unique=False,
+        schema="specification",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "idx_prompt_batch_stage_run_stage_id",
+        table_name="prompt_batch_stage",
+        schema="specification",
+    )
+    op.drop_table("prompt_batch_stage", schema="specification")
+    op.drop_table("prompt_batch", schema="specification")
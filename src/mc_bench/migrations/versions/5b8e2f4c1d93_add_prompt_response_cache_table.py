@@ -0,0 +1,75 @@
+"""Add prompt response cache table
+
+Revision ID: 5b8e2f4c1d93
+Revises: 9c3e51d7a2b4
+Create Date: 2026-10-19 14:02:17.604183
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5b8e2f4c1d93"
+down_revision: Union[str, None] = "9c3e51d7a2b4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "prompt_response_cache",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column(
+            "created", sa.TIMESTAMP(), server_default=sa.text("now()"), nullable=False
+        ),
+        sa.Column(
+            "cache_key",
+            sa.String(),
+            nullable=False,
+            comment="sha256 of the provider class, provider config and rendered prompt",
+        ),
+        sa.Column("provider_class", sa.String(), nullable=False),
+        sa.Column("config", sa.JSON(), nullable=False),
+        sa.Column("bucket", sa.String(), nullable=False),
+        sa.Column(
+            "key",
+            sa.String(),
+            nullable=False,
+            comment="Object key of the cached response",
+        ),
+        sa.Column(
+            "response_hash",
+            sa.String(),
+            nullable=False,
+            comment="sha256 of the response text",
+        ),
+        sa.Column(
+            "uses",
+            sa.Integer(),
+            server_default="0",
+            nullable=False,
+            comment="Number of times the response was served from the cache",
+        ),
+        sa.Column("last_used", sa.TIMESTAMP(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        schema="specification",
+    )
+    op.create_index(
+        "idx_prompt_response_cache_cache_key",
+        "prompt_response_cache",
+        ["cache_key"],
+        unique=False,
+        schema="specification",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "idx_prompt_response_cache_cache_key",
+        table_name="prompt_response_cache",
+        schema="specification",
+    )
+    op.drop_table("prompt_response_cache", schema="specification")
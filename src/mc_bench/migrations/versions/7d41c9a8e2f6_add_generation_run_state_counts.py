@@ -0,0 +1,120 @@
+"""Add run state counts per generation, maintained by triggers
+
+Revision ID: 7d41c9a8e2f6
+Revises: 5b8e2f4c1d93
+Create Date: 2026-10-19 16:38:52.117406
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7d41c9a8e2f6"
+down_revision: Union[str, None] = "5b8e2f4c1d93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "generation_run_state_count",
+        sa.Column("generation_id", sa.Integer(), nullable=False),
+        sa.Column("state_id", sa.Integer(), nullable=False),
+        sa.Column("count", sa.Integer(), server_default="0", nullable=False),
+        sa.ForeignKeyConstraint(
+            ["generation_id"],
+            ["specification.generation.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["state_id"],
+            ["specification.run_state.id"],
+        ),
+        sa.PrimaryKeyConstraint("generation_id", "state_id"),
+        schema="specification",
+    )
+
+    # Statement level, so a statement changing many runs updates each count once.
+    # Runs as its owner, since every role that writes runs keeps the counts.
+    op.execute("""\
+    CREATE FUNCTION specification.count_generation_run_states() RETURNS trigger
+    LANGUAGE plpgsql
+    SECURITY DEFINER
+    SET search_path = specification, pg_temp
+    AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO specification.generation_run_state_count AS c
+                (generation_id, state_id, count)
+            SELECT generation_id, state_id, count(*)
+            FROM new_runs
+            WHERE generation_id IS NOT NULL AND state_id IS NOT NULL
+            GROUP BY generation_id, state_id
+            ON CONFLICT (generation_id, state_id)
+            DO UPDATE SET count = c.count + EXCLUDED.count;
+        ELSIF TG_OP = 'DELETE' THEN
+            UPDATE specification.generation_run_state_count AS c
+            SET count = c.count - deleted.count
+            FROM (
+                SELECT generation_id, state_id, count(*) AS count
+                FROM old_runs
+                WHERE generation_id IS NOT NULL AND state_id IS NOT NULL
+                GROUP BY generation_id, state_id
+            ) AS deleted
+            WHERE c.generation_id = deleted.generation_id
+            AND c.state_id = deleted.state_id;
+        ELSE
+            INSERT INTO specification.generation_run_state_count AS c
+                (generation_id, state_id, count)
+            SELECT generation_id, state_id, sum(delta)
+            FROM (
+                SELECT generation_id, state_id, 1 AS delta FROM new_runs
+                UNION ALL
+                SELECT generation_id, state_id, -1 AS delta FROM old_runs
+            ) AS changes
+            WHERE generation_id IS NOT NULL AND state_id IS NOT NULL
+            GROUP BY generation_id, state_id
+            HAVING sum(delta) <> 0
+            ON CONFLICT (generation_id, state_id)
+            DO UPDATE SET count = c.count + EXCLUDED.count;
+        END IF;
+        RETURN NULL;
+    END;
+    $$;
+
+    CREATE TRIGGER count_generation_run_states_insert
+    AFTER INSERT ON specification.run
+    REFERENCING NEW TABLE AS new_runs
+    FOR EACH STATEMENT EXECUTE FUNCTION specification.count_generation_run_states();
+
+    CREATE TRIGGER count_generation_run_states_update
+    AFTER UPDATE ON specification.run
+    REFERENCING OLD TABLE AS old_runs NEW TABLE AS new_runs
+    FOR EACH STATEMENT EXECUTE FUNCTION specification.count_generation_run_states();
+
+    CREATE TRIGGER count_generation_run_states_delete
+    AFTER DELETE ON specification.run
+    REFERENCING OLD TABLE AS old_runs
+    FOR EACH STATEMENT EXECUTE FUNCTION specification.count_generation_run_states();
+    """)
+
+    op.execute("""\
+    INSERT INTO specification.generation_run_state_count
+        (generation_id, state_id, count)
+    SELECT generation_id, state_id, count(*)
+    FROM specification.run
+    WHERE generation_id IS NOT NULL AND state_id IS NOT NULL
+    GROUP BY generation_id, state_id;
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""\
+    DROP TRIGGER count_generation_run_states_delete ON specification.run;
+    DROP TRIGGER count_generation_run_states_update ON specification.run;
+    DROP TRIGGER count_generation_run_states_insert ON specification.run;
+    DROP FUNCTION specification.count_generation_run_states();
+    """)
+    op.drop_table("generation_run_state_count", schema="specification")
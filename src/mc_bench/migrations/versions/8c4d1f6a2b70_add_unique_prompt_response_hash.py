@@ -0,0 +1,43 @@
+"""Add unique prompt response hash per cache key
+
+Revision ID: 8c4d1f6a2b70
+Revises: 3e7a9d2c5f18
+Create Date: 2026-10-19 21:07:12.480315
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8c4d1f6a2b70"
+down_revision: Union[str, None] = "3e7a9d2c5f18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keep the first of any responses stored twice for a prompt
+    op.execute("""\
+        DELETE FROM specification.prompt_response_cache duplicate
+        USING specification.prompt_response_cache original
+        WHERE duplicate.cache_key = original.cache_key
+          AND duplicate.response_hash = original.response_hash
+          AND duplicate.id > original.id
+    """)
+    op.create_unique_constraint(
+        "uq_prompt_response_cache_cache_key_response_hash",
+        "prompt_response_cache",
+        ["cache_key", "response_hash"],
+        schema="specification",
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint(
+        "uq_prompt_response_cache_cache_key_response_hash",
+        "prompt_response_cache",
+        schema="specification",
+        type_="unique",
+    )
@@ -0,0 +1,39 @@
+"""Add artifact kind for build world snapshots
+
+Revision ID: 9c3e51d7a2b4
+Revises: 473407e9d86e
+Create Date: 2026-10-19 11:20:41.318552
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9c3e51d7a2b4"
+down_revision: Union[str, None] = "473407e9d86e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+KINDS = ["BUILD_WORLD_SNAPSHOT"]
+
+
+def upgrade() -> None:
+    for kind in KINDS:
+        op.execute(
+            sa.text("""\
+        INSERT INTO sample.artifact_kind (name) VALUES (:artifact_kind)
+        """).bindparams(artifact_kind=kind)
+        )
+
+
+def downgrade() -> None:
+    for kind in KINDS:
+        op.execute(
+            sa.text("""\
+        DELETE FROM sample.artifact_kind WHERE name = :artifact_kind
+        """).bindparams(artifact_kind=kind)
+        )
@@ -2,17 +2,19 @@ import io
 import os
 import re
 import tarfile
-import time
+import threading
 from typing import Dict, Optional, Union
 
 import docker
 import docker.models.containers
-import docker.models.volumes
 
 from mc_bench.util.logging import get_logger
 
 logger = get_logger(__name__)
 
+# Matches the Minecraft server ready message, e.g. "Done (1.234s)!" or "Done (12.4s)!"
+SERVER_READY_PATTERN = re.compile(rb"Done \(\d+\.?\d*s\)!")
+
 
 def create_network(suffix, exists_ok=False) -> str:
     """Create a new overlay network and return its name."""
@@ -36,15 +38,47 @@ def create_network(suffix, exists_ok=False) -> str:
     return network_name
 
 
-def start_server(image, network_name: str, suffix, ports=None, replace=False) -> str:
-    """Start the Minecraft server container and return its container ID."""
+def start_server(
+    image,
+    network_name: str,
+    suffix,
+    ports=None,
+    replace=False,
+    labels=None,
+    wait=False,
+    timeout: int = 300,
+    archive=None,
+    archive_path: str = "/data",
+    image_cache=None,
+    resources: Optional[dict] = None,
+) -> str:
+    """Start the Minecraft server container and return its container ID.
+
+    With `wait=True`, blocks until the server is ready or `timeout` seconds pass,
+    following the log stream of the new container.
+
+    `archive` is a tar archive (bytes or a file object) extracted into
+    `archive_path` before the server starts, e.g. a snapshot of a built world.
+
+    With an `image_cache`, the image is pinned to its digest and only pulled when
+    that digest is missing locally. `resources` are Docker resource limits such as
+    `nano_cpus` and `mem_limit`.
+    """
     client = docker.from_env()
     kwargs = {}
 
     if ports:
         kwargs["ports"] = ports
 
-    if not os.environ.get("NO_IMAGE_PULL"):
+    if labels:
+        kwargs["labels"] = labels
+
+    if resources:
+        kwargs.update(resources)
+
+    if image_cache is not None:
+        image = image_cache.resolve(image)
+    elif not os.environ.get("NO_IMAGE_PULL"):
         client.images.pull(image)
 
     container_name = f"mc-server-{suffix}"
@@ -77,20 +111,72 @@ def start_server(image, network_name: str, suffix, ports=None, replace=False) ->
             raise ValueError(f"Container {container_name} already exists")
 
     logger.info("Creating new container", container_name=container_name)
-    container = client.containers.run(
+    container = client.containers.create(
         image,
         detach=True,
-        remove=False,
         network=network_name,
         name=container_name,
         **kwargs,
     )
+    if archive is not None:
+        logger.info("Restoring files into container", container_name=container_name)
+        container.put_archive(archive_path, archive)
+    container.start()
 
     logger.info("Container created", container_name=container_name)
+
+    if wait and not wait_for_log(container, SERVER_READY_PATTERN, timeout=timeout):
+        logger.warning("Server did not become ready", container_name=container_name)
+    elif wait:
+        logger.info("Server is ready", container_name=container_name)
+
     return container
 
 
-def wait_for_server(container_id: str, timeout: int = 300) -> bool:
+def wait_for_log(
+    container: docker.models.containers.Container,
+    pattern: re.Pattern,
+    timeout: int = 300,
+    since=None,
+) -> bool:
+    """
+    Follow a container's log stream until a line matches `pattern`.
+
+    Only output written after `since` (a datetime or unix timestamp) is read, and
+    every chunk is scanned once, so this returns as soon as the line is written
+    instead of re-reading the accumulated log.
+
+    Args:
+        container: Docker container to follow
+        pattern: Compiled bytes pattern to search for
+        timeout: Maximum time to wait in seconds (default: 300)
+        since: Ignore output written before this time (default: all output)
+
+    Returns:
+        bool: True if the pattern was seen, False if the timeout was reached or
+        the container exited first
+    """
+    stream = container.logs(stream=True, follow=True, since=since)
+    # Closing the stream unblocks the iteration below once the timeout passes
+    timer = threading.Timer(timeout, stream.close)
+    timer.start()
+
+    try:
+        pending = b""
+        for chunk in stream:
+            pending += chunk
+            if pattern.search(pending):
+                return True
+            # Keep the unterminated last line, a match may span two chunks
+            pending = pending[pending.rfind(b"\n") + 1 :]
+    finally:
+        timer.cancel()
+        stream.close()
+
+    return False
+
+
+def wait_for_server(container_id: str, timeout: int = 300, since=None) -> bool:
     """
     Wait for the Minecraft server to be ready by checking for the standard
     server startup completion message: "Done (Xs)!"
@@ -98,6 +184,7 @@ def wait_for_server(container_id: str, timeout: int = 300) -> bool:
     Args:
         container_id: Docker container ID running the Minecraft server
         timeout: Maximum time to wait in seconds (default: 300)
+        since: Ignore output written before this time (default: all output)
 
     Returns:
         bool: True if server is ready, False if timeout reached
@@ -107,18 +194,10 @@ def wait_for_server(container_id: str, timeout: int = 300) -> bool:
         "Getting container", container_id=container_id
     )  # Changed to debug - implementation detail
     container = client.containers.get(container_id)
-    start_time = time.time()
-
-    # Regex pattern to match Minecraft server ready message
-    # Matches strings like "Done (1.234s)!" or "Done (12.4s)!"
-    ready_pattern = re.compile(r"Done \(\d+\.?\d*s\)!")
 
-    while time.time() - start_time < timeout:
-        logs = container.logs().decode("utf-8")
-        if ready_pattern.search(logs):
-            logger.info("Server is ready", container_id=container_id)
-            return True
-        time.sleep(2)
+    if wait_for_log(container, SERVER_READY_PATTERN, timeout=timeout, since=since):
+        logger.info("Server is ready", container_id=container_id)
+        return True
 
     return False
 
@@ -128,24 +207,34 @@ def run_builder(
     network_name: str,
     server_container_id: str,
     suffix: str,
-    build_script_volume: docker.models.volumes.Volume,
+    build_script: Union[str, bytes],
     structure_name,
     env: Optional[Dict[str, str]] = None,
+    image_cache=None,
     **kwargs,
 ) -> docker.models.containers.Container:
+    """
+    Start a builder container running `build_script` against the server.
+
+    The script is copied into the created container before it starts, at the
+    /build-scripts/build-script.js path the builder image runs it from. With an
+    `image_cache`, the image is pinned to its digest as in `start_server`.
+    """
     env = env or {}
 
     client = docker.from_env()
     server_container = client.containers.get(server_container_id)
 
-    if not os.environ.get("NO_IMAGE_PULL"):
+    if image_cache is not None:
+        image = image_cache.resolve(image)
+    elif not os.environ.get("NO_IMAGE_PULL"):
         logger.info("Pulling image", image=image)  # Keep as info - important operation
         client.images.pull(image)
 
     logger.info(
         "Running builder", image=image, network_name=network_name, suffix=suffix
     )  # Keep as info - important operation
-    builder = client.containers.run(
+    builder = client.containers.create(
         image,
         environment={
             "HOST": server_container.name,
@@ -156,21 +245,19 @@ def run_builder(
             **env,
         },
         network=network_name,
-        remove=False,
-        detach=True,
-        volumes={build_script_volume.name: {"bind": "/build-scripts", "mode": "ro"}},
         name=f"mc-builder-{suffix}",
         **kwargs,
     )
+    builder.put_archive("/", build_script_archive(build_script))
+    builder.start()
     logger.info("Builder running", builder=builder)
     return builder
 
 
 def cleanup(
-    network_name: str,
+    network_name: Optional[str],
     server_container_id: Optional[str],
     build_container_id: Optional[str],
-    volume: docker.models.volumes.Volume,
 ):
     """Clean up resources after we're done."""
     logger.info("Cleaning up docker resources after minecraft server run")
@@ -215,7 +302,8 @@ def cleanup(
 
     try:
         if (
-            not os.environ.get("NO_CLEANUP_SERVER_CONTAINER") == "true"
+            network_name is not None
+            and not os.environ.get("NO_CLEANUP_SERVER_CONTAINER") == "true"
             and not os.environ.get("NO_CLEANUP_BUILDER_CONTAINER") == "true"
         ):
             logger.info("Removing network", network_name=network_name)
@@ -225,123 +313,33 @@ def cleanup(
         logger.info("Network not found", network_name=network_name)
         pass
 
-    try:
-        if not os.environ.get("NO_CLEANUP_BUILDER_CONTAINER") == "true":
-            logger.info("Removing volume", volume=volume)
-            volume.remove(force=True)
-    except Exception:
-        logger.info("Volume not found", volume=volume)
-        pass
-
 
-def copy_from_container(container_name, container_path, host_path):
+def build_script_archive(
+    data: Union[str, bytes], path="build-scripts/build-script.js"
+) -> bytes:
     """
-    Copy a file or directory from a Docker container to the host.
+    Create a tar archive holding a build script, for `put_archive` at "/".
 
-    Args:
-        container_name (str): Name or ID of the container
-        container_path (str): Path to the file/directory in the container
-        host_path (str): Destination path on the host
+    The parent directory is included so it does not need to exist in the image.
     """
-    # Initialize Docker client
-    client = docker.from_env()
-    logger.info(
-        "Copying from container",
-        container_name=container_name,
-        container_path=container_path,
-        host_path=host_path,
-    )
-
-    try:
-        logger.info("Getting container", container_name=container_name)
-        # Get container object
-        container = client.containers.get(container_name)
-
-        logger.info(
-            "Getting file/directory from container", container_path=container_path
-        )
-        # Get file/directory from container
-        bits, stat = container.get_archive(container_path)
-
-        # Create a temporary tar file
-        file_obj = io.BytesIO()
-        for chunk in bits:
-            file_obj.write(chunk)
-        file_obj.seek(0)
-
-        # Extract the tar archive
-        with tarfile.open(fileobj=file_obj) as tar:
-            # Create the destination directory if it doesn't exist
-            os.makedirs(host_path, exist_ok=True)
-
-            # Extract all contents
-            tar.extractall(path=host_path)
-
-        logger.info(
-            "Successfully copied", container_path=container_path, host_path=host_path
-        )
-
-    except docker.errors.NotFound:
-        logger.error("Container not found", container_name=container_name)
-    except docker.errors.APIError as e:
-        logger.error("Error copying file", error=e)
-    finally:
-        client.close()
-
-
-def create_volume(
-    data: Union[str, bytes], path="/build-scripts"
-) -> docker.models.volumes.Volume:
-    """
-    Create a Docker volume and populate it with the provided data.
-
-    Args:
-        data: Content to write to shared_file.txt in the volume.
-             Can be string or bytes.
-
-    Returns:
-        The populated Docker volume
-    """
-    client = docker.from_env()
-
-    # Create volume
-    volume = client.volumes.create()
-    logger.info("Volume created", volume=volume.name)
-
-    # Prepare data for tar
     if isinstance(data, str):
         data_bytes = data.encode("utf-8")
     else:
         data_bytes = data
 
-    # Create tar containing the data
     tar_buffer = io.BytesIO()
     with tarfile.open(fileobj=tar_buffer, mode="w") as tar:
-        tar_info = tarfile.TarInfo(name="build-script.js")
+        dir_info = tarfile.TarInfo(name=os.path.dirname(path))
+        dir_info.type = tarfile.DIRTYPE
+        dir_info.mode = 0o755
+        tar.addfile(dir_info)
+
+        tar_info = tarfile.TarInfo(name=path)
         tar_info.size = len(data_bytes)
+        tar_info.mode = 0o644
         tar.addfile(tar_info, io.BytesIO(data_bytes))
-    tar_buffer.seek(0)
-
-    if not os.environ.get("NO_IMAGE_PULL"):
-        client.images.pull("alpine")
-    # Create temporary container to populate volume
-    logger.info("Creating temporary container", volume=volume.name, path=path)
-    container = client.containers.run(
-        "alpine",
-        command="tail -f /dev/null",
-        volumes={volume.name: {"bind": path, "mode": "rw"}},
-        detach=True,
-    )
-
-    try:
-        container.put_archive(path, tar_buffer.getvalue())
-    finally:
-        logger.info("Stopping temporary container", container_name=container.name)
-        container.stop()
-        logger.info("Removing temporary container", container_name=container.name)
-        container.remove()
 
-    return volume
+    return tar_buffer.getvalue()
 
 
 def calculate_expected_frames(command_list):
@@ -2,7 +2,6 @@ import argparse
 import os
 
 import mc_bench.minecraft.server
-from mc_bench.minecraft.server import wait_for_server
 from mc_bench.util.logging import get_logger
 
 logger = get_logger(__name__)
@@ -33,10 +32,8 @@ def main(options):
             "25565/tcp": options.port,
         },
         replace=options.replace,
+        wait=True,
     )
-    logger.info("Waiting for server to start...")
-    wait_for_server(result.id)
-    logger.info("Server started...")
 
     logger.info("Server started", result=result)
 
@@ -0,0 +1,138 @@
+"""
+Digest-pinned cache of the Docker images used by the server worker.
+
+Starting a server or a builder used to pull its image tag every time, which costs
+a registry round trip per container and fails the task whenever the registry is
+unreachable. The cache resolves each tag to a digest at most once per refresh
+interval, shares the result between workers through Redis and only pulls a digest
+that is not present on the Docker host yet. The digests in use on each host are
+recorded, and tasks log the images of their containers with `container_images`, so
+that outputs can be traced back to the exact images that made them.
+"""
+
+import time
+from typing import Dict, Iterable, Optional
+
+import docker
+import docker.utils
+from redis import StrictRedis
+
+from mc_bench.util.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def container_images(
+    container_ids: Iterable[str], client: Optional[docker.DockerClient] = None
+) -> Dict[str, str]:
+    """The image references the containers were created from, by container id."""
+    client = client or docker.from_env()
+    return {
+        container_id: client.containers.get(container_id).attrs["Config"]["Image"]
+        for container_id in container_ids
+    }
+
+
+class ImageCache:
+    """Resolve image tags to digests and make sure the digests are pulled.
+
+    Args:
+        redis: Client for the CACHE database
+        refresh_interval: Seconds a resolved digest is used before the registry is
+            asked again
+        client: Docker client, created from the environment when not given
+    """
+
+    def __init__(
+        self,
+        redis: StrictRedis,
+        refresh_interval: int = 300,
+        client: Optional[docker.DockerClient] = None,
+    ):
+        self.redis = redis
+        self.refresh_interval = refresh_interval
+        self._client = client or docker.from_env()
+        self._host_id = None
+
+    def resolve(self, image: str) -> str:
+        """Return a pinned `repository@digest` reference that is present locally.
+
+        If the registry cannot be reached, the last known digest is used. Without
+        one, a local copy of the tag is used as is, and the error is raised only
+        when there is none.
+        """
+        digest = self._digest(image)
+        if digest is None:
+            self._client.images.get(image)
+            logger.warning("Using unpinned local image", image=image)
+            return image
+
+        repository, _ = docker.utils.parse_repository_tag(image)
+        pinned = f"{repository}@{digest}"
+        if not self._is_present(pinned):
+            logger.info("Pulling image", image=pinned)  # Keep as info - slow operation
+            self._client.images.pull(pinned)
+
+        self.redis.hset(self._pins_key(), image, pinned)
+        return pinned
+
+    def prepull(self, images: Iterable[str]) -> Dict[str, str]:
+        """Resolve and pull `images`, skipping the ones that fail."""
+        pinned = {}
+        for image in images:
+            try:
+                pinned[image] = self.resolve(image)
+            except docker.errors.DockerException:
+                logger.exception("Error pre-pulling image", image=image)
+        return pinned
+
+    def pinned(self) -> Dict[str, str]:
+        """Pinned references last resolved on this Docker host, by image tag."""
+        return {
+            image.decode("utf-8"): pinned.decode("utf-8")
+            for image, pinned in self.redis.hgetall(self._pins_key()).items()
+        }
+
+    def _digest(self, image: str) -> Optional[str]:
+        key = self._digest_key(image)
+        cached = self.redis.hgetall(key)
+        now = int(time.time())
+
+        if cached and now - int(cached[b"resolved_at"]) < self.refresh_interval:
+            return cached[b"digest"].decode("utf-8")
+
+        try:
+            digest = self._client.images.get_registry_data(image).id
+        except docker.errors.APIError as e:
+            if not cached:
+                logger.warning("Error resolving image digest", image=image, error=e)
+                return None
+
+            logger.warning(
+                "Error resolving image digest, using the last known one",
+                image=image,
+                error=e,
+            )
+            return cached[b"digest"].decode("utf-8")
+
+        self.redis.hset(key, mapping={"digest": digest, "resolved_at": now})
+        return digest
+
+    def _is_present(self, reference: str) -> bool:
+        try:
+            self._client.images.get(reference)
+        except docker.errors.ImageNotFound:
+            return False
+        return True
+
+    @property
+    def host_id(self) -> str:
+        if self._host_id is None:
+            self._host_id = self._client.info()["ID"]
+        return self._host_id
+
+    def _digest_key(self, image: str) -> str:
+        return f"docker_image:{image}"
+
+    def _pins_key(self) -> str:
+        return f"docker_image_pins:{self.host_id}"
@@ -0,0 +1,325 @@
+"""
+Pool of pre-warmed Minecraft servers on a Docker host.
+
+Starting a server container and waiting for the world to load takes tens of
+seconds, which every build and export used to pay before doing any work. The pool
+keeps a number of idle servers per Minecraft version running ahead of time and
+records them in the MINECRAFT_SERVER_REGISTRY Redis database. A task leases an
+idle server, uses it and releases it, at which point the server is either reset
+for reuse or recycled, and replacements are started in the background.
+
+Containers only exist on the Docker host that started them, so all registry keys
+are scoped by the Docker daemon id and several hosts can share one Redis.
+"""
+
+import random
+import shlex
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+import docker
+from redis import StrictRedis
+
+from mc_bench.util.logging import get_logger
+
+from . import create_network, start_server, wait_for_server
+
+logger = get_logger(__name__)
+
+POOL_LABEL = "mc-bench.server-pool"
+
+IDLE = "idle"
+LEASED = "leased"
+
+
+@dataclass
+class ServerLease:
+    container_id: str
+    container_name: str
+    network_name: str
+    minecraft_version: str
+    image: str
+
+
+class ServerPool:
+    """Warm Minecraft servers registered in Redis and leased to build tasks.
+
+    Args:
+        redis: Client for the MINECRAFT_SERVER_REGISTRY database
+        size: Number of idle servers to keep per Minecraft version
+        max_uses: Number of leases a server serves before it is recycled
+        reset_command: Command run inside a released server to reset its world.
+            Without it, servers are recycled after every lease.
+        lease_ttl_seconds: Leases older than this are considered abandoned
+        ready_timeout: Seconds to wait for a leased server to finish starting
+        expose_ports: Publish the server port on a random host port
+        image_cache: ImageCache used to pin and pull the server image
+        resources: Docker resource limits of the server containers
+    """
+
+    def __init__(
+        self,
+        redis: StrictRedis,
+        size: int,
+        max_uses: int = 1,
+        reset_command: Optional[str] = None,
+        lease_ttl_seconds: int = 21600,
+        ready_timeout: int = 300,
+        expose_ports: bool = False,
+        image_cache=None,
+        resources: Optional[dict] = None,
+    ):
+        self.redis = redis
+        self.size = size
+        self.max_uses = max_uses
+        self.reset_command = reset_command
+        self.lease_ttl_seconds = lease_ttl_seconds
+        self.ready_timeout = ready_timeout
+        self.expose_ports = expose_ports
+        self.image_cache = image_cache
+        self.resources = resources
+        self._client = docker.from_env()
+        self._host_id = None
+
+    def lease(self, minecraft_version: str) -> Optional[ServerLease]:
+        """Take a ready server out of the pool, or return None if none is idle.
+
+        Leasing does not start replacements; call `release` or `ensure_warm` once
+        the task no longer waits on the server.
+        """
+        lease = None
+        while lease is None:
+            container_id = self.redis.rpop(self._idle_key(minecraft_version))
+            if container_id is None:
+                break
+
+            container_id = container_id.decode("utf-8")
+            server = self.redis.hgetall(self._server_key(container_id))
+            if not server or not self._is_healthy(container_id):
+                logger.info(
+                    "Discarding unhealthy pooled server", container_id=container_id
+                )
+                self._recycle(container_id, minecraft_version)
+                continue
+
+            # Servers only need to be followed up to the ready banner once
+            if not server.get(b"ready"):
+                if not wait_for_server(container_id, timeout=self.ready_timeout):
+                    logger.warning(
+                        "Pooled server did not become ready", container_id=container_id
+                    )
+                    self._recycle(container_id, minecraft_version)
+                    continue
+
+            self.redis.hset(
+                self._server_key(container_id),
+                mapping={"state": LEASED, "leased_at": int(time.time()), "ready": 1},
+            )
+            lease = ServerLease(
+                container_id=container_id,
+                container_name=server[b"container_name"].decode("utf-8"),
+                network_name=server[b"network_name"].decode("utf-8"),
+                minecraft_version=minecraft_version,
+                image=server[b"image"].decode("utf-8"),
+            )
+
+        if lease is not None:
+            logger.info(
+                "Leased pooled server",
+                container_id=lease.container_id,
+                minecraft_version=minecraft_version,
+            )
+        return lease
+
+    def release(self, lease: ServerLease, reusable: bool = True) -> None:
+        """Return a leased server, resetting it for reuse or recycling it.
+
+        Pass `reusable=False` when the task failed in a way that may have left the
+        server in a bad state.
+        """
+        uses = self.redis.hincrby(self._server_key(lease.container_id), "uses", 1)
+
+        if reusable and self.reset_command and uses < self.max_uses:
+            if self._reset(lease.container_id):
+                pipeline = self.redis.pipeline()
+                pipeline.hset(self._server_key(lease.container_id), "state", IDLE)
+                pipeline.hdel(self._server_key(lease.container_id), "leased_at")
+                pipeline.lpush(
+                    self._idle_key(lease.minecraft_version), lease.container_id
+                )
+                pipeline.execute()
+                logger.info(
+                    "Returned server to the pool",
+                    container_id=lease.container_id,
+                    uses=uses,
+                )
+            else:
+                self._recycle(lease.container_id, lease.minecraft_version)
+        else:
+            self._recycle(lease.container_id, lease.minecraft_version)
+
+        self.ensure_warm(lease.minecraft_version, lease.image)
+
+    def ensure_warm(self, minecraft_version: str, image: str) -> int:
+        """Health-check the pool and start servers until `size` are idle.
+
+        New servers are registered as idle as soon as their container starts;
+        readiness is checked when they are leased. Returns the number of servers
+        started.
+        """
+        lock_key = self._fill_lock_key(minecraft_version)
+        if not self.redis.set(lock_key, "1", ex=60, nx=True):
+            return 0
+
+        try:
+            self.health_check(minecraft_version)
+
+            missing = self.size - self.redis.llen(self._idle_key(minecraft_version))
+            for _ in range(max(missing, 0)):
+                self._start(minecraft_version, image)
+
+            if missing > 0:
+                logger.info(
+                    "Started pooled servers",
+                    minecraft_version=minecraft_version,
+                    count=missing,
+                )
+            return max(missing, 0)
+        finally:
+            self.redis.delete(lock_key)
+
+    def health_check(self, minecraft_version: str) -> None:
+        """Recycle idle servers that stopped and leases that were abandoned."""
+        now = int(time.time())
+        for container_id in self.redis.smembers(self._servers_key(minecraft_version)):
+            container_id = container_id.decode("utf-8")
+            server = self.redis.hgetall(self._server_key(container_id))
+
+            if not server:
+                self._recycle(container_id, minecraft_version)
+            elif server[b"state"] == LEASED.encode("utf-8"):
+                leased_at = int(server.get(b"leased_at", now))
+                if now - leased_at > self.lease_ttl_seconds:
+                    logger.warning(
+                        "Recycling abandoned server lease", container_id=container_id
+                    )
+                    self._recycle(container_id, minecraft_version)
+            elif not self._is_healthy(container_id):
+                logger.info("Recycling unhealthy server", container_id=container_id)
+                self._recycle(container_id, minecraft_version)
+
+    def _start(self, minecraft_version: str, image: str) -> str:
+        suffix = f"pool-{uuid.uuid4().hex[:12]}"
+        network_name = create_network(suffix)
+
+        server_args = dict(
+            image=image,
+            network_name=network_name,
+            suffix=suffix,
+            labels={POOL_LABEL: minecraft_version},
+            image_cache=self.image_cache,
+            resources=self.resources,
+        )
+        if self.expose_ports:
+            server_args["ports"] = {
+                "25565/tcp": random.choice(range(26565, 27565 + 1000)),
+            }
+
+        try:
+            container = start_server(**server_args)
+        except Exception:
+            self._remove_network(network_name)
+            raise
+
+        pipeline = self.redis.pipeline()
+        pipeline.hset(
+            self._server_key(container.id),
+            mapping={
+                "state": IDLE,
+                "minecraft_version": minecraft_version,
+                "image": image,
+                "container_name": container.name,
+                "network_name": network_name,
+                "uses": 0,
+                "created": int(time.time()),
+            },
+        )
+        pipeline.sadd(self._servers_key(minecraft_version), container.id)
+        pipeline.lpush(self._idle_key(minecraft_version), container.id)
+        pipeline.execute()
+        return container.id
+
+    def _reset(self, container_id: str) -> bool:
+        try:
+            container = self._client.containers.get(container_id)
+            exit_code, output = container.exec_run(shlex.split(self.reset_command))
+        except docker.errors.APIError as e:
+            logger.warning("Error resetting server", container_id=container_id, error=e)
+            return False
+
+        if exit_code != 0:
+            logger.warning(
+                "Server reset command failed",
+                container_id=container_id,
+                exit_code=exit_code,
+                output=output.decode("utf-8", errors="replace"),
+            )
+            return False
+        return True
+
+    def _recycle(self, container_id: str, minecraft_version: str) -> None:
+        network_name = self.redis.hget(self._server_key(container_id), "network_name")
+
+        try:
+            container = self._client.containers.get(container_id)
+            container.stop()
+            container.remove()
+        except docker.errors.NotFound:
+            pass
+
+        if network_name is not None:
+            self._remove_network(network_name.decode("utf-8"))
+
+        pipeline = self.redis.pipeline()
+        pipeline.delete(self._server_key(container_id))
+        pipeline.srem(self._servers_key(minecraft_version), container_id)
+        pipeline.lrem(self._idle_key(minecraft_version), 0, container_id)
+        pipeline.execute()
+
+    def _remove_network(self, network_name: str) -> None:
+        try:
+            self._client.networks.get(network_name).remove()
+        except docker.errors.NotFound:
+            pass
+
+    def _is_healthy(self, container_id: str) -> bool:
+        try:
+            container = self._client.containers.get(container_id)
+        except docker.errors.NotFound:
+            return False
+
+        health = container.attrs["State"].get("Health", {}).get("Status")
+        return container.status == "running" and health != "unhealthy"
+
+    @property
+    def host_id(self) -> str:
+        if self._host_id is None:
+            self._host_id = self._client.info()["ID"]
+        return self._host_id
+
+    def _prefix(self, minecraft_version: str) -> str:
+        return f"server_pool:{self.host_id}:{minecraft_version}"
+
+    def _idle_key(self, minecraft_version: str) -> str:
+        return f"{self._prefix(minecraft_version)}:idle"
+
+    def _servers_key(self, minecraft_version: str) -> str:
+        return f"{self._prefix(minecraft_version)}:servers"
+
+    def _fill_lock_key(self, minecraft_version: str) -> str:
+        return f"{self._prefix(minecraft_version)}:filling"
+
+    def _server_key(self, container_id: str) -> str:
+        return f"server_pool:server:{container_id}"
@@ -0,0 +1,204 @@
+"""
+Resource-aware build slots on a Docker host.
+
+Every build and export runs a Minecraft server and a builder container. Both get
+CPU and memory limits, and a slot is the resources of one such pair. The number
+of slots on a host follows from the CPUs and memory of its Docker daemon, less a
+reserve for everything else running there. Slots are held in the
+MINECRAFT_SERVER_REGISTRY Redis database, so all worker processes on a host share
+them, and every host reports its capacity and usage for the scheduler (see
+`mc_bench.util.capacity`). A task running several pairs at once takes all of their
+slots together, so it never holds some while waiting for the rest.
+"""
+
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional
+
+import docker
+import docker.utils
+from redis import RedisError, StrictRedis
+
+from mc_bench.util.capacity import report_capacity
+from mc_bench.util.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class NoSlotAvailable(Exception):
+    pass
+
+
+@dataclass
+class ContainerLimits:
+    """CPU and memory limits of a container; empty values mean no limit."""
+
+    cpus: Optional[float] = None
+    memory: Optional[str] = None
+
+    def container_kwargs(self) -> dict:
+        kwargs = {}
+        if self.cpus:
+            kwargs["nano_cpus"] = int(self.cpus * 1e9)
+        if self.memory:
+            kwargs["mem_limit"] = self.memory
+        return kwargs
+
+    @property
+    def memory_bytes(self) -> int:
+        return docker.utils.parse_bytes(self.memory) if self.memory else 0
+
+
+class HostSlots:
+    """Slots of one Docker host, each sized for a server and a builder.
+
+    Args:
+        redis: Client for the MINECRAFT_SERVER_REGISTRY database
+        server: Limits applied to server containers
+        builder: Limits applied to builder containers
+        reserved_cpus: CPUs of the host kept free of builds
+        reserved_memory: Memory of the host kept free of builds, e.g. "4g"
+        max_slots: Upper bound on the slots of the host, 0 for no bound
+        hold_ttl_seconds: Slots held longer than this are considered abandoned
+        slots_per_task: Most slots a single task holds at once
+    """
+
+    def __init__(
+        self,
+        redis: StrictRedis,
+        server: ContainerLimits,
+        builder: ContainerLimits,
+        reserved_cpus: float = 0,
+        reserved_memory: Optional[str] = None,
+        max_slots: int = 0,
+        hold_ttl_seconds: int = 21600,
+        slots_per_task: int = 1,
+        client: Optional[docker.DockerClient] = None,
+    ):
+        self.redis = redis
+        self.server = server
+        self.builder = builder
+        self.reserved_cpus = reserved_cpus
+        self.reserved_memory = reserved_memory
+        self.max_slots = max_slots
+        self.hold_ttl_seconds = hold_ttl_seconds
+        self.slots_per_task = slots_per_task
+        self._client = client or docker.from_env()
+        self._info = None
+
+    @property
+    def capacity(self) -> int:
+        """Number of server and builder pairs that fit on the host."""
+        slot_cpus = (self.server.cpus or 0) + (self.builder.cpus or 0)
+        slot_memory = self.server.memory_bytes + self.builder.memory_bytes
+
+        limits = []
+        if slot_cpus:
+            limits.append(int((self.info["NCPU"] - self.reserved_cpus) // slot_cpus))
+        if slot_memory:
+            reserved_memory = (
+                docker.utils.parse_bytes(self.reserved_memory)
+                if self.reserved_memory
+                else 0
+            )
+            limits.append(int((self.info["MemTotal"] - reserved_memory) // slot_memory))
+        if self.max_slots:
+            limits.append(self.max_slots)
+
+        # Without limits or a bound there is nothing to size slots by
+        return max(min(limits), 1) if limits else 1
+
+    @contextmanager
+    def slot(
+        self, holder: str, timeout: int = 600, poll_interval: float = 5, count: int = 1
+    ):
+        """Hold `count` slots for `holder` while the block runs.
+
+        Waits up to `timeout` seconds for the slots to free up and raises
+        NoSlotAvailable if they do not.
+        """
+        if count > self.capacity:
+            raise NoSlotAvailable(
+                f"{self.host_id} has {self.capacity} build slots, {count} requested"
+            )
+
+        deadline = time.monotonic() + timeout
+        while not self.acquire(holder, count):
+            if time.monotonic() > deadline:
+                raise NoSlotAvailable(
+                    f"No build slot free on {self.host_id} after {timeout}s"
+                )
+            time.sleep(poll_interval)
+
+        try:
+            yield
+        finally:
+            self.release(holder, count)
+
+    def acquire(self, holder: str, count: int = 1) -> bool:
+        """Take `count` slots for `holder` in one transaction, or none of them."""
+        key = self._holders_key()
+        capacity = self.capacity
+        members = self._members(holder, count)
+        # Drops abandoned holds outside the transaction, which watches the key
+        self.usage()
+
+        def take(pipeline):
+            held = sum(
+                1 for member in members if pipeline.zscore(key, member) is not None
+            )
+            if pipeline.zcard(key) - held + len(members) > capacity:
+                return False
+            pipeline.multi()
+            pipeline.zadd(key, {member: time.time() for member in members})
+            return True
+
+        acquired = self.redis.transaction(take, key, value_from_callable=True)
+        self.report()
+        if acquired:
+            logger.info(
+                "Acquired build slot", holder=holder, count=count, host_id=self.host_id
+            )
+        return acquired
+
+    def release(self, holder: str, count: int = 1) -> None:
+        self.redis.zrem(self._holders_key(), *self._members(holder, count))
+        self.report()
+
+    def usage(self) -> int:
+        key = self._holders_key()
+        self.redis.zremrangebyscore(key, "-inf", time.time() - self.hold_ttl_seconds)
+        return self.redis.zcard(key)
+
+    def report(self) -> Optional[dict]:
+        """Publish the capacity and usage of this host for the scheduler."""
+        try:
+            return report_capacity(
+                self.redis,
+                self.host_id,
+                capacity=self.capacity,
+                used=self.usage(),
+                slots_per_task=min(self.slots_per_task, self.capacity),
+            )
+        except RedisError:
+            logger.exception("Error reporting build slot usage")
+
+    @property
+    def info(self) -> dict:
+        if self._info is None:
+            self._info = self._client.info()
+        return self._info
+
+    @property
+    def host_id(self) -> str:
+        return self.info["ID"]
+
+    @staticmethod
+    def _members(holder: str, count: int):
+        if count == 1:
+            return [holder]
+        return [f"{holder}:{index}" for index in range(count)]
+
+    def _holders_key(self) -> str:
+        return f"server_slots:{self.host_id}:holders"
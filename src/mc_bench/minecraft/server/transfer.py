@@ -0,0 +1,199 @@
+"""
+Batched transfer of files from containers to object storage.
+
+All files wanted from a container are pulled with a single `get_archive` of their
+common parent directory. The tar stream is read as it arrives and each wanted
+member goes straight to object storage without touching the host disk: small files
+are buffered in memory and uploaded in parallel, large ones are streamed through
+a multipart upload.
+"""
+
+import io
+import posixpath
+import tarfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable
+
+import docker
+
+from mc_bench.util.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Members up to this size are read into memory and uploaded on the thread pool
+IN_MEMORY_LIMIT = 16 * 1024 * 1024
+# Part size for streamed multipart uploads
+PART_SIZE = 16 * 1024 * 1024
+
+
+@dataclass
+class ContainerArtifact:
+    container_id: str
+    container_path: str
+    object_name: str
+
+
+def upload_from_containers(
+    object_client,
+    bucket_name: str,
+    artifacts: Iterable[ContainerArtifact],
+    max_workers: int = 8,
+) -> None:
+    """Upload files from one or more containers to object storage.
+
+    Raises FileNotFoundError if any of the files is missing from its container.
+    """
+    by_container = defaultdict(list)
+    for artifact in artifacts:
+        by_container[artifact.container_id].append(artifact)
+
+    if not by_container:
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as uploads:
+        with ThreadPoolExecutor(max_workers=len(by_container)) as readers:
+            read_futures = [
+                readers.submit(
+                    _read_container,
+                    object_client,
+                    bucket_name,
+                    container_id,
+                    container_artifacts,
+                    uploads,
+                )
+                for container_id, container_artifacts in by_container.items()
+            ]
+            upload_futures = [
+                upload_future
+                for read_future in read_futures
+                for upload_future in read_future.result()
+            ]
+
+        for upload_future in upload_futures:
+            upload_future.result()
+
+
+def upload_archive(
+    object_client,
+    bucket_name: str,
+    container_id: str,
+    container_path: str,
+    object_name: str,
+) -> None:
+    """Upload a tar archive of a container path, streaming it as it is read."""
+    client = docker.from_env()
+    try:
+        container = client.containers.get(container_id)
+        logger.info(
+            "Streaming archive from container",
+            container_id=container_id,
+            container_path=container_path,
+        )
+        bits, _ = container.get_archive(container_path)
+        _put(object_client, bucket_name, object_name, _ChunkReader(bits), -1)
+    finally:
+        client.close()
+
+
+def _read_container(object_client, bucket_name, container_id, artifacts, uploads):
+    client = docker.from_env()
+    try:
+        container = client.containers.get(container_id)
+
+        root = posixpath.commonpath([a.container_path for a in artifacts])
+
+        # Archive member names are relative to the parent of the requested path
+        prefix = posixpath.dirname(root)
+        wanted = {
+            posixpath.relpath(artifact.container_path, prefix): artifact
+            for artifact in artifacts
+        }
+
+        logger.info(
+            "Streaming files from container",
+            container_id=container_id,
+            root=root,
+            files=len(wanted),
+        )
+        bits, _ = container.get_archive(root)
+
+        upload_futures = []
+        with _open_tar_stream(bits) as tar:
+            for member in tar:
+                artifact = wanted.pop(member.name, None)
+                if artifact is None or not member.isfile():
+                    continue
+
+                fileobj = tar.extractfile(member)
+                if member.size <= IN_MEMORY_LIMIT:
+                    data = fileobj.read()
+                    upload_futures.append(
+                        uploads.submit(
+                            _put,
+                            object_client,
+                            bucket_name,
+                            artifact.object_name,
+                            io.BytesIO(data),
+                            len(data),
+                        )
+                    )
+                else:
+                    # The stream can only be read in order, so upload it right away
+                    _put(
+                        object_client,
+                        bucket_name,
+                        artifact.object_name,
+                        fileobj,
+                        member.size,
+                    )
+
+                if not wanted:
+                    break
+
+        if wanted:
+            missing = [artifact.container_path for artifact in wanted.values()]
+            raise FileNotFoundError(f"Not found in container {container_id}: {missing}")
+
+        return upload_futures
+    finally:
+        client.close()
+
+
+def _put(object_client, bucket_name, object_name, data, length):
+    object_client.put_object(
+        bucket_name=bucket_name,
+        object_name=object_name,
+        data=data,
+        length=length,
+        part_size=PART_SIZE,
+    )
+    logger.info("Uploaded artifact", object_name=object_name)
+
+
+def _open_tar_stream(chunks):
+    return tarfile.open(fileobj=_ChunkReader(chunks), mode="r|")
+
+
+class _ChunkReader(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._buffer:
+            try:
+                self._buffer = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
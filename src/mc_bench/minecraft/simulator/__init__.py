@@ -0,0 +1,449 @@
+"""
+Headless build simulator.
+
+Executes the /setblock, /fill and /fillbiome commands of a build into an
+in-memory voxel grid instead of sending them to a Minecraft server, and writes the
+schematic, command list and build summary artifacts the builder would have
+produced. This re-creates the artifacts of existing samples from their recorded
+command list in milliseconds and stands in for a server in local runs and tests.
+
+Commands are validated against minecraft-data for the build's Minecraft version.
+Commands a server would reject (unknown blocks, block states or biomes, positions
+outside the world, fills above the block limit) are skipped and kept in
+`BuildSimulator.errors`, just like the server replies with an error and moves on.
+"""
+
+import io
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import minecraft_data
+import numpy as np
+from nbt import nbt
+
+AIR = "minecraft:air"
+DEFAULT_BIOME = "minecraft:plains"
+
+# Overworld build limits since 1.18
+WORLD_MIN_Y = -64
+WORLD_MAX_Y = 319
+
+# Default value of the commandModificationBlockLimit game rule
+FILL_BLOCK_LIMIT = 32768
+
+# Refuse to allocate grids above this many blocks (the server would need to load
+# the same region to export it)
+MAX_VOLUME = 16_777_216
+
+SCHEMATIC_VERSION = 3
+
+FILL_MODES = ("destroy", "hollow", "keep", "outline", "replace")
+SETBLOCK_MODES = ("destroy", "keep", "replace")
+
+_COMMAND_PATTERN = re.compile(r"^/(setblock|fill|fillbiome)\s+(.*)$")
+_BLOCK_PATTERN = re.compile(r"^(?:minecraft:)?([a-z0-9_]+)(?:\[(.*)\])?$")
+
+
+class InvalidCommand(ValueError):
+    pass
+
+
+class BlockRegistry:
+    """Blocks, block states and biomes of a Minecraft version."""
+
+    def __init__(self, minecraft_version: str):
+        self.minecraft_version = minecraft_version
+        mc_data = minecraft_data.MinecraftDataFiles(
+            version=minecraft_version,
+            game_type=minecraft_data.PC,
+        )
+
+        with open(mc_data.get("blocks", "blocks.json"), "r") as f:
+            blocks = json.load(f)
+
+        with open(mc_data.get("biomes", "biomes.json"), "r") as f:
+            biomes = json.load(f)
+
+        # block name -> [(state name, allowed values, default value)]
+        self.block_states: Dict[str, List[Tuple[str, List[str], str]]] = {
+            block["name"]: _block_states(block) for block in blocks
+        }
+        self.biomes = {biome["name"] for biome in biomes}
+        self.data_version = _data_version(minecraft_version)
+
+    def block_state(self, token: str) -> str:
+        """Validate a block argument and return its fully specified block state.
+
+        Properties that are not given take their default value, so that equal
+        blocks always map to the same palette entry, as in WorldEdit schematics.
+        """
+        name, properties = parse_block(token)
+        if name not in self.block_states:
+            raise InvalidCommand(f"Unknown block type: {name}")
+
+        states = self.block_states[name]
+        known = {state_name: values for state_name, values, _ in states}
+        for key, value in properties.items():
+            if key not in known:
+                raise InvalidCommand(f"Block {name} does not have property {key}")
+            if value not in known[key]:
+                raise InvalidCommand(f"Invalid value {value} for {name}[{key}]")
+
+        if not states:
+            return f"minecraft:{name}"
+
+        state_string = ",".join(
+            f"{state_name}={properties.get(state_name, default)}"
+            for state_name, _, default in states
+        )
+        return f"minecraft:{name}[{state_string}]"
+
+    def biome(self, token: str) -> str:
+        name = token.removeprefix("minecraft:")
+        if name not in self.biomes:
+            raise InvalidCommand(f"Unknown biome: {name}")
+        return f"minecraft:{name}"
+
+
+class BuildSimulator:
+    """Simulates a build on an empty (all air) world.
+
+    Args:
+        minecraft_version: Version whose blocks and biomes commands are checked
+            against
+        max_volume: Largest bounding box, in blocks, the simulator will allocate
+    """
+
+    def __init__(self, minecraft_version: str, max_volume: int = MAX_VOLUME):
+        self.registry = BlockRegistry(minecraft_version)
+        self.max_volume = max_volume
+        self.commands: List[Dict[str, Any]] = []
+        self.errors: List[Tuple[str, str]] = []
+        self.bounding_box: Optional[Dict[str, Dict[str, int]]] = None
+
+        self._origin = np.zeros(3, dtype=np.int64)
+        self._blocks = np.zeros((0, 0, 0), dtype=np.int32)
+        self._biomes = np.zeros((0, 0, 0), dtype=np.int32)
+        self._block_palette = {AIR: 0}
+        self._biome_palette = {DEFAULT_BIOME: 0}
+
+    def run(self, commands: Iterable[Union[str, Dict[str, Any]]]) -> "BuildSimulator":
+        """Execute commands in order.
+
+        Accepts command strings or entries of a recorded command list. The
+        bounding box covers every /setblock position and /fill corner, like the
+        builder's coordinate tracking, and is the region written to the schematic.
+        """
+        operations = []
+        for command in commands:
+            if isinstance(command, dict):
+                command = command["command"]
+
+            try:
+                operations.append(self._parse(command))
+            except InvalidCommand as e:
+                self.errors.append((command, str(e)))
+
+        self._allocate(operations)
+
+        for command, *operation in operations:
+            try:
+                self._apply(*operation)
+            except InvalidCommand as e:
+                self.errors.append((command, str(e)))
+
+        return self
+
+    def summary(self, starting_location: Optional[Dict[str, int]] = None):
+        """Return the build summary written by the builder next to the command list."""
+        return {
+            "startingLocation": starting_location,
+            "boundingBox": self.bounding_box,
+        }
+
+    def schematic_bytes(self) -> bytes:
+        """Render the bounding box as a gzipped Sponge schematic (version 3)."""
+        width, height, length = self._blocks.shape
+
+        schematic = nbt.TAG_Compound(name="Schematic")
+        schematic.tags.extend(
+            [
+                nbt.TAG_Int(name="Version", value=SCHEMATIC_VERSION),
+                nbt.TAG_Int(name="DataVersion", value=self.registry.data_version),
+                nbt.TAG_Short(name="Width", value=width),
+                nbt.TAG_Short(name="Height", value=height),
+                nbt.TAG_Short(name="Length", value=length),
+                _int_array("Offset", [0, 0, 0]),
+                _container("Blocks", self._block_palette, self._blocks),
+                _container("Biomes", self._biome_palette, self._biomes),
+            ]
+        )
+        schematic["Blocks"].tags.append(
+            nbt.TAG_List(name="BlockEntities", type=nbt.TAG_Compound)
+        )
+
+        nbt_file = nbt.NBTFile()
+        nbt_file.name = ""
+        nbt_file.tags.append(schematic)
+
+        buffer = io.BytesIO()
+        nbt_file.write_file(fileobj=buffer)
+        return buffer.getvalue()
+
+    def block_at(self, x: int, y: int, z: int) -> str:
+        index = self._grid_index(x, y, z)
+        if index is None:
+            return AIR
+        return self._palette_name(self._block_palette, self._blocks[index])
+
+    def biome_at(self, x: int, y: int, z: int) -> str:
+        index = self._grid_index(x, y, z)
+        if index is None:
+            return DEFAULT_BIOME
+        return self._palette_name(self._biome_palette, self._biomes[index])
+
+    def _parse(self, command: str):
+        match = _COMMAND_PATTERN.match(command.strip())
+        if match is None:
+            raise InvalidCommand("Not a block or biome command")
+
+        kind, arguments = match.group(1), match.group(2).split()
+
+        if kind == "setblock":
+            if len(arguments) not in (4, 5):
+                raise InvalidCommand("Expected /setblock x y z block [mode]")
+            position = _coordinates(arguments[:3])
+            # Recorded before the block is checked, as the builder records every
+            # command it sends, whether the server accepts it or not
+            self.commands.append(
+                {
+                    "command": command,
+                    "kind": "setblock",
+                    "coordinates": _point(position),
+                }
+            )
+            block = self.registry.block_state(arguments[3])
+            # The builder wraps the mode in brackets
+            mode = arguments[4].strip("[]") if len(arguments) == 5 else "replace"
+            if mode not in SETBLOCK_MODES:
+                raise InvalidCommand(f"Invalid placement mode: {mode}")
+            return (command, kind, position, position, block, mode, None)
+
+        if len(arguments) < 7:
+            raise InvalidCommand(f"Expected /{kind} x1 y1 z1 x2 y2 z2 <value>")
+
+        start = _coordinates(arguments[:3])
+        end = _coordinates(arguments[3:6])
+        low, high = np.minimum(start, end), np.maximum(start, end)
+
+        # Recorded before the value is checked, like /setblock. The builder records
+        # biome fills as fills, see CommandQueue.add
+        self.commands.append(
+            {
+                "command": command,
+                "kind": "fill",
+                "coordinates": [_point(start), _point(end)],
+            }
+        )
+
+        if kind == "fillbiome":
+            if len(arguments) != 7:
+                raise InvalidCommand("Replace filters are not supported for biomes")
+            return (command, kind, low, high, self.registry.biome(arguments[6]), None)
+
+        block = self.registry.block_state(arguments[6])
+        mode = arguments[7] if len(arguments) > 7 else "replace"
+        if mode not in FILL_MODES:
+            raise InvalidCommand(f"Invalid fill mode: {mode}")
+
+        replace_filter = None
+        if len(arguments) > 8:
+            if mode != "replace" or len(arguments) != 9:
+                raise InvalidCommand("Unexpected arguments after fill mode")
+            filter_name, filter_properties = parse_block(arguments[8])
+            # Validates the filter the same way as the block to fill with
+            self.registry.block_state(arguments[8])
+            replace_filter = (filter_name, filter_properties)
+
+        return (command, kind, low, high, block, mode, replace_filter)
+
+    def _allocate(self, operations):
+        corners = [
+            corner
+            for operation in operations
+            if operation[1] != "fillbiome"
+            for corner in (operation[2], operation[3])
+        ]
+        if not corners:
+            return
+
+        low = np.min(corners, axis=0)
+        high = np.max(corners, axis=0)
+        shape = tuple(int(size) for size in high - low + 1)
+        volume = int(np.prod(shape, dtype=np.int64))
+        if volume > self.max_volume:
+            raise ValueError(
+                f"Build bounding box of {volume} blocks exceeds {self.max_volume}"
+            )
+
+        self._origin = low
+        self._blocks = np.zeros(shape, dtype=np.int32)
+        self._biomes = np.zeros(shape, dtype=np.int32)
+        self.bounding_box = {"min": _point(low), "max": _point(high)}
+
+    def _apply(self, kind, low, high, value, mode, replace_filter=None):
+        if low[1] < WORLD_MIN_Y or high[1] > WORLD_MAX_Y:
+            raise InvalidCommand("Position is outside of the world")
+
+        if kind == "fillbiome":
+            region = self._region(low, high)
+            if region is not None:
+                self._biomes[region] = _palette_id(self._biome_palette, value)
+            return
+
+        size = high - low + 1
+        if kind == "fill" and int(np.prod(size)) > FILL_BLOCK_LIMIT:
+            raise InvalidCommand("Too many blocks in the specified area")
+
+        region = self._region(low, high)
+        block_id = _palette_id(self._block_palette, value)
+        target = self._blocks[region]
+
+        if mode in ("replace", "destroy") and replace_filter is None:
+            target[...] = block_id
+        elif mode == "replace":
+            target[self._matches(target, *replace_filter)] = block_id
+        elif mode == "keep":
+            target[target == 0] = block_id
+        else:
+            shell = np.ones(target.shape, dtype=bool)
+            shell[1:-1, 1:-1, 1:-1] = False
+            if mode == "hollow":
+                target[...] = 0
+            target[shell] = block_id
+
+    def _matches(self, target, name, properties):
+        """Mask of the blocks in `target` matching a replace filter."""
+        prefix = f"minecraft:{name}"
+        matching_ids = [
+            block_id
+            for state, block_id in self._block_palette.items()
+            if state.split("[", 1)[0] == prefix
+            and all(
+                f"{key}={value}" in state.partition("[")[2].rstrip("]").split(",")
+                for key, value in properties.items()
+            )
+        ]
+        return np.isin(target, matching_ids)
+
+    def _region(self, low, high):
+        """Slices of the grid covering [low, high], clipped to the bounding box."""
+        start = np.maximum(low - self._origin, 0)
+        stop = np.minimum(high - self._origin + 1, self._blocks.shape)
+        if np.any(stop <= start):
+            return None
+        return tuple(slice(int(a), int(b)) for a, b in zip(start, stop))
+
+    def _grid_index(self, x, y, z):
+        index = np.array([x, y, z]) - self._origin
+        if np.any(index < 0) or np.any(index >= self._blocks.shape):
+            return None
+        return tuple(int(i) for i in index)
+
+    @staticmethod
+    def _palette_name(palette, palette_id):
+        return next(name for name, value in palette.items() if value == palette_id)
+
+
+def parse_block(token: str) -> Tuple[str, Dict[str, str]]:
+    """Split `minecraft:name[key=value,...]` into the name and its properties."""
+    match = _BLOCK_PATTERN.match(token)
+    if match is None:
+        raise InvalidCommand(f"Invalid block: {token}")
+
+    name, state_string = match.group(1), match.group(2)
+    properties = {}
+    if state_string:
+        for assignment in state_string.split(","):
+            key, _, value = assignment.partition("=")
+            if not key or not value:
+                raise InvalidCommand(f"Invalid block state: {assignment}")
+            properties[key.strip()] = value.strip()
+
+    return name, properties
+
+
+def _block_states(block) -> List[Tuple[str, List[str], str]]:
+    # minecraft-data numbers the states of a block in mixed radix with the last
+    # property varying fastest, which lets us decode the default state's values
+    states = []
+    index = block.get("defaultState", 0) - block.get("minStateId", 0)
+    for state in reversed(block.get("states", [])):
+        values = state.get("values") or ["true", "false"]
+        index, value_index = divmod(index, len(values))
+        states.append((state["name"], values, values[value_index]))
+    return list(reversed(states))
+
+
+def _data_version(minecraft_version: str) -> int:
+    path = minecraft_data.get_data_root() / "pc" / "common" / "protocolVersions.json"
+    with open(path, "r") as f:
+        versions = json.load(f)
+
+    return next(
+        version["dataVersion"]
+        for version in versions
+        if version["minecraftVersion"] == minecraft_version
+    )
+
+
+def _coordinates(arguments) -> np.ndarray:
+    try:
+        return np.array([int(argument) for argument in arguments], dtype=np.int64)
+    except ValueError:
+        raise InvalidCommand(f"Invalid coordinates: {' '.join(arguments)}")
+
+
+def _point(coordinates) -> Dict[str, int]:
+    return {axis: int(value) for axis, value in zip("xyz", coordinates)}
+
+
+def _palette_id(palette, name) -> int:
+    if name not in palette:
+        palette[name] = len(palette)
+    return palette[name]
+
+
+def _varints(values: np.ndarray) -> bytearray:
+    # Palettes rarely reach 128 entries, where every varint is a single byte
+    if values.size == 0 or values.max() < 0x80:
+        return bytearray(values.astype(np.uint8).tobytes())
+
+    data = bytearray()
+    for value in values.tolist():
+        while value & ~0x7F:
+            data.append((value & 0x7F) | 0x80)
+            value >>= 7
+        data.append(value)
+    return data
+
+
+def _int_array(name, value):
+    tag = nbt.TAG_Int_Array(name=name)
+    tag.value = value
+    return tag
+
+
+def _container(name, palette, grid):
+    """Palette and data of a block or biome container, in y, z, x order."""
+    palette_tag = nbt.TAG_Compound(name="Palette")
+    for state, palette_id in palette.items():
+        palette_tag.tags.append(nbt.TAG_Int(name=state, value=palette_id))
+
+    data = nbt.TAG_Byte_Array(name="Data")
+    data.value = _varints(grid.transpose(1, 2, 0).ravel())
+
+    container = nbt.TAG_Compound(name=name)
+    container.tags.extend([palette_tag, data])
+    return container
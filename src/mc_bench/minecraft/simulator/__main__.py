@@ -0,0 +1,66 @@
+import argparse
+import json
+import os
+
+from mc_bench.util.logging import get_logger
+
+from . import BuildSimulator
+
+logger = get_logger(__name__)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description="Build a schematic from a recorded command list without a server"
+    )
+    parser.add_argument("command_list", type=str, help="Path to a commandList.json")
+    parser.add_argument("--version", type=str, default="1.21.1")
+    parser.add_argument(
+        "--summary",
+        type=str,
+        default=None,
+        help="Recorded summary.json to take the starting location from",
+    )
+    parser.add_argument("--structure-name", type=str, default="build")
+    parser.add_argument("--outdir", type=str, default="out")
+    return parser
+
+
+def main(options):
+    with open(options.command_list, "r") as f:
+        command_list = json.load(f)
+
+    starting_location = None
+    if options.summary:
+        with open(options.summary, "r") as f:
+            starting_location = json.load(f)["startingLocation"]
+
+    simulator = BuildSimulator(options.version).run(command_list)
+    for command, error in simulator.errors:
+        logger.warning("Command failed", command=command, error=error)
+
+    os.makedirs(options.outdir, exist_ok=True)
+
+    with open(
+        os.path.join(options.outdir, f"{options.structure_name}.schem"), "wb"
+    ) as f:
+        f.write(simulator.schematic_bytes())
+
+    with open(os.path.join(options.outdir, "commandList.json"), "w") as f:
+        json.dump(simulator.commands, f, indent=2)
+
+    with open(os.path.join(options.outdir, "summary.json"), "w") as f:
+        json.dump(simulator.summary(starting_location), f, indent=2)
+
+    logger.info(
+        "Simulated build",
+        commands=len(simulator.commands),
+        errors=len(simulator.errors),
+        bounding_box=simulator.bounding_box,
+    )
+
+
+if __name__ == "__main__":
+    parser = get_parser()
+    options = parser.parse_args()
+    main(options)
@@ -3,6 +3,8 @@ from . import (
     log,
     model,
     prompt,
+    prompt_batch,
+    prompt_cache,
     provider,
     run,
     scheduler_control,
@@ -13,6 +15,8 @@ from . import (
 __all__ = [
     "model",
     "prompt",
+    "prompt_batch",
+    "prompt_cache",
     "provider",
     "run",
     "template",
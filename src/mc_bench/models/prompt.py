@@ -1,6 +1,7 @@
 import datetime
-from typing import List
+from typing import Dict, FrozenSet, List
 
+from sqlalchemy import event as sqlalchemy_event
 from sqlalchemy import func, select
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import Mapped, object_session, relationship
@@ -13,6 +14,74 @@ from .experimental_state import ExperimentalState
 from .log import Log
 from .user import User
 
+SCORABLE_TAG_INDEX_VERSION_KEY = "scorable_tag_index_version"
+_INVALIDATE_LISTENING_KEY = "scorable_tag_index:listening"
+_INVALIDATE_PENDING_KEY = "scorable_tag_index:pending"
+
+_scorable_tag_index_cache: Dict[str, object] = {"version": None, "index": None}
+
+
+def scorable_tag_ids_by_prompt(db, redis) -> Dict[int, FrozenSet[int]]:
+    """Map prompt id -> ids of its tags that have calculate_score set.
+
+    The index is cached per process and reloaded only when the version stamp in
+    Redis moves, see `invalidate_scorable_tag_index`.
+    """
+    version = redis.get(SCORABLE_TAG_INDEX_VERSION_KEY)
+    if (
+        _scorable_tag_index_cache["index"] is None
+        or _scorable_tag_index_cache["version"] != version
+    ):
+        index: Dict[int, set] = {}
+        for prompt_id, tag_id in db.execute(
+            select(
+                schema.specification.prompt_tag.c.prompt_id,
+                schema.specification.prompt_tag.c.tag_id,
+            )
+            .join(
+                schema.specification.tag,
+                schema.specification.prompt_tag.c.tag_id
+                == schema.specification.tag.c.id,
+            )
+            .where(schema.specification.tag.c.calculate_score)
+        ):
+            index.setdefault(prompt_id, set()).add(tag_id)
+
+        _scorable_tag_index_cache["index"] = {
+            prompt_id: frozenset(tag_ids) for prompt_id, tag_ids in index.items()
+        }
+        _scorable_tag_index_cache["version"] = version
+
+    return _scorable_tag_index_cache["index"]
+
+
+def invalidate_scorable_tag_index(redis, db=None):
+    """Signal that prompt tags or tag scoring flags changed.
+
+    With a `db` session, the version only moves once the session commits, so no
+    process reloads the index before the change is visible to it.
+    """
+    if db is None:
+        redis.incr(SCORABLE_TAG_INDEX_VERSION_KEY)
+        return
+
+    # Held in the session until its transaction ends one way or the other
+    if not db.info.get(_INVALIDATE_LISTENING_KEY):
+        sqlalchemy_event.listen(db, "after_commit", _invalidate_after_commit)
+        sqlalchemy_event.listen(db, "after_rollback", _drop_invalidation)
+        db.info[_INVALIDATE_LISTENING_KEY] = True
+    db.info[_INVALIDATE_PENDING_KEY] = redis
+
+
+def _invalidate_after_commit(db):
+    redis = db.info.pop(_INVALIDATE_PENDING_KEY, None)
+    if redis is not None:
+        redis.incr(SCORABLE_TAG_INDEX_VERSION_KEY)
+
+
+def _drop_invalidation(db):
+    db.info.pop(_INVALIDATE_PENDING_KEY, None)
+
 
 class Tag(Base):
     __table__ = schema.specification.tag
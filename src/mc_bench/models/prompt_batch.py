@@ -0,0 +1,56 @@
+from typing import Dict, Iterable, List
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Mapped, Session, relationship
+
+import mc_bench.schema.postgres as schema
+
+from ._base import Base
+
+
+class PromptBatch(Base):
+    """A batch job at a provider, executing the prompts of PROMPT_EXECUTION stages.
+
+    Jobs are recorded once submitted, so they are polled by short tasks and can
+    be cancelled, instead of being waited on by one task for up to a day.
+    """
+
+    __table__ = schema.specification.prompt_batch
+
+    provider: Mapped["Provider"] = relationship("Provider", uselist=False)  # noqa: F821
+
+    @classmethod
+    def create(
+        cls, db: Session, provider_id: int, batch_id: str, stage_ids: Iterable[int]
+    ) -> "PromptBatch":
+        prompt_batch = cls(provider_id=provider_id, batch_id=batch_id)
+        db.add(prompt_batch)
+        db.flush()
+        db.execute(
+            insert(schema.specification.prompt_batch_stage),
+            [
+                {"prompt_batch_id": prompt_batch.id, "run_stage_id": stage_id}
+                for stage_id in stage_ids
+            ],
+        )
+        return prompt_batch
+
+    def stage_ids(self, db: Session) -> List[int]:
+        table = schema.specification.prompt_batch_stage
+        return list(
+            db.scalars(
+                select(table.c.run_stage_id).where(table.c.prompt_batch_id == self.id)
+            )
+        )
+
+    @staticmethod
+    def attempts(db: Session, stage_ids: Iterable[int]) -> Dict[int, int]:
+        """Number of batch jobs that executed the prompt of each stage."""
+        table = schema.specification.prompt_batch_stage
+        return dict(
+            db.execute(
+                select(table.c.run_stage_id, func.count())
+                .where(table.c.run_stage_id.in_(list(stage_ids)))
+                .group_by(table.c.run_stage_id)
+            ).all()
+        )
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import uuid
+from io import BytesIO
+from typing import Iterable, Optional, Tuple
+
+from minio.error import S3Error
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+import mc_bench.schema.postgres as schema
+from mc_bench.schema.object_store.prompt_cache import KINDS, prompt_cache
+from mc_bench.util.object_store import get_client, get_object_as_string
+
+from ._base import Base
+from .provider import Provider
+
+
+def prompt_cache_key(provider_class: str, config: dict, prompt: str) -> str:
+    """Hash of everything that determines the response to a prompt."""
+    payload = json.dumps(
+        {"provider_class": provider_class, "config": config, "prompt": prompt},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def response_hash(response: str) -> str:
+    return hashlib.sha256(response.encode("utf-8")).hexdigest()
+
+
+class PromptResponse(Base):
+    __table__ = schema.specification.prompt_response_cache
+
+    def download(self, client=None) -> str:
+        if client is None:
+            client = get_client()
+
+        return get_object_as_string(
+            client=client, bucket_name=self.bucket, object_name=self.key
+        )
+
+
+class PromptCache:
+    """Responses of providers kept in object storage and reused across runs.
+
+    Up to `responses` distinct responses are kept per provider class, provider
+    config and rendered prompt. Until a prompt has that many, every execution asks
+    the provider and adds its response; after that, executions are answered with
+    the least used response. With `responses=1` every execution of a prompt gets
+    the same response, which suits deterministic or temperature 0 configs.
+
+    Args:
+        db: Session the metadata of the responses is written with
+        bucket: Bucket the responses are stored in
+        responses: Number of responses to keep and reuse per prompt
+    """
+
+    def __init__(self, db: Session, bucket: str, responses: int = 1, client=None):
+        self.db = db
+        self.bucket = bucket
+        self.responses = responses
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client()
+        return self._client
+
+    def execute_prompt(
+        self,
+        provider: Provider,
+        prompt: str,
+        exclude: Iterable[str] = (),
+        **kwargs,
+    ) -> Tuple[str, bool]:
+        """Answer `prompt` from the cache, or from `provider` with `kwargs`.
+
+        Responses whose hash is in `exclude`, e.g. the responses a run being
+        started over already had, are never reused.
+
+        Returns:
+            The response and whether it came from the cache
+        """
+        config = (
+            json.loads(provider.config)
+            if isinstance(provider.config, str)
+            else provider.config
+        )
+        cache_key = prompt_cache_key(provider.provider_class, config, prompt)
+
+        table = schema.specification.prompt_response_cache
+        entries = self.db.scalars(
+            select(PromptResponse)
+            .where(table.c.cache_key == cache_key)
+            .order_by(table.c.uses, table.c.id)
+        ).all()
+
+        if len(entries) >= self.responses:
+            exclude = set(exclude)
+            for entry in entries:
+                if entry.response_hash in exclude:
+                    continue
+                response = self._reuse(entry)
+                if response is not None:
+                    return response, True
+
+        response = provider.execute_prompt(prompt, **kwargs)
+        if len(entries) < self.responses:
+            self._store(cache_key, provider.provider_class, config, response)
+        return response, False
+
+    def _reuse(self, entry: PromptResponse) -> Optional[str]:
+        try:
+            response = entry.download(self.client)
+        except S3Error:
+            # Treated as a miss; the entry is tried again next time
+            return None
+
+        table = schema.specification.prompt_response_cache
+        self.db.execute(
+            update(table)
+            .where(table.c.id == entry.id)
+            .values(uses=table.c.uses + 1, last_used=func.now())
+        )
+        return response
+
+    def _store(self, cache_key, provider_class, config, response):
+        # Workers that missed on the same prompt at once store their responses one
+        # at a time, until the session commits, so a prompt never gets more than
+        # `responses` entries or the same response twice
+        table = schema.specification.prompt_response_cache
+        self.db.execute(select(func.pg_advisory_xact_lock(func.hashtext(cache_key))))
+        stored = self.db.scalars(
+            select(table.c.response_hash).where(table.c.cache_key == cache_key)
+        ).all()
+        digest = response_hash(response)
+        if len(stored) >= self.responses or digest in stored:
+            return
+
+        data = response.encode("utf-8")
+        key = (
+            prompt_cache.get(KINDS.PROMPT_CACHE, KINDS.PROMPT_RESPONSE)
+            .materialize(cache_key=cache_key, response_id=str(uuid.uuid4()))
+            .get_path()
+        )
+        self.client.put_object(
+            bucket_name=self.bucket,
+            object_name=key,
+            data=BytesIO(data),
+            length=len(data),
+        )
+        self.db.add(
+            PromptResponse(
+                cache_key=cache_key,
+                provider_class=provider_class,
+                config=config,
+                bucket=self.bucket,
+                key=key,
+                response_hash=digest,
+            )
+        )
+        self.db.flush()
@@ -6,10 +6,16 @@ import mc_bench.schema.postgres as schema
 
 from .._base import Base
 
+# Clients by provider class, shared by all prompts of a process
+_clients = {}
+
 
 class Provider(Base):
     __table__ = schema.specification.provider
 
+    # Whether the client of the provider class can submit prompts as batch jobs
+    BATCH_API = False
+
     model: Mapped["Model"] = relationship(  # noqa: F821
         "Model", lazy="joined", back_populates="providers"
     )
@@ -29,10 +35,53 @@ class Provider(Base):
         "polymorphic_on": "provider_class",
     }
 
-    def execute_prompt(self, prompt):
-        client = self.get_client()
+    def execute_prompt(
+        self, prompt, stream=False, on_progress=None, progress_interval=5
+    ):
+        """Send `prompt` to the provider and return the response text.
+
+        With `stream`, the response is streamed on the prompt runner of the process,
+        if the client supports it, and `on_progress` is called with the number of
+        characters received so far every `progress_interval` seconds while new text
+        arrives. It runs on the calling thread, never on the loop of the runner.
+        """
+        client = self.get_shared_client()
+        kwargs = self.prompt_kwargs(prompt)
+
+        if stream and hasattr(client, "stream_prompt"):
+            from mc_bench.clients.streaming import get_prompt_runner
+
+            received = 0
+            reported = 0
+
+            def on_text(text):
+                nonlocal received
+                received += len(text)
+
+            def on_wait():
+                nonlocal reported
+                if on_progress is not None and received != reported:
+                    reported = received
+                    on_progress(reported)
+
+            return get_prompt_runner().run(
+                client.stream_prompt(on_text=on_text, **kwargs),
+                on_wait=on_wait,
+                wait_interval=progress_interval,
+            )
+
+        return client.send_prompt(**kwargs)
+
+    def prompt_kwargs(self, prompt):
+        """The `send_prompt` kwargs of the client for `prompt`."""
         kwargs = (
             json.loads(self.config) if isinstance(self.config, str) else self.config
         ).copy()
         kwargs["prompt"] = prompt
-        return client.send_prompt(**kwargs)
+        return kwargs
+
+    def get_shared_client(self):
+        """Client of this provider class, reused so its connections stay open."""
+        if self.provider_class not in _clients:
+            _clients[self.provider_class] = self.get_client()
+        return _clients[self.provider_class]
@@ -4,6 +4,8 @@ from ._base import Provider
 class OpenAIProvider(Provider):
     __mapper_args__ = {"polymorphic_identity": "OPENAI_SDK"}
 
+    BATCH_API = True
+
     def get_client(self):
         from mc_bench.clients.openai import OpenAIClient
 
@@ -4,7 +4,7 @@ import datetime
 import os
 from typing import Dict, List, Optional
 
-from sqlalchemy import func, select
+from sqlalchemy import func, select, text
 from sqlalchemy.orm import Mapped, declared_attr, object_session, relationship
 
 import mc_bench.schema.postgres as schema
@@ -54,6 +54,19 @@ def run_stage_state_id_for(db, stage_state: RUN_STAGE_STATE):
     return _run_stage_state_cache[stage_state]
 
 
+def _ids_by_new_state(events, id_field):
+    """Group the ids changed by `events` by their final state, for one UPDATE each."""
+    final_states = {}
+    for event in events:
+        # Later events win, as they would have when applied one by one
+        final_states[getattr(event, id_field)] = event.new_state
+
+    ret = {}
+    for entity_id, new_state in final_states.items():
+        ret.setdefault(new_state, []).append(entity_id)
+    return ret
+
+
 def stage_id_for(db, stage: STAGE):
     if stage not in _stage_cache:
         _stage_cache[stage] = db.scalar(
@@ -118,6 +131,17 @@ class Run(Base):
     def sorted_stages(self, sort_order):
         return sorted(self.stages, key=lambda x: sort_order.index(x.stage.slug))
 
+    def stages_to_dict(self, stages=None, redis=None):
+        """Serialize `stages`, all of the run by default, reading their progress at once."""
+        stages = list(self.stages if stages is None else stages)
+        progress = (
+            RunStage.get_many_stage_progress(redis, stages) if redis is not None else {}
+        )
+        return [
+            stage.to_dict(redis=redis, stage_progress=progress.get(stage.id))
+            for stage in stages
+        ]
+
     def completed_stages(self):
         return [
             stage
@@ -195,7 +219,7 @@ class Run(Base):
             ret["artifacts"] = [artifact.to_dict() for artifact in self.artifacts]
 
         if include_stages:
-            ret["stages"] = [stage.to_dict(redis=redis) for stage in self.stages]
+            ret["stages"] = self.stages_to_dict(redis=redis)
 
         return ret
 
@@ -203,69 +227,85 @@ class Run(Base):
         pending_stage_state = run_stage_state_id_for(db, RUN_STAGE_STATE.PENDING)
 
         return [
-            PromptExecution(
-                run_id=self.id,
-                stage_id=stage_id_for(db, STAGE.PROMPT_EXECUTION),
-                state_id=pending_stage_state,
-            ),
-            ResponseParsing(
-                run_id=self.id,
-                stage_id=stage_id_for(db, STAGE.RESPONSE_PARSING),
-                state_id=pending_stage_state,
-            ),
-            CodeValidation(
+            stage_class(
                 run_id=self.id,
-                stage_id=stage_id_for(db, STAGE.CODE_VALIDATION),
+                stage_id=stage_id_for(db, STAGE(stage_class.SLUG)),
                 state_id=pending_stage_state,
-            ),
-            Building(
-                run_id=self.id,
-                stage_id=stage_id_for(db, STAGE.BUILDING),
-                state_id=pending_stage_state,
-            ),
-            RenderingSample(
-                run_id=self.id,
-                stage_id=stage_id_for(db, STAGE.RENDERING_SAMPLE),
-                state_id=pending_stage_state,
-            ),
-            # TODO: Add exporting content back in once implemented in blender
-            # ExportingContent(
-            #     run_id=self.id,
-            #     stage_id=stage_id_for(db, STAGE.EXPORTING_CONTENT),
-            #     state_id=pending_stage_state,
-            # ),
-            PostProcessing(
-                run_id=self.id,
-                stage_id=stage_id_for(db, STAGE.POST_PROCESSING),
-                state_id=pending_stage_state,
-            ),
-            PreparingSample(
-                run_id=self.id,
-                stage_id=stage_id_for(db, STAGE.PREPARING_SAMPLE),
-                state_id=pending_stage_state,
-            ),
+            )
+            for stage_class in _run_stage_classes()
         ]
 
+    @staticmethod
+    def create_many(
+        db,
+        generation_id,
+        created_by,
+        template_ids,
+        prompt_ids,
+        model_ids,
+        num_samples=1,
+        state=RUN_STATE.IN_PROGRESS,
+    ) -> List[int]:
+        """Create `num_samples` runs of every template, prompt and model at once.
+
+        The runs and all their stages, which are left PENDING for the scheduler,
+        are inserted by a single statement, whatever the number of runs.
+
+        Returns:
+            The ids of the new runs
+        """
+        return db.scalars(
+            text("""\
+        WITH new_run AS (
+            INSERT INTO specification.run
+                (generation_id, created_by, template_id, prompt_id, model_id, state_id)
+            SELECT
+                :generation_id, :created_by, template.id, prompt.id, model.id, :state_id
+            FROM unnest(CAST(:template_ids AS integer[]))
+                WITH ORDINALITY AS template (id, n)
+            CROSS JOIN unnest(CAST(:prompt_ids AS integer[]))
+                WITH ORDINALITY AS prompt (id, n)
+            CROSS JOIN unnest(CAST(:model_ids AS integer[]))
+                WITH ORDINALITY AS model (id, n)
+            CROSS JOIN generate_series(1, :num_samples) AS sample (n)
+            ORDER BY template.n, prompt.n, model.n, sample.n
+            RETURNING id
+        ), new_run_stage AS (
+            INSERT INTO specification.run_stage (run_id, stage_id, stage_slug, state_id)
+            SELECT new_run.id, stage.id, stage.slug, :stage_state_id
+            FROM new_run
+            CROSS JOIN specification.stage
+            WHERE stage.slug = ANY(:stage_slugs)
+        )
+        SELECT id FROM new_run ORDER BY id
+        """).bindparams(
+                generation_id=generation_id,
+                created_by=created_by,
+                template_ids=list(template_ids),
+                prompt_ids=list(prompt_ids),
+                model_ids=list(model_ids),
+                num_samples=num_samples,
+                state_id=run_state_id_for(db, state),
+                stage_state_id=run_stage_state_id_for(db, RUN_STAGE_STATE.PENDING),
+                stage_slugs=[stage_class.SLUG for stage_class in _run_stage_classes()],
+            )
+        ).all()
+
     def get_stage(self, name):
         for stage in self.stages:
             if stage.stage.slug == name:
                 return name
 
     @classmethod
-    def state_change_handler(cls, event: RunStateChanged):
-        from sqlalchemy import func
-
-        import mc_bench.util.postgres as postgres
-
+    def state_change_handler(cls, events: List[RunStateChanged], db):
         table = cls.__table__
 
-        with postgres.managed_session() as db:
-            run_state_id = run_state_id_for(db, event.new_state)
+        for new_state, run_ids in _ids_by_new_state(events, "run_id").items():
             db.execute(
                 table.update()
-                .where(table.c.id == event.run_id)
+                .where(table.c.id.in_(run_ids))
                 .values(
-                    state_id=run_state_id,
+                    state_id=run_state_id_for(db, new_state),
                     # Use database time for last_modified
                     last_modified=func.now(),
                 )
@@ -388,6 +428,15 @@ class Sample(Base):
         if summaries:
             return summaries[0]
 
+    def get_world_snapshot_artifact(self):
+        snapshots = [
+            artifact
+            for artifact in self.artifacts
+            if artifact.kind.name == KINDS.BUILD_WORLD_SNAPSHOT
+        ]
+        if snapshots:
+            return snapshots[0]
+
     def get_schematic_artifact(self):
         schematics = [
             artifact
@@ -415,11 +464,11 @@ class Sample(Base):
         if comparisons:
             return comparisons[0]
 
-    def build_artifact_spec(self, db, structure_name):
+    def build_artifact_spec(self, db, structure_name, world_snapshot_path=None):
         run_external_id = self.run.external_id
         sample_external_id = self.external_id
 
-        return {
+        spec = {
             "build_script": {
                 "object_parts": {
                     "run_id": run_external_id,
@@ -501,6 +550,29 @@ class Sample(Base):
             },
         }
 
+        if world_snapshot_path is not None:
+            spec["world_snapshot"] = {
+                "container_path": world_snapshot_path,
+                "object_parts": {
+                    "run_id": run_external_id,
+                    "sample_id": sample_external_id,
+                    "name": f'{self.run.external_id}_{self.external_id}_{datetime.datetime.now().isoformat().replace(":", "_")}',
+                },
+                "artifact_kind": db.scalar(
+                    select(ArtifactKind).where(
+                        ArtifactKind.name == KINDS.BUILD_WORLD_SNAPSHOT
+                    )
+                ),
+                "object_prototype": runs.get(
+                    KINDS.RUN,
+                    KINDS.SAMPLE,
+                    KINDS.ARTIFACTS,
+                    KINDS.BUILD_WORLD_SNAPSHOT,
+                ),
+            }
+
+        return spec
+
     def export_artifact_spec(self, db, structure_name):
         run_external_id = self.run.external_id
         sample_external_id = self.external_id
@@ -703,6 +775,23 @@ class Generation(Base):
         session = object_session(self)
         return session.scalar(self._run_count_expression)
 
+    @staticmethod
+    def run_state_counts(db, generation_id) -> Dict[int, int]:
+        """Number of runs of the generation by run state id.
+
+        Read from the counts that triggers keep as runs change, rather than from
+        the runs.
+        """
+        table = schema.specification.generation_run_state_count
+        return {
+            state_id: count
+            for state_id, count in db.execute(
+                select(table.c.state_id, table.c.count).where(
+                    table.c.generation_id == generation_id, table.c.count > 0
+                )
+            )
+        }
+
     def to_dict(self, include_runs=False, include_stats=False):
         result = {
             "id": self.external_id,
@@ -723,26 +812,28 @@ class Generation(Base):
             ]
 
         if include_stats:
-            # TODO: Implement this logic once run state changes are active
-            result["pending_runs"] = 0
-            result["completed_runs"] = 0
-            result["failed_runs"] = 0
+            session = object_session(self)
+            counts = self.run_state_counts(session, self.id)
+            completed = counts.pop(run_state_id_for(session, RUN_STATE.COMPLETED), 0)
+            failed = counts.pop(run_state_id_for(session, RUN_STATE.FAILED), 0)
+            result["pending_runs"] = sum(counts.values())
+            result["completed_runs"] = completed
+            result["failed_runs"] = failed
 
         return result
 
     @classmethod
-    def state_change_handler(cls, event: GenerationStateChanged):
-        import mc_bench.util.postgres as postgres
-
+    def state_change_handler(cls, events: List[GenerationStateChanged], db):
         table = cls.__table__
 
-        with postgres.managed_session() as db:
-            generation_state_id = generation_state_id_for(db, event.new_state)
+        for new_state, generation_ids in _ids_by_new_state(
+            events, "generation_id"
+        ).items():
             db.execute(
                 table.update()
-                .where(table.c.id == event.generation_id)
+                .where(table.c.id.in_(generation_ids))
                 .values(
-                    state_id=generation_state_id,
+                    state_id=generation_state_id_for(db, new_state),
                     # No last_modified column in generation table
                 )
             )
@@ -779,7 +870,7 @@ class RunStage(Base):
         # For subclasses
         return {"polymorphic_identity": cls.SLUG}
 
-    def to_dict(self, db=None, redis=None):
+    def to_dict(self, db=None, redis=None, stage_progress=None):
         db = object_session(self)
         state = self.state
         progress_note = None
@@ -787,7 +878,9 @@ class RunStage(Base):
             run_stage_state_id_for(db, RUN_STAGE_STATE.IN_PROGRESS),
             run_stage_state_id_for(db, RUN_STAGE_STATE.IN_RETRY),
         ):
-            progress, progress_note = self.get_stage_progress(redis)
+            if stage_progress is None:
+                stage_progress = self.get_stage_progress(redis)
+            progress, progress_note = stage_progress
         elif state.id == run_stage_state_id_for(db, RUN_STAGE_STATE.COMPLETED):
             progress = 1.0
         else:
@@ -803,20 +896,38 @@ class RunStage(Base):
             "heartbeat": self.heartbeat,
         }
 
-    def get_stage_progress(self, redis) -> float:
-        progress = redis.get(f"stage:{self.id}:progress")
-        progress_note = redis.get(f"stage:{self.id}:progress_note")
-        return (float(progress) if progress else 0.0), progress_note
+    def get_stage_progress(self, redis):
+        return self.get_many_stage_progress(redis, [self])[self.id]
+
+    @classmethod
+    def get_many_stage_progress(cls, redis, stages):
+        """Progress and note of each of `stages` by id, read in one round trip."""
+        pipeline = redis.pipeline(transaction=False)
+        for stage in stages:
+            pipeline.hmget(cls.progress_key(stage.id), "progress", "note")
+
+        ret = {}
+        for stage, (progress, note) in zip(stages, pipeline.execute()):
+            ret[stage.id] = (
+                float(progress) if progress else 0.0,
+                note.decode("utf-8") if note else None,
+            )
+        return ret
 
     def set_progress(self, redis, progress, note=None):
-        redis.set(f"stage:{self.id}:progress", str(progress))
-        if note:
-            redis.set(f"stage:{self.id}:progress_note", note)
-        else:
-            try:
-                redis.delete(f"stage:{self.id}:progress_note")
-            except Exception:
-                pass
+        self.write_progress(redis, self.id, progress, note)
+
+    @classmethod
+    def write_progress(cls, redis, stage_id, progress, note=None):
+        # A single HSET, so progress and note are never read from different updates
+        redis.hset(
+            cls.progress_key(stage_id),
+            mapping={"progress": str(progress), "note": note or ""},
+        )
+
+    @staticmethod
+    def progress_key(stage_id):
+        return f"stage_progress:{stage_id}"
 
     def update_heartbeat(self, db=None):
         """
@@ -852,6 +963,21 @@ class RunStage(Base):
             select(self.__table__.c.heartbeat).where(self.__table__.c.id == self.id)
         )
 
+    @classmethod
+    def update_heartbeats(cls, db, stage_ids, state_id):
+        """Beat the heartbeats of the stages in `stage_ids` that are in `state_id`.
+
+        A single UPDATE on the database server clock. Returns the number of stages
+        updated.
+        """
+        result = db.execute(
+            cls.__table__.update()
+            .where(cls.__table__.c.id.in_(stage_ids))
+            .where(cls.__table__.c.state_id == state_id)
+            .values(heartbeat=func.now())
+        )
+        return result.rowcount
+
     def register_task_id(self, task_id, db=None):
         """
         Register a Celery task ID with this stage.
@@ -883,21 +1009,21 @@ class RunStage(Base):
     def get_task_signature(self, app, progress_token, pass_args=True):
         pass
 
-    @classmethod
-    def state_change_handler(cls, event: RunStageStateChanged):
-        from sqlalchemy import func
-
-        import mc_bench.util.postgres as postgres
+    def get_fused_task_signature(self, app, progress_token, task_name):
+        """Signature of the fused task `task_name`, which starts with this stage."""
+        signature = self.get_task_signature(app, progress_token, pass_args=True)
+        return app.signature(task_name, args=signature.args, **signature.options)
 
+    @classmethod
+    def state_change_handler(cls, events: List[RunStageStateChanged], db):
         table = cls.__table__
 
-        with postgres.managed_session() as db:
-            run_stage_state_id = run_stage_state_id_for(db, event.new_state)
+        for new_state, stage_ids in _ids_by_new_state(events, "stage_id").items():
             db.execute(
                 table.update()
-                .where(table.c.id == event.stage_id)
+                .where(table.c.id.in_(stage_ids))
                 .values(
-                    state_id=run_stage_state_id,
+                    state_id=run_stage_state_id_for(db, new_state),
                     # Use database time for consistency
                     last_modified=func.now(),
                 )
@@ -926,6 +1052,21 @@ class PromptExecution(RunStage):
 
         return app.signature("run.execute_prompt", **kwargs)
 
+    @staticmethod
+    def get_batch_task_signature(app, progress_token, stages):
+        """Signature of one task that executes the prompts of `stages` as a batch."""
+        return app.signature(
+            "run.execute_prompt_batch",
+            args=[{"stage_ids": [stage.id for stage in stages]}],
+            queue="prompt",
+            headers={
+                "token": progress_token,
+                "enqueued_timestamp": datetime.datetime.now(
+                    tz=datetime.timezone.utc
+                ).isoformat(),
+            },
+        )
+
 
 class ResponseParsing(RunStage):
     SLUG = "RESPONSE_PARSING"
@@ -1095,6 +1236,21 @@ class RenderingSample(RunStage):
         return app.signature("run.render_sample", **kwargs)
 
 
+def _run_stage_classes():
+    """The stages every run goes through, in order."""
+    return [
+        PromptExecution,
+        ResponseParsing,
+        CodeValidation,
+        Building,
+        RenderingSample,
+        # TODO: Add exporting content back in once implemented in blender
+        # ExportingContent,
+        PostProcessing,
+        PreparingSample,
+    ]
+
+
 __all__ = [
     "Artifact",
     "ArtifactKind",
@@ -0,0 +1,24 @@
+from mc_bench.util.object_store import Prototype
+
+
+class KINDS:
+    PROMPT_CACHE = "PROMPT_CACHE"
+
+    # leaf nodes
+    PROMPT_RESPONSE = "PROMPT_RESPONSE"
+
+
+prompt_cache = Prototype(
+    children=[
+        Prototype(
+            kind=KINDS.PROMPT_CACHE,
+            pattern="prompt_cache/{cache_key}",
+            children=[
+                Prototype(
+                    kind=KINDS.PROMPT_RESPONSE,
+                    pattern="{response_id}-response.txt",
+                ),
+            ],
+        ),
+    ]
+)
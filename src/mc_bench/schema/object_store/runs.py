@@ -16,6 +16,7 @@ class KINDS:
     BUILD_SCHEMATIC = "BUILD_SCHEMATIC"
     BUILD_COMMAND_LIST = "BUILD_COMMAND_LIST"
     BUILD_SUMMARY = "BUILD_SUMMARY"
+    BUILD_WORLD_SNAPSHOT = "BUILD_WORLD_SNAPSHOT"
     COMMAND_LIST_BUILD_SCRIPT_JS = "COMMAND_LIST_BUILD_SCRIPT_JS"
     COMMAND_LIST_BUILD_SCRIPT_PY = "COMMAND_LIST_BUILD_SCRIPT_PY"
     CONTENT_EXPORT_BUILD_SCRIPT_JS = "CONTENT_EXPORT_BUILD_SCRIPT_JS"
@@ -67,6 +68,10 @@ runs = Prototype(
                                     kind=KINDS.BUILD_SUMMARY,
                                     pattern="{name}-summary.json",
                                 ),
+                                Prototype(
+                                    kind=KINDS.BUILD_WORLD_SNAPSHOT,
+                                    pattern="{name}-world.tar",
+                                ),
                                 Prototype(
                                     kind=KINDS.COMMAND_LIST_BUILD_SCRIPT_PY,
                                     pattern="{name}-command-list-script.py",
@@ -1,7 +1,10 @@
 from ._generation import generation
+from ._generation_run_state_count import generation_run_state_count
 from ._generation_state import generation_state
 from ._model import model
 from ._prompt import prompt
+from ._prompt_batch import prompt_batch, prompt_batch_stage
+from ._prompt_response_cache import prompt_response_cache
 from ._prompt_tag import prompt_tag
 from ._provider import provider
 from ._provider_class import provider_class
@@ -19,8 +22,12 @@ __all__ = [
     "run_state",
     "prompt",
     "prompt_tag",
+    "prompt_response_cache",
+    "prompt_batch",
+    "prompt_batch_stage",
     "generation",
     "generation_state",
+    "generation_run_state_count",
     "model",
     "provider",
     "provider_class",
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, ForeignKey, Integer, Table
+
+from .._metadata import metadata
+
+# Maintained by triggers on specification.run, in the statements that insert,
+# update or delete runs
+generation_run_state_count = Table(
+    "generation_run_state_count",
+    metadata,
+    Column(
+        "generation_id",
+        Integer,
+        ForeignKey("specification.generation.id"),
+        primary_key=True,
+    ),
+    Column(
+        "state_id",
+        Integer,
+        ForeignKey("specification.run_state.id"),
+        primary_key=True,
+    ),
+    Column("count", Integer, nullable=False, server_default="0"),
+    schema="specification",
+)
@@ -0,0 +1,62 @@
+from sqlalchemy import (
+    TIMESTAMP,
+    BigInteger,
+    Column,
+    ForeignKey,
+    Index,
+    String,
+    Table,
+    func,
+)
+
+from .._metadata import metadata
+
+prompt_batch = Table(
+    "prompt_batch",
+    metadata,
+    Column("id", BigInteger, primary_key=True, autoincrement=True),
+    Column(
+        "created", TIMESTAMP(timezone=False), server_default=func.now(), nullable=False
+    ),
+    Column(
+        "provider_id",
+        BigInteger,
+        ForeignKey("specification.provider.id", ondelete="CASCADE"),
+        nullable=False,
+    ),
+    Column(
+        "batch_id",
+        String,
+        nullable=False,
+        comment="Id of the batch job at the provider",
+    ),
+    Column(
+        "ended",
+        TIMESTAMP(timezone=False),
+        nullable=True,
+        comment="When the results were handled or the job was given up on",
+    ),
+    schema="specification",
+)
+
+# The stages whose prompts a batch job executes. Every row of a stage is one
+# attempt at its prompt.
+prompt_batch_stage = Table(
+    "prompt_batch_stage",
+    metadata,
+    Column(
+        "prompt_batch_id",
+        BigInteger,
+        ForeignKey("specification.prompt_batch.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    Column(
+        "run_stage_id",
+        BigInteger,
+        ForeignKey("specification.run_stage.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    schema="specification",
+)
+
+Index("idx_prompt_batch_stage_run_stage_id", prompt_batch_stage.c.run_stage_id)
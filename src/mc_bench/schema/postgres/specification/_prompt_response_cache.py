@@ -0,0 +1,55 @@
+from sqlalchemy import (
+    JSON,
+    TIMESTAMP,
+    BigInteger,
+    Column,
+    Index,
+    Integer,
+    String,
+    Table,
+    UniqueConstraint,
+    func,
+)
+
+from .._metadata import metadata
+
+prompt_response_cache = Table(
+    "prompt_response_cache",
+    metadata,
+    Column("id", BigInteger, primary_key=True, autoincrement=True),
+    Column(
+        "created", TIMESTAMP(timezone=False), server_default=func.now(), nullable=False
+    ),
+    Column(
+        "cache_key",
+        String,
+        nullable=False,
+        comment="sha256 of the provider class, provider config and rendered prompt",
+    ),
+    Column("provider_class", String, nullable=False),
+    Column("config", JSON, nullable=False),
+    Column("bucket", String, nullable=False),
+    Column("key", String, nullable=False, comment="Object key of the cached response"),
+    Column(
+        "response_hash",
+        String,
+        nullable=False,
+        comment="sha256 of the response text",
+    ),
+    Column(
+        "uses",
+        Integer,
+        nullable=False,
+        server_default="0",
+        comment="Number of times the response was served from the cache",
+    ),
+    Column("last_used", TIMESTAMP(timezone=False), nullable=True),
+    UniqueConstraint(
+        "cache_key",
+        "response_hash",
+        name="uq_prompt_response_cache_cache_key_response_hash",
+    ),
+    schema="specification",
+)
+
+Index("idx_prompt_response_cache_cache_key", prompt_response_cache.c.cache_key)
@@ -98,6 +98,31 @@ class AuthManager:
 
         return session_id, identification_token_id
 
+    def process_identification_header(
+        self, request: Request, response: Response
+    ) -> uuid.UUID:
+        """
+        Read the identification token from the request without touching the database.
+
+        Used where the token is resolved later (e.g. write-behind vote ingestion).
+        A missing or malformed header is replaced with a freshly generated token,
+        which is set in the response just like `process_session_headers` does.
+
+        Returns:
+            The identification token UUID
+        """
+        identification_id_str = request.headers.get(IDENTIFICATION_HEADER)
+        try:
+            if identification_id_str:
+                identification_token = uuid.UUID(identification_id_str)
+            else:
+                identification_token = uuid.uuid4()
+        except ValueError:
+            identification_token = uuid.uuid4()
+
+        response.headers[IDENTIFICATION_HEADER] = str(identification_token)
+        return identification_token
+
     def create_access_token(
         self, data: dict, expires_delta: Optional[timedelta] = None
     ):
@@ -0,0 +1,49 @@
+"""
+Capacity reports that server worker hosts publish for the scheduler.
+
+Each Docker host running server workers records how many build slots it has and
+how many are in use, in the MINECRAFT_SERVER_REGISTRY Redis database, along with
+the most slots one of its tasks holds. The scheduler sums the tasks that fit in
+the free slots of the hosts that reported recently to decide how many server tasks
+to enqueue.
+"""
+
+import json
+import time
+from typing import Dict
+
+from redis import StrictRedis
+
+CAPACITY_KEY = "server_slots:capacity"
+
+
+def report_capacity(
+    redis: StrictRedis, host_id: str, capacity: int, used: int, slots_per_task: int = 1
+):
+    report = {
+        "capacity": capacity,
+        "used": used,
+        "slots_per_task": slots_per_task,
+        "reported_at": int(time.time()),
+    }
+    redis.hset(CAPACITY_KEY, host_id, json.dumps(report))
+    return report
+
+
+def free_slots(redis: StrictRedis, max_age_seconds: int = 120) -> Dict[str, int]:
+    """Tasks that fit in the free slots by Docker host, from the reports of the last
+    `max_age_seconds`.
+
+    Every task is counted as the most slots a task of its host holds, e.g. an export
+    rendering its views beside the timelapse, so hosts are never handed more than
+    they can run.
+    """
+    now = int(time.time())
+    free = {}
+    for host_id, report in redis.hgetall(CAPACITY_KEY).items():
+        report = json.loads(report)
+        if now - report["reported_at"] > max_age_seconds:
+            continue
+        free_slots = max(report["capacity"] - report["used"], 0)
+        free[host_id.decode("utf-8")] = free_slots // report.get("slots_per_task", 1)
+    return free
@@ -0,0 +1,272 @@
+"""
+Precomputed pool of comparison pairs for MC-Bench voting.
+
+Choosing a random pair per request is expensive on a large sample corpus, so a
+background task keeps a Redis set per test set topped up with ready-to-serve
+pairs (sample ids, artifact keys and build specification). The API pops pairs
+off the pool with SPOP and only falls back to the live query when the pool is
+empty.
+"""
+
+import json
+import textwrap
+from typing import Any, Dict, List
+
+import sqlalchemy
+from redis import StrictRedis
+from sqlalchemy.orm import Session
+
+POOL_KEY_PREFIX = "comparison_pool"
+REFILL_LOCK_KEY_PREFIX = "comparison_pool_refill_in_progress"
+
+
+def pool_key(test_set_id: int) -> str:
+    return f"{POOL_KEY_PREFIX}:{test_set_id}"
+
+
+def refill_lock_key(test_set_id: int) -> str:
+    return f"{REFILL_LOCK_KEY_PREFIX}:{test_set_id}"
+
+
+def pair_from_row(row) -> Dict[str, Any]:
+    """Convert a row of the comparison pair query into a pool entry."""
+    (
+        sample_1,
+        sample_1_key,
+        sample_2,
+        sample_2_key,
+        build_specification,
+        sample_1_model,
+        sample_2_model,
+    ) = row
+    return {
+        "sample_1": str(sample_1),
+        "sample_1_key": sample_1_key,
+        "sample_1_model": sample_1_model,
+        "sample_2": str(sample_2),
+        "sample_2_key": sample_2_key,
+        "sample_2_model": sample_2_model,
+        "build_specification": build_specification,
+    }
+
+
+def pop_pairs(redis: StrictRedis, test_set_id: int, count: int) -> List[Dict[str, Any]]:
+    """Pop up to `count` random pairs from the pool of a test set."""
+    if count <= 0:
+        return []
+
+    members = redis.spop(pool_key(test_set_id), count) or []
+    return [json.loads(member) for member in members]
+
+
+def push_pairs(
+    redis: StrictRedis,
+    test_set_id: int,
+    pairs: List[Dict[str, Any]],
+    ttl_seconds: int,
+) -> int:
+    """Add pairs to the pool of a test set and refresh its expiry.
+
+    The whole pool expires if it is not refilled within `ttl_seconds`, which
+    keeps pairs for samples that have since been unapproved from living forever.
+    """
+    if not pairs:
+        return 0
+
+    key = pool_key(test_set_id)
+    pipeline = redis.pipeline()
+    pipeline.sadd(key, *[json.dumps(pair, sort_keys=True) for pair in pairs])
+    pipeline.expire(key, ttl_seconds)
+    added, _ = pipeline.execute()
+    return added
+
+
+def pool_size(redis: StrictRedis, test_set_id: int) -> int:
+    return redis.scard(pool_key(test_set_id))
+
+
+def acquire_refill_lock(
+    redis: StrictRedis, test_set_id: int, ttl_seconds: int = 300
+) -> bool:
+    """Return True if the caller should enqueue a refill for this test set."""
+    return bool(redis.set(refill_lock_key(test_set_id), "1", ex=ttl_seconds, nx=True))
+
+
+def should_refill(redis: StrictRedis, test_set_id: int, low_watermark: int) -> bool:
+    """Return True if the pool of a test set is below `low_watermark` and the
+    caller got the refill lock, so exactly one caller enqueues the refill."""
+    return pool_size(redis, test_set_id) < low_watermark and acquire_refill_lock(
+        redis, test_set_id
+    )
+
+
+def release_refill_lock(redis: StrictRedis, test_set_id: int) -> None:
+    redis.delete(refill_lock_key(test_set_id))
+
+
+def query_pairs(
+    db: Session, test_set_id: int, sample_count: int
+) -> List[Dict[str, Any]]:
+    """Run the comparison pair query directly, without a prepared statement."""
+    rows = db.execute(
+        sqlalchemy.text(COMPARISON_PAIR_QUERY).bindparams(
+            test_set_id=test_set_id,
+            sample_count=sample_count,
+        )
+    ).fetchall()
+    return [pair_from_row(row) for row in rows]
+
+
+# The placeholders are filled with `$1`/`$2` for the API's prepared statement and
+# with named bind parameters for the pool refill task.
+COMPARISON_PAIR_QUERY_TEMPLATE = textwrap.dedent("""\
+    WITH approval_state AS (
+        SELECT
+            id approved_state_id
+        FROM
+            scoring.sample_approval_state
+        WHERE
+            name = 'APPROVED'
+    ),
+    correlation_ids AS (
+        SELECT
+            comparison_correlation_id id
+        FROM
+            sample.sample
+            join specification.run
+                on sample.run_id = run.id
+            join specification.model
+                on run.model_id = model.id
+            join research.experimental_state
+                on model.experimental_state_id = experimental_state.id
+            cross join approval_state
+        WHERE
+            sample.approval_state_id = approval_state.approved_state_id
+            AND sample.test_set_id = {test_set_id}
+            AND (experimental_state.name IS NULL OR experimental_state.name != 'DEPRECATED')
+        GROUP BY
+            comparison_correlation_id,
+            model.name
+        HAVING
+            COUNT(*) >= 2
+        ORDER BY
+            random()
+        LIMIT {sample_count}
+    ),
+    sample_ids AS (
+        SELECT
+            sample.id sample_id,
+            sample.comparison_correlation_id,
+            sample.comparison_sample_id,
+            sample.run_id,
+            model.id model_id
+        FROM
+            sample.sample
+            join specification.run
+                on sample.run_id = run.id
+            join specification.model
+                on run.model_id = model.id
+            join research.experimental_state
+                on model.experimental_state_id = experimental_state.id
+            cross join approval_state
+        WHERE
+            sample.approval_state_id = approval_state.approved_state_id
+            AND sample.test_set_id = {test_set_id}
+            AND (experimental_state.name IS NULL OR experimental_state.name != 'DEPRECATED')
+    ), 
+    samples as (
+        SELECT
+            sample_1.sample_id sample_1_id,
+            sample_1.comparison_sample_id sample_1,
+            sample_2.sample_id sample_2_id,
+            sample_2.comparison_sample_id sample_2,
+            sample_1.run_id run_id,
+            sample_1.model_id sample_1_model_id,
+            sample_2.model_id sample_2_model_id
+        FROM
+            correlation_ids
+            JOIN LATERAL (
+                SELECT
+                    sample_ids.sample_id,
+                    sample_ids.comparison_sample_id,
+                    sample_ids.comparison_correlation_id,
+                    sample_ids.run_id,
+                    sample_ids.model_id
+                FROM 
+                    sample_ids
+                WHERE
+                    sample_ids.comparison_correlation_id = correlation_ids.id
+                ORDER BY 
+                    random()
+                LIMIT 1
+            ) sample_1 ON sample_1.comparison_correlation_id = correlation_ids.id
+            JOIN LATERAL (
+                SELECT 
+                    sample_ids.sample_id,
+                    sample_ids.comparison_sample_id,
+                    sample_ids.comparison_correlation_id,
+                    sample_ids.run_id,
+                    sample_ids.model_id
+                FROM 
+                    sample_ids
+                WHERE
+                    sample_ids.comparison_correlation_id = correlation_ids.id
+                    AND sample_ids.comparison_sample_id != sample_1.comparison_sample_id  -- Ensure we don't select the same sample twice
+                    AND sample_ids.model_id != sample_1.model_id
+                ORDER BY 
+                    random()
+                LIMIT 1
+            ) sample_2 ON sample_2.comparison_correlation_id = correlation_ids.id
+    )
+    SELECT
+        samples.sample_1,
+        sample_1_data.key as sample_1_key,
+        samples.sample_2,
+        sample_2_data.key as sample_2_key,
+        prompt.build_specification,
+        sample_1_model.name as sample_1_model,
+        sample_2_model.name as sample_2_model
+    FROM
+        samples
+        JOIN specification.run
+            ON samples.run_id = run.id
+        JOIN specification.prompt
+            ON run.prompt_id = prompt.id
+        JOIN specification.model sample_1_model
+            ON samples.sample_1_model_id = sample_1_model.id
+        JOIN specification.model sample_2_model
+            ON samples.sample_2_model_id = sample_2_model.id
+        JOIN LATERAL (
+            SELECT
+                artifact.sample_id,
+                artifact.key
+            FROM
+                sample.artifact
+                join sample.artifact_kind
+                    ON artifact.artifact_kind_id = artifact_kind.id
+            WHERE
+                artifact.sample_id = samples.sample_1_id
+                AND artifact_kind.name = 'RENDERED_MODEL_GLB_COMPARISON_SAMPLE'
+            LIMIT 1
+        ) sample_1_data
+            ON samples.sample_1_id = sample_1_data.sample_id
+        JOIN LATERAL (
+            SELECT
+                artifact.sample_id,
+                artifact.key
+            FROM
+                sample.artifact
+                join sample.artifact_kind
+                    ON artifact.artifact_kind_id = artifact_kind.id
+            WHERE
+                artifact.sample_id = samples.sample_2_id
+                AND artifact_kind.name = 'RENDERED_MODEL_GLB_COMPARISON_SAMPLE'
+            LIMIT 1
+        ) sample_2_data
+            ON samples.sample_2_id = sample_2_data.sample_id
+""")
+
+COMPARISON_PAIR_QUERY = COMPARISON_PAIR_QUERY_TEMPLATE.format(
+    test_set_id=":test_set_id",
+    sample_count=":sample_count",
+)
@@ -0,0 +1,246 @@
+"""
+Comparison token payloads and the write-behind vote stream.
+
+When a comparison batch is handed out, everything needed to record a vote on it
+(metric, samples and the model names revealed after voting) is stored in Redis
+under the comparison token. Votes are validated against that payload and
+appended to a Redis Stream, which a worker drains in batches into Postgres.
+"""
+
+import datetime
+import json
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from redis import StrictRedis
+from redis.exceptions import ResponseError
+
+ACTIVE_COMPARISON_KEY_PREFIX = "active_comparison"
+ACTIVE_COMPARISON_TTL_SECONDS = 3600
+
+VOTE_STREAM_KEY = "comparison_votes"
+VOTE_STREAM_GROUP = "vote_ingestion"
+VOTE_STREAM_CONSUMER = "vote_ingestion"
+VOTE_DEAD_LETTER_KEY = "comparison_votes_dead_letter"
+VOTE_DEAD_LETTER_MAX_LENGTH = 100000
+INGESTION_LOCK_KEY = "vote_ingestion_in_progress"
+
+
+def active_comparison_key(token) -> str:
+    return f"{ACTIVE_COMPARISON_KEY_PREFIX}:{token}"
+
+
+def encode_token_payload(metric_id, pair: Dict[str, Any]) -> str:
+    return json.dumps(
+        {
+            "metric_id": str(metric_id),
+            "sample_1": str(pair["sample_1"]),
+            "sample_2": str(pair["sample_2"]),
+            "sample_1_model": pair.get("sample_1_model"),
+            "sample_2_model": pair.get("sample_2_model"),
+        }
+    )
+
+
+def decode_token_payload(data: bytes) -> Dict[str, Any]:
+    """Decode a comparison token payload.
+
+    Tokens handed out before payloads were JSON are stored as
+    `metric_id:sample_1:sample_2` and carry no model names.
+    """
+    data = data.decode("utf-8")
+    if data.startswith("{"):
+        return json.loads(data)
+
+    metric_id, sample_1, sample_2 = data.split(":", 2)
+    return {
+        "metric_id": metric_id,
+        "sample_1": sample_1,
+        "sample_2": sample_2,
+        "sample_1_model": None,
+        "sample_2_model": None,
+    }
+
+
+def append_vote(redis: StrictRedis, vote: Dict[str, Any]) -> None:
+    """Append a vote to the ingestion stream.
+
+    Values are JSON encoded so that nested rankings and missing values survive
+    the flat field/value structure of stream entries.
+    """
+    redis.xadd(VOTE_STREAM_KEY, {key: json.dumps(value) for key, value in vote.items()})
+
+
+def ensure_consumer_group(redis: StrictRedis) -> None:
+    try:
+        redis.xgroup_create(VOTE_STREAM_KEY, VOTE_STREAM_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def read_votes(
+    redis: StrictRedis, count: int, pending: bool = False
+) -> List[Tuple[bytes, Optional[Dict[str, Any]]]]:
+    """Read up to `count` votes for the ingestion consumer.
+
+    With `pending=True`, re-reads entries that were delivered before but never
+    acknowledged, e.g. because a previous ingestion run crashed mid batch.
+    Entries that cannot be decoded are returned with a vote of None.
+    """
+    response = redis.xreadgroup(
+        VOTE_STREAM_GROUP,
+        VOTE_STREAM_CONSUMER,
+        {VOTE_STREAM_KEY: "0" if pending else ">"},
+        count=count,
+    )
+    if not response:
+        return []
+
+    _, entries = response[0]
+    return [(entry_id, _decode_vote(fields)) for entry_id, fields in entries]
+
+
+def _decode_vote(fields) -> Optional[Dict[str, Any]]:
+    try:
+        return {key.decode("utf-8"): json.loads(value) for key, value in fields.items()}
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+
+def vote_error(vote: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Why a vote read from the stream can never be ingested, or None if it can."""
+    if vote is None:
+        return "undecodable entry"
+
+    missing = {
+        "token",
+        "metric_id",
+        "ranks",
+        "user_id",
+        "session_id",
+        "identification_token",
+        "created",
+    } - set(vote)
+    if missing:
+        return f"missing fields: {sorted(missing)}"
+
+    try:
+        for key in ["token", "metric_id", "session_id", "identification_token"]:
+            uuid.UUID(vote[key])
+        if vote["user_id"] is not None:
+            uuid.UUID(vote["user_id"])
+        datetime.datetime.fromisoformat(vote["created"])
+        for rank, sample_id in vote["ranks"]:
+            int(rank)
+            uuid.UUID(sample_id)
+    except (TypeError, ValueError) as e:
+        return f"invalid value: {e}"
+
+    if not vote["ranks"]:
+        return "no ranks"
+
+    return None
+
+
+def ack_votes(redis: StrictRedis, entry_ids: List[bytes]) -> None:
+    if not entry_ids:
+        return
+
+    pipeline = redis.pipeline()
+    pipeline.xack(VOTE_STREAM_KEY, VOTE_STREAM_GROUP, *entry_ids)
+    pipeline.xdel(VOTE_STREAM_KEY, *entry_ids)
+    pipeline.execute()
+
+
+def dead_letter_votes(redis: StrictRedis, rejected: List[Tuple[bytes, str]]) -> None:
+    """Move entries that cannot be ingested to the dead letter stream.
+
+    The entries are copied there as they are, with the reason they were rejected,
+    and acknowledged, so they no longer hold up the votes behind them.
+    """
+    if not rejected:
+        return
+
+    pipeline = redis.pipeline()
+    for entry_id, _ in rejected:
+        pipeline.xrange(VOTE_STREAM_KEY, entry_id, entry_id)
+    copies = pipeline.execute()
+
+    pipeline = redis.pipeline()
+    for (entry_id, reason), copy in zip(rejected, copies):
+        fields = dict(copy[0][1]) if copy else {}
+        fields[b"entry_id"] = entry_id
+        fields[b"error"] = reason
+        pipeline.xadd(
+            VOTE_DEAD_LETTER_KEY,
+            fields,
+            maxlen=VOTE_DEAD_LETTER_MAX_LENGTH,
+            approximate=True,
+        )
+    pipeline.execute()
+
+    ack_votes(redis, [entry_id for entry_id, _ in rejected])
+
+
+def dead_letter_redelivered_votes(
+    redis: StrictRedis, max_deliveries: int, count: int = 1000
+) -> int:
+    """Dead letter pending entries that were delivered `max_deliveries` times.
+
+    Returns the number of entries dead lettered.
+    """
+    pending = redis.xpending_range(
+        VOTE_STREAM_KEY,
+        VOTE_STREAM_GROUP,
+        min="-",
+        max="+",
+        count=count,
+        consumername=VOTE_STREAM_CONSUMER,
+    )
+    exhausted = [
+        (entry["message_id"], f"delivered {entry['times_delivered']} times")
+        for entry in pending
+        if entry["times_delivered"] >= max_deliveries
+    ]
+    dead_letter_votes(redis, exhausted)
+    return len(exhausted)
+
+
+def pending_vote_count(redis: StrictRedis) -> int:
+    return redis.xlen(VOTE_STREAM_KEY)
+
+
+def acquire_ingestion_lock(redis: StrictRedis, ttl_seconds: int = 300) -> bool:
+    """Return True if the caller should enqueue a vote ingestion task."""
+    return bool(redis.set(INGESTION_LOCK_KEY, "1", ex=ttl_seconds, nx=True))
+
+
+def release_ingestion_lock(redis: StrictRedis) -> None:
+    redis.delete(INGESTION_LOCK_KEY)
+
+
+def flatten_ranks(ordered_sample_ids) -> List[Tuple[int, str]]:
+    """Turn a best-to-worst ordering (with nested ties) into (rank, sample) pairs."""
+    ranks = []
+    for idx, sample_or_samples in enumerate(ordered_sample_ids):
+        rank = idx + 1
+
+        if isinstance(sample_or_samples, list):
+            for ranked_sample_id in sample_or_samples:
+                ranks.append((rank, str(ranked_sample_id)))
+        else:
+            ranks.append((rank, str(sample_or_samples)))
+
+    return ranks
+
+
+def model_names(payload: Dict[str, Any]) -> Optional[Dict[str, str]]:
+    """Return the model names stored in a token payload, if it has them."""
+    if payload.get("sample_1_model") is None or payload.get("sample_2_model") is None:
+        return None
+
+    return {
+        "sample_1_model": payload["sample_1_model"],
+        "sample_2_model": payload["sample_2_model"],
+    }
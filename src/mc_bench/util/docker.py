@@ -1,12 +1,17 @@
 import queue
+import re
 import threading
+import time
+from collections import Counter
+from typing import Iterable, Iterator, List, Optional
 
 import docker
 
 
 class ContainerStopped:
-    def __init__(self, status):
+    def __init__(self, status, container_id=None):
         self._status = status
+        self.container_id = container_id
 
     def errored(self):
         return self._status["StatusCode"] != 0
@@ -16,43 +21,186 @@ class ContainerStopped:
         return self._status["StatusCode"]
 
 
-class LogItem:
-    def __init__(self, container_id, log_line):
+class LogBatch:
+    """Consecutive raw log lines of one container and the matcher counts for them."""
+
+    def __init__(self, container_id, lines, counts):
         self.container_id = container_id
-        self.log_line = log_line
+        self.lines = lines
+        self.counts = counts
+
+
+class LineMatcher:
+    """Count log lines matching a bytes pattern.
+
+    Lines are matched as raw bytes, so counting does not decode or build any
+    strings. Subclasses can override `count` for other kinds of matching.
+
+    Args:
+        name: Key of the count in `LogBatch.counts` and `ContainerSupervisor.counts`
+        pattern: Bytes regular expression searched for in each line
+        container_ids: Only count lines of these containers. Defaults to all.
+    """
+
+    def __init__(
+        self, name: str, pattern: bytes, container_ids: Optional[Iterable[str]] = None
+    ):
+        self.name = name
+        self._search = re.compile(pattern).search
+        self.container_ids = set(container_ids) if container_ids is not None else None
+
+    def applies_to(self, container_id: str) -> bool:
+        return self.container_ids is None or container_id in self.container_ids
+
+    def count(self, lines: List[bytes]) -> int:
+        search = self._search
+        return sum(1 for line in lines if search(line))
+
+
+class ContainerSupervisor:
+    """Follow the logs of several containers until the first one exits.
+
+    Each container is followed by a single thread, which groups log lines into
+    batches of up to `batch_size` lines and runs the matchers on them. Batches go
+    through a queue of at most `max_batches` entries; when the consumer falls
+    behind, the threads block and stop reading from Docker instead of buffering
+    the logs in memory. All threads share one Docker client.
+
+    A batch is handed over once it is full, once its first line is older than
+    `batch_interval` seconds when the next line arrives, or when the log stream
+    ends.
 
+    Use it as a context manager so that the log streams are closed and the
+    threads finish however the consumer exits:
 
-def watch_container(queue, container_id):
-    docker_client = docker.from_env()
-    container = docker_client.containers.get(container_id)
-    queue.put(ContainerStopped(container.wait()))
+        with ContainerSupervisor([builder_id, server_id], matchers=[...]) as supervisor:
+            for batch in supervisor.batches():
+                ...
 
+    `since` limits the logs to lines written after that time, e.g. for servers
+    that were already running before the current task.
+    """
 
-def stream_logs(queue, container_id):
-    docker_client = docker.from_env()
-    container = docker_client.containers.get(container_id)
-    for log_line in container.logs(stream=True):
-        queue.put((container_id, log_line))
+    def __init__(
+        self,
+        container_ids: Iterable[str],
+        since=None,
+        matchers: Iterable[LineMatcher] = (),
+        max_batches: int = 64,
+        batch_size: int = 256,
+        batch_interval: float = 0.5,
+        client: Optional[docker.DockerClient] = None,
+    ):
+        self.container_ids = list(container_ids)
+        self.since = since
+        self.matchers = list(matchers)
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.counts = Counter()
 
+        self._client = client or docker.from_env()
+        self._owns_client = client is None
+        self._queue = queue.Queue(maxsize=max_batches)
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._streams = []
+        self._threads = []
 
-def wait_for_containers(container_ids):
-    item_queue = queue.Queue()
+    def __enter__(self):
+        self.start()
+        return self
 
-    for container_id in container_ids:
-        for target in [watch_container, stream_logs]:
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self) -> None:
+        for container_id in self.container_ids:
             thread = threading.Thread(
-                target=target, args=(item_queue, container_id), daemon=True
+                target=self._follow, args=(container_id,), daemon=True
             )
             thread.start()
+            self._threads.append(thread)
+
+    def batches(self) -> Iterator[LogBatch]:
+        """Yield log batches until the first container exits.
+
+        Raises RuntimeError if that container exited with a non-zero status.
+        """
+        while True:
+            item = self._queue.get()
+            if isinstance(item, ContainerStopped):
+                if item.errored():
+                    raise RuntimeError(
+                        f"{item.container_id} container exited with non-zero status: {item.status_code}"
+                    )
+                return
+            if isinstance(item, Exception):
+                raise item
+
+            self.counts.update(item.counts)
+            yield item
+
+    def close(self, timeout: float = 5) -> None:
+        """Stop following the containers and wait for the threads to finish."""
+        self._stopped.set()
+        with self._lock:
+            streams, self._streams = self._streams, []
+        for stream in streams:
+            stream.close()
+
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+        if self._owns_client:
+            self._client.close()
+
+    def _follow(self, container_id: str) -> None:
+        matchers = [m for m in self.matchers if m.applies_to(container_id)]
+        try:
+            container = self._client.containers.get(container_id)
+            stream = container.logs(stream=True, follow=True, since=self.since)
+            with self._lock:
+                if self._stopped.is_set():
+                    stream.close()
+                    return
+                self._streams.append(stream)
+
+            lines = []
+            started = None
+            for line in stream:
+                if not lines:
+                    started = time.monotonic()
+                lines.append(line)
+                if (
+                    len(lines) >= self.batch_size
+                    or time.monotonic() - started >= self.batch_interval
+                ):
+                    if not self._put(self._batch(container_id, lines, matchers)):
+                        return
+                    lines = []
+
+            if lines and not self._put(self._batch(container_id, lines, matchers)):
+                return
+
+            # Following the logs ends when the container stops
+            self._put(ContainerStopped(container.wait(), container_id=container_id))
+        except Exception as e:
+            # Closing the streams makes the reads fail on purpose
+            if not self._stopped.is_set():
+                self._put(e)
+
+    def _batch(self, container_id, lines, matchers) -> LogBatch:
+        counts = {}
+        for matcher in matchers:
+            counts[matcher.name] = matcher.count(lines)
+        return LogBatch(container_id, lines, counts)
 
-    while True:
-        queue_item = item_queue.get()
-        if isinstance(queue_item, ContainerStopped):
-            if queue_item.errored():
-                raise RuntimeError(
-                    f"{container_id} container exited with non-zero status: {queue_item.status_code}"
-                )
-            else:
-                break
-        else:
-            yield LogItem(queue_item[0], queue_item[1])
+    def _put(self, item) -> bool:
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
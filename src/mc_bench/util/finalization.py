@@ -0,0 +1,89 @@
+"""
+Debounced finalization of generations.
+
+Stage tasks and the scheduler request finalization of the generations of the runs
+they change. The first request for a generation enqueues
+`generation.finalize_generation` to run FINALIZE_DEBOUNCE_SECONDS later, and the
+requests that follow are dropped until that task starts and clears the request.
+A generation is then finalized at most once per interval, and always after its
+latest change. Requests are kept in the CACHE Redis database; without Redis every
+request is enqueued right away, as before.
+"""
+
+import datetime
+import os
+from typing import Optional
+
+from redis import RedisError, StrictRedis
+
+from mc_bench.util.logging import get_logger
+from mc_bench.util.redis import RedisDatabase, get_redis_client
+
+logger = get_logger(__name__)
+
+FINALIZE_DEBOUNCE_SECONDS = int(
+    os.environ.get("GENERATION_FINALIZE_DEBOUNCE_SECONDS", "10")
+)
+
+
+def request_finalization(
+    app,
+    generation_id: int,
+    redis: Optional[StrictRedis] = None,
+    debounce_seconds: int = FINALIZE_DEBOUNCE_SECONDS,
+) -> bool:
+    """Enqueue finalization of the generation unless it is already enqueued.
+
+    Returns:
+        Whether a finalization task was enqueued
+    """
+    countdown = None
+    if debounce_seconds > 0:
+        try:
+            redis = redis or get_redis_client(RedisDatabase.CACHE)
+            # Expires in case the task is lost
+            requested = redis.set(
+                _request_key(generation_id), 1, nx=True, ex=debounce_seconds * 10
+            )
+        except RedisError:
+            logger.exception(
+                "Error debouncing generation finalization", generation_id=generation_id
+            )
+        else:
+            if not requested:
+                return False
+            countdown = debounce_seconds
+
+    app.signature(
+        "generation.finalize_generation",
+        args=[generation_id],
+        queue="generation",
+        headers={
+            "enqueued_timestamp": datetime.datetime.now(
+                tz=datetime.timezone.utc
+            ).isoformat()
+        },
+    ).apply_async(countdown=countdown)
+    return True
+
+
+def clear_finalization_request(
+    generation_id: int, redis: Optional[StrictRedis] = None
+) -> None:
+    """Let the next change of the generation request finalization again.
+
+    Called by the finalization task before it reads the state of the generation,
+    so changes it does not see request another finalization.
+    """
+    try:
+        redis = redis or get_redis_client(RedisDatabase.CACHE)
+        redis.delete(_request_key(generation_id))
+    except RedisError:
+        logger.exception(
+            "Error clearing generation finalization request",
+            generation_id=generation_id,
+        )
+
+
+def _request_key(generation_id: int) -> str:
+    return f"finalize_generation:{generation_id}"
@@ -0,0 +1,196 @@
+"""
+Per-batch leaderboard rating deltas.
+
+The ELO worker records which model, prompt and sample leaderboard entries a batch
+of comparisons touched, resolves them to public identifiers and appends a single
+delta message per batch to a capped Redis Stream. The public API relays that
+stream to clients over Server-Sent Events, so nobody has to poll and re-download
+whole leaderboards to notice a change.
+"""
+
+import json
+import re
+from typing import Any, Dict, List
+
+import sqlalchemy
+from redis import StrictRedis
+from sqlalchemy.orm import Session
+
+LEADERBOARD_DELTA_STREAM_KEY = "leaderboard_deltas"
+# Enough history for reconnecting clients to catch up via Last-Event-ID
+LEADERBOARD_DELTA_STREAM_MAXLEN = 10000
+
+_STREAM_ID_PATTERN = re.compile(r"^\d+-\d+$")
+
+MODEL = "model"
+PROMPT = "prompt"
+SAMPLE = "sample"
+
+
+class LeaderboardDeltaTracker:
+    """Accumulates rating changes of leaderboard entries across a batch."""
+
+    def __init__(self):
+        # (kind, entry id) -> [elo before, votes before, elo after, votes after]
+        self._changes: Dict[tuple, List[Any]] = {}
+
+    def observe_before(self, kind: str, entries) -> None:
+        """Record the state of entries before the first update in this batch."""
+        for entry in entries:
+            key = (kind, entry.id)
+            if key not in self._changes:
+                self._changes[key] = [entry.elo_score, entry.vote_count, None, None]
+
+    def observe_after(self, kind: str, entries) -> None:
+        """Record the state of entries after an update."""
+        for entry in entries:
+            change = self._changes.get((kind, entry.id))
+            if change is not None:
+                change[2] = entry.elo_score
+                change[3] = entry.vote_count
+
+    def changed(self, kind: str) -> Dict[int, Dict[str, float]]:
+        """Return entry id -> delta for the entries of `kind` that changed."""
+        return {
+            entry_id: {
+                "elo_score": elo_after,
+                "elo_delta": elo_after - elo_before,
+                "vote_count": votes_after,
+                "vote_delta": votes_after - votes_before,
+            }
+            for (
+                (change_kind, entry_id),
+                (elo_before, votes_before, elo_after, votes_after),
+            ) in self._changes.items()
+            if change_kind == kind and elo_after is not None
+        }
+
+    def __bool__(self):
+        return any(change[2] is not None for change in self._changes.values())
+
+
+def resolve_deltas(
+    db: Session, tracker: LeaderboardDeltaTracker
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Attach public identifiers to the changes recorded by the tracker."""
+    resolved = {}
+    for kind, query in (
+        (MODEL, _MODEL_DELTA_QUERY),
+        (PROMPT, _PROMPT_DELTA_QUERY),
+        (SAMPLE, _SAMPLE_DELTA_QUERY),
+    ):
+        changes = tracker.changed(kind)
+        if not changes:
+            resolved[kind] = []
+            continue
+
+        rows = db.execute(
+            sqlalchemy.text(query).bindparams(ids=list(changes.keys()))
+        ).mappings()
+        resolved[kind] = [
+            {
+                **{
+                    key: str(value) if value is not None else None
+                    for key, value in row.items()
+                    if key != "id"
+                },
+                **changes[row["id"]],
+            }
+            for row in rows
+        ]
+
+    return resolved
+
+
+def publish_deltas(redis: StrictRedis, deltas: Dict[str, List[Dict[str, Any]]]):
+    """Append one batch of resolved deltas to the delta stream."""
+    return redis.xadd(
+        LEADERBOARD_DELTA_STREAM_KEY,
+        {"deltas": json.dumps(deltas)},
+        maxlen=LEADERBOARD_DELTA_STREAM_MAXLEN,
+        approximate=True,
+    )
+
+
+def filter_deltas(
+    deltas: Dict[str, List[Dict[str, Any]]], metric_name=None, test_set_name=None
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Keep only the deltas for the given metric and test set names."""
+    return {
+        kind: [
+            delta
+            for delta in kind_deltas
+            if (metric_name is None or delta["metric_name"] == metric_name)
+            and (test_set_name is None or delta["test_set_name"] == test_set_name)
+        ]
+        for kind, kind_deltas in deltas.items()
+    }
+
+
+def is_stream_id(value: str) -> bool:
+    """Check that a client supplied Last-Event-ID looks like a stream entry id."""
+    return bool(value) and bool(_STREAM_ID_PATTERN.match(value))
+
+
+_MODEL_DELTA_QUERY = """
+    SELECT
+        model_leaderboard.id,
+        model.external_id model_id,
+        model.name model_name,
+        model.slug model_slug,
+        metric.external_id metric_id,
+        metric.name metric_name,
+        test_set.external_id test_set_id,
+        test_set.name test_set_name,
+        tag.external_id tag_id,
+        tag.name tag_name
+    FROM
+        scoring.model_leaderboard
+        JOIN specification.model ON model_leaderboard.model_id = model.id
+        JOIN scoring.metric ON model_leaderboard.metric_id = metric.id
+        JOIN sample.test_set ON model_leaderboard.test_set_id = test_set.id
+        LEFT JOIN specification.tag ON model_leaderboard.tag_id = tag.id
+    WHERE
+        model_leaderboard.id = ANY(:ids)
+"""
+
+_PROMPT_DELTA_QUERY = """
+    SELECT
+        prompt_leaderboard.id,
+        prompt.external_id prompt_id,
+        prompt.name prompt_name,
+        model.external_id model_id,
+        model.name model_name,
+        metric.external_id metric_id,
+        metric.name metric_name,
+        test_set.external_id test_set_id,
+        test_set.name test_set_name,
+        tag.external_id tag_id,
+        tag.name tag_name
+    FROM
+        scoring.prompt_leaderboard
+        JOIN specification.prompt ON prompt_leaderboard.prompt_id = prompt.id
+        JOIN specification.model ON prompt_leaderboard.model_id = model.id
+        JOIN scoring.metric ON prompt_leaderboard.metric_id = metric.id
+        JOIN sample.test_set ON prompt_leaderboard.test_set_id = test_set.id
+        LEFT JOIN specification.tag ON prompt_leaderboard.tag_id = tag.id
+    WHERE
+        prompt_leaderboard.id = ANY(:ids)
+"""
+
+_SAMPLE_DELTA_QUERY = """
+    SELECT
+        sample_leaderboard.id,
+        sample.external_id sample_id,
+        metric.external_id metric_id,
+        metric.name metric_name,
+        test_set.external_id test_set_id,
+        test_set.name test_set_name
+    FROM
+        scoring.sample_leaderboard
+        JOIN sample.sample ON sample_leaderboard.sample_id = sample.id
+        JOIN scoring.metric ON sample_leaderboard.metric_id = metric.id
+        JOIN sample.test_set ON sample_leaderboard.test_set_id = test_set.id
+    WHERE
+        sample_leaderboard.id = ANY(:ids)
+"""
@@ -211,9 +211,9 @@ def get_object_as_bytesio(client, bucket_name, object_name):
 
 # Download to string
 def get_object_as_string(client, bucket_name, object_name):
+    # Get object data
+    data = client.get_object(bucket_name, object_name)
     try:
-        # Get object data
-        data = client.get_object(bucket_name, object_name)
         # Read into string
         return data.read().decode("utf-8")
     finally:
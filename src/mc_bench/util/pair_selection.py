@@ -0,0 +1,176 @@
+"""
+Information-gain driven selection of comparison pairs.
+
+Uniformly random pairs spend a lot of votes on match-ups whose outcome is already
+near certain. These helpers score a pool of candidate pairs by how much a vote on
+them is expected to teach us (close ratings, few votes, under-covered samples and
+prompts) and draw a weighted sample from the candidates. The math is vectorized
+with numpy and kept free of database access for easier testing, apart from
+`load_pair_features` which gathers the inputs for a list of pool pairs.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import sqlalchemy
+from sqlalchemy.orm import Session
+
+# Keeps every candidate selectable, even ones with a certain outcome
+MIN_SCORE = 1e-3
+
+
+def information_gain_scores(
+    rating_1: np.ndarray,
+    rating_2: np.ndarray,
+    model_votes_1: np.ndarray,
+    model_votes_2: np.ndarray,
+    sample_votes_1: np.ndarray,
+    sample_votes_2: np.ndarray,
+    prompt_votes: np.ndarray,
+) -> np.ndarray:
+    """
+    Score candidate pairs by the expected information of a vote on them.
+
+    Args:
+        rating_1: ELO ratings of the first model of each pair
+        rating_2: ELO ratings of the second model of each pair
+        model_votes_1: Vote counts of the first model of each pair
+        model_votes_2: Vote counts of the second model of each pair
+        sample_votes_1: Vote counts of the first sample of each pair
+        sample_votes_2: Vote counts of the second sample of each pair
+        prompt_votes: Vote counts of the prompt shared by each pair
+
+    Returns:
+        Array of positive scores, one per pair, higher meaning more informative
+    """
+    rating_1 = np.asarray(rating_1, dtype=np.float64)
+    rating_2 = np.asarray(rating_2, dtype=np.float64)
+
+    # Bernoulli variance of the outcome, normalized to 1.0 for evenly matched pairs
+    expected = 1.0 / (1.0 + np.power(10.0, (rating_2 - rating_1) / 400.0))
+    outcome_uncertainty = 4.0 * expected * (1.0 - expected)
+
+    # Ratings with few votes behind them are still uncertain
+    rating_uncertainty = 0.5 * (
+        _inverse_sqrt_votes(model_votes_1) + _inverse_sqrt_votes(model_votes_2)
+    )
+
+    # Favor samples and prompts that have seen little voting so far
+    coverage = (
+        _inverse_sqrt_votes(sample_votes_1)
+        + _inverse_sqrt_votes(sample_votes_2)
+        + _inverse_sqrt_votes(prompt_votes)
+    ) / 3.0
+
+    return np.maximum(outcome_uncertainty * (rating_uncertainty + coverage), MIN_SCORE)
+
+
+def select_weighted(
+    scores: np.ndarray, count: int, rng: Optional[np.random.Generator] = None
+) -> np.ndarray:
+    """
+    Draw `count` distinct indices with probability proportional to `scores`.
+
+    Uses the Gumbel top-k trick, which is equivalent to weighted sampling without
+    replacement but needs a single vectorized pass.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    count = min(count, scores.shape[0])
+    if count <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    rng = rng or np.random.default_rng()
+    keys = np.log(scores) + rng.gumbel(size=scores.shape[0])
+    return np.argpartition(-keys, count - 1)[:count]
+
+
+def load_pair_features(
+    db: Session,
+    test_set_id: int,
+    pairs: List[Dict[str, Any]],
+    default_rating: float,
+) -> Dict[str, np.ndarray]:
+    """Gather ratings and vote counts for comparison pool pairs as score inputs."""
+    comparison_sample_ids = {pair["sample_1"] for pair in pairs} | {
+        pair["sample_2"] for pair in pairs
+    }
+
+    samples = {
+        str(comparison_sample_id): (sample_id, model_id, prompt_id)
+        for comparison_sample_id, sample_id, model_id, prompt_id in db.execute(
+            sqlalchemy.text("""
+                SELECT sample.comparison_sample_id, sample.id, run.model_id, run.prompt_id
+                FROM sample.sample
+                JOIN specification.run ON sample.run_id = run.id
+                WHERE sample.comparison_sample_id = ANY(CAST(:ids AS uuid[]))
+            """).bindparams(ids=list(comparison_sample_ids))
+        )
+    }
+
+    model_stats = {
+        model_id: (elo_score, vote_count)
+        for model_id, elo_score, vote_count in db.execute(
+            sqlalchemy.text("""
+                SELECT model_id, AVG(elo_score), SUM(vote_count)
+                FROM scoring.model_leaderboard
+                WHERE test_set_id = :test_set_id AND tag_id IS NULL
+                GROUP BY model_id
+            """).bindparams(test_set_id=test_set_id)
+        )
+    }
+
+    sample_votes = dict(
+        db.execute(
+            sqlalchemy.text("""
+                SELECT sample_id, SUM(vote_count)
+                FROM scoring.sample_leaderboard
+                WHERE test_set_id = :test_set_id AND sample_id = ANY(:sample_ids)
+                GROUP BY sample_id
+            """).bindparams(
+                test_set_id=test_set_id,
+                sample_ids=[sample_id for sample_id, _, _ in samples.values()],
+            )
+        ).all()
+    )
+
+    prompt_votes = dict(
+        db.execute(
+            sqlalchemy.text("""
+                SELECT prompt_id, SUM(vote_count)
+                FROM scoring.prompt_leaderboard
+                WHERE test_set_id = :test_set_id AND tag_id IS NULL
+                GROUP BY prompt_id
+            """).bindparams(test_set_id=test_set_id)
+        ).all()
+    )
+
+    features = {
+        name: np.zeros(len(pairs), dtype=np.float64)
+        for name in (
+            "rating_1",
+            "rating_2",
+            "model_votes_1",
+            "model_votes_2",
+            "sample_votes_1",
+            "sample_votes_2",
+            "prompt_votes",
+        )
+    }
+
+    for idx, pair in enumerate(pairs):
+        for position in ("1", "2"):
+            sample_id, model_id, prompt_id = samples.get(
+                pair[f"sample_{position}"], (None, None, None)
+            )
+            rating, model_votes = model_stats.get(model_id, (default_rating, 0))
+            features[f"rating_{position}"][idx] = rating
+            features[f"model_votes_{position}"][idx] = model_votes
+            features[f"sample_votes_{position}"][idx] = sample_votes.get(sample_id, 0)
+            if position == "1":
+                features["prompt_votes"][idx] = prompt_votes.get(prompt_id, 0)
+
+    return features
+
+
+def _inverse_sqrt_votes(votes) -> np.ndarray:
+    return 1.0 / np.sqrt(1.0 + np.asarray(votes, dtype=np.float64))
@@ -2,6 +2,7 @@ import os
 from functools import lru_cache
 
 from redis import ConnectionPool, SSLConnection, StrictRedis
+from redis import asyncio as aioredis
 
 
 class RedisDatabase:
@@ -13,6 +14,17 @@ class RedisDatabase:
 
 @lru_cache
 def get_redis_pool(database: int, **kwargs) -> ConnectionPool:
+    return ConnectionPool(**_connection_kwargs(database, SSLConnection, **kwargs))
+
+
+@lru_cache
+def get_async_redis_pool(database: int, **kwargs) -> aioredis.ConnectionPool:
+    return aioredis.ConnectionPool(
+        **_connection_kwargs(database, aioredis.SSLConnection, **kwargs)
+    )
+
+
+def _connection_kwargs(database: int, ssl_connection_class, **kwargs) -> dict:
     kwargs["host"] = kwargs.get("host", os.environ.get("REDIS_HOST", "localhost"))
     kwargs["port"] = kwargs.get("port", os.environ.get("REDIS_PORT", 6379))
 
@@ -23,10 +35,10 @@ def get_redis_pool(database: int, **kwargs) -> ConnectionPool:
         kwargs["username"] = os.environ["REDIS_USERNAME"]
 
     if os.environ.get("REDIS_USE_SSL", "true") == "true":
-        kwargs["connection_class"] = SSLConnection
+        kwargs["connection_class"] = ssl_connection_class
         kwargs["ssl_cert_reqs"] = "none"
 
-    return ConnectionPool(**kwargs)
+    return kwargs
 
 
 def get_redis_client(database: int = 0, **kwargs) -> StrictRedis:
@@ -34,6 +46,11 @@ def get_redis_client(database: int = 0, **kwargs) -> StrictRedis:
     return StrictRedis(connection_pool=pool)
 
 
+def get_async_redis_client(database: int = 0, **kwargs) -> aioredis.StrictRedis:
+    pool = get_async_redis_pool(database, **kwargs)
+    return aioredis.StrictRedis(connection_pool=pool)
+
+
 def get_redis_database(database):
     def wrapper():
         redis = get_redis_client(database=database)
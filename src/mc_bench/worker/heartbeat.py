@@ -0,0 +1,77 @@
+"""
+Per-process heartbeats of the stages a worker is running.
+
+Stages register while they run and a single background thread keeps their
+heartbeats fresh with one UPDATE per interval, whatever the number of stages, so
+the database load of heartbeats follows the number of worker processes rather
+than the number of tasks.
+"""
+
+import threading
+from functools import lru_cache
+from typing import Set
+
+from mc_bench.constants import RUN_STAGE_STATE
+from mc_bench.models.run import RunStage, run_stage_state_id_for
+from mc_bench.util.logging import get_logger
+from mc_bench.util.postgres import managed_session
+
+logger = get_logger(__name__)
+
+# Heartbeat interval in seconds
+HEARTBEAT_INTERVAL = 60  # Send heartbeat every minute
+
+
+class HeartbeatService:
+    """Beat the heartbeats of all registered stages every `interval` seconds."""
+
+    def __init__(self, interval: int = HEARTBEAT_INTERVAL):
+        self.interval = interval
+        self._stage_ids: Set[int] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def register(self, stage_id: int) -> None:
+        """Start beating for `stage_id`, with a first beat right away."""
+        with self._lock:
+            self._stage_ids.add(stage_id)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def unregister(self, stage_id: int) -> None:
+        with self._lock:
+            self._stage_ids.discard(stage_id)
+
+    def beat(self) -> None:
+        with self._lock:
+            stage_ids = list(self._stage_ids)
+
+        if not stage_ids:
+            return
+
+        with managed_session() as db:
+            updated = RunStage.update_heartbeats(
+                db,
+                stage_ids,
+                state_id=run_stage_state_id_for(db, RUN_STAGE_STATE.IN_PROGRESS),
+            )
+        logger.debug("Updated heartbeats", stage_ids=stage_ids, updated=updated)
+
+    def _run(self):
+        logger.info("Starting heartbeat service", interval=self.interval)
+        while True:
+            # Woken early by new registrations so they get their first beat at once
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.beat()
+            except Exception:
+                logger.exception("Error updating heartbeats")
+
+
+@lru_cache
+def get_heartbeat_service() -> HeartbeatService:
+    return HeartbeatService()
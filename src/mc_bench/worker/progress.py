@@ -0,0 +1,101 @@
+"""
+Coalesced stage progress, written straight to Redis.
+
+Stages report progress from the loops they instrument, often many times a second.
+Each update only replaces the pending value of its stage; a background thread
+writes the latest value of every stage through the pooled CACHE connection, at
+most once per interval. Progress and note go into one hash with a single HSET, the
+same one the admin API reads (see `RunStage.get_many_stage_progress`).
+"""
+
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from redis import RedisError, StrictRedis
+
+from mc_bench.models.run import RunStage
+from mc_bench.util.logging import get_logger
+from mc_bench.util.redis import RedisDatabase, get_redis_client
+
+logger = get_logger(__name__)
+
+# Write progress to Redis instead of posting it to the admin API
+DIRECT_STAGE_PROGRESS = os.environ.get("DIRECT_STAGE_PROGRESS", "true") == "true"
+# Minimum time between two progress writes of a stage
+STAGE_PROGRESS_MIN_INTERVAL_MS = int(
+    os.environ.get("STAGE_PROGRESS_MIN_INTERVAL_MS", "500")
+)
+
+
+class ProgressPublisher:
+    """Coalesce progress updates per stage and write them in the background.
+
+    Args:
+        redis: Client for the CACHE database
+        min_interval_ms: Minimum time between two writes
+    """
+
+    def __init__(self, redis: StrictRedis, min_interval_ms: int = 500):
+        self.redis = redis
+        self.min_interval = min_interval_ms / 1000
+        self._pending: Dict[int, Tuple[float, Optional[str]]] = {}
+        # Guards the pending updates; held briefly, so publishing never waits on Redis
+        self._lock = threading.Lock()
+        # Orders writes, so that a pending update never lands after a newer `set`
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def publish(self, stage_id: int, progress: float, note: Optional[str] = None):
+        """Queue an update, replacing any pending one of the stage."""
+        with self._lock:
+            self._pending[stage_id] = (progress, note)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def set(self, stage_id: int, progress: float, note: Optional[str] = None):
+        """Write an update right away, dropping any pending one of the stage."""
+        with self._write_lock:
+            with self._lock:
+                self._pending.pop(stage_id, None)
+            self._write({stage_id: (progress, note)})
+
+    def flush(self):
+        """Write all pending updates right away."""
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            self._write(pending)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            self.flush()
+            time.sleep(self.min_interval)
+
+    def _write(self, updates):
+        if not updates:
+            return
+
+        try:
+            pipeline = self.redis.pipeline(transaction=False)
+            for stage_id, (progress, note) in updates.items():
+                RunStage.write_progress(pipeline, stage_id, progress, note)
+            pipeline.execute()
+        except RedisError:
+            # Progress is informational, the next update replaces it anyway
+            logger.exception("Error writing stage progress", stages=list(updates))
+
+
+@lru_cache
+def get_progress_publisher() -> ProgressPublisher:
+    return ProgressPublisher(
+        get_redis_client(RedisDatabase.CACHE),
+        min_interval_ms=STAGE_PROGRESS_MIN_INTERVAL_MS,
+    )
@@ -1,86 +1,32 @@
-import datetime
-import threading
-from typing import Optional
+import time
+from typing import Callable, Dict, List, Optional
 
 from celery import Celery
+from celery.exceptions import Retry
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from mc_bench.clients.mcbench_admin_api import Client
 from mc_bench.constants import RUN_STAGE_STATE, RUN_STATE
-from mc_bench.events import emit_event
+from mc_bench.events import emit_event, event_batch
 from mc_bench.events.types import RunStageStateChanged, RunStateChanged
-from mc_bench.models.run import RunStage, Sample
+from mc_bench.models.run import RunStage, Sample, run_stage_state_id_for
+from mc_bench.util.finalization import request_finalization
 from mc_bench.util.logging import get_logger
 from mc_bench.util.postgres import managed_session
 
-logger = get_logger(__name__)
+from .heartbeat import get_heartbeat_service
+from .progress import DIRECT_STAGE_PROGRESS, get_progress_publisher
 
-# Heartbeat interval in seconds
-HEARTBEAT_INTERVAL = 60  # Send heartbeat every minute
+logger = get_logger(__name__)
 
 
 class ValueNotSet:
     pass
 
 
-def run_heartbeat_thread(run_stage, task_id, stop_event):
-    """
-    Background thread function to periodically update the heartbeat timestamp.
-
-    Args:
-        run_stage: The RunStage instance to update heartbeat for
-        task_id: The Celery task ID for logging
-        stop_event: Threading event used to signal when to exit the thread
-    """
-    logger.info(
-        f"Starting heartbeat thread for task {task_id} and stage {run_stage.id}"
-    )
-
-    # Use a separate database session for heartbeat updates
-    with managed_session() as db:
-        # First, register the task ID if not already set
-        if not run_stage.task_id:
-            run_stage.register_task_id(task_id, db)
-            logger.debug(f"Registered task ID {task_id} with stage {run_stage.id}")
-
-    # Continue heartbeat until stop event is set
-    try:
-        while not stop_event.is_set():
-            try:
-                # Update the heartbeat timestamp in the database
-                with managed_session() as beat_db:
-                    # Get the latest stage from the database
-                    stage = beat_db.scalars(
-                        select(RunStage).where(RunStage.id == run_stage.id)
-                    ).first()
-
-                    if stage and stage.state.slug == RUN_STAGE_STATE.IN_PROGRESS.value:
-                        # Only update heartbeat for IN_PROGRESS stages
-                        stage.update_heartbeat(beat_db)
-                        logger.debug(
-                            f"Updated heartbeat for task {task_id}, stage {run_stage.id}, timestamp: {stage.heartbeat}"
-                        )
-                    else:
-                        logger.debug(
-                            f"Skipping heartbeat for task {task_id}, stage {run_stage.id} - "
-                            f"not in IN_PROGRESS state"
-                        )
-
-            except Exception as e:
-                logger.exception(
-                    f"Error updating heartbeat for task {task_id}: {str(e)}"
-                )
-
-            # Sleep until next heartbeat or until stop_event is set
-            stop_event.wait(HEARTBEAT_INTERVAL)
-
-    except Exception as e:
-        logger.exception(
-            f"Fatal error in heartbeat thread for task {task_id}: {str(e)}"
-        )
-
-    logger.info(f"Heartbeat thread for task {task_id} is exiting")
+# Bodies of the run stage tasks by stage slug, so fused tasks can run them
+_stage_runners: Dict[str, Callable] = {}
 
 
 def run_stage_task(
@@ -104,7 +50,6 @@ def run_stage_task(
 
     # TODO: Get task binding right
     def wrapper(func):
-        @app.task(name=name, bind=True, **kwargs)
         def wrapped(self, metadata):
             logger.info("Metadata", metadata=metadata)
             run_id = metadata["run_id"]
@@ -134,31 +79,30 @@ def run_stage_task(
 
                 # THIS IS THE HAPPY PATH
                 # 1. Emit the stage is in progress
-                # 2. Start heartbeat thread
+                # 2. Register with the heartbeat service
                 # 3. Run the stage
                 # 4. Emit the stage is complete
                 # 5. If terminal stage, emit we are completed
-                # Create stop event for the heartbeat thread
-                heartbeat_stop_event = threading.Event()
-                heartbeat_thread = None
+                heartbeat_service = get_heartbeat_service()
+                heartbeat_registered = False
 
                 try:
                     logger.info("Emitting IN_PROGRESS event")
-                    emit_event(
-                        RunStageStateChanged(
-                            stage_id=stage_context.stage_id,
-                            new_state=RUN_STAGE_STATE.IN_PROGRESS,
+                    with event_batch(db):
+                        emit_event(
+                            RunStageStateChanged(
+                                stage_id=stage_context.stage_id,
+                                new_state=RUN_STAGE_STATE.IN_PROGRESS,
+                            )
                         )
-                    )
 
-                    # Start heartbeat thread
-                    heartbeat_thread = threading.Thread(
-                        target=run_heartbeat_thread,
-                        args=(stage_context.run_stage, task_id, heartbeat_stop_event),
-                        daemon=True,  # Make this a daemon thread so it exits when the main thread exits
-                    )
-                    heartbeat_thread.start()
-                    logger.debug(f"Started heartbeat thread for task {task_id}")
+                    if not stage_context.run_stage.task_id:
+                        stage_context.run_stage.register_task_id(task_id, db)
+                    # Commit right away, so the stage is seen in progress while it runs
+                    db.commit()
+
+                    heartbeat_service.register(stage_context.stage_id)
+                    heartbeat_registered = True
 
                     result = func(stage_context)
                     # Commit here to ensure any transactions started by the stage are committed
@@ -166,25 +110,27 @@ def run_stage_task(
                     db.commit()
 
                     logger.info("Task completed successfully", result=result)
-                    emit_event(
-                        RunStageStateChanged(
-                            stage_id=stage_context.stage_id,
-                            new_state=RUN_STAGE_STATE.COMPLETED,
-                        )
-                    )
-                    if terminal_stage:
-                        stage_context.sample.is_complete = True
-                        stage_context.sample.is_pending = False
-                        db.add(stage_context.sample)
-                        db.commit()
-
-                        logger.info("Terminal stage, emitting COMPLETED")
+                    # The state changes and the sample are committed together
+                    with event_batch(db):
                         emit_event(
-                            RunStateChanged(
-                                run_id=stage_context.run.id,
-                                new_state=RUN_STATE.COMPLETED,
+                            RunStageStateChanged(
+                                stage_id=stage_context.stage_id,
+                                new_state=RUN_STAGE_STATE.COMPLETED,
                             )
                         )
+                        if terminal_stage:
+                            stage_context.sample.is_complete = True
+                            stage_context.sample.is_pending = False
+                            db.add(stage_context.sample)
+
+                            logger.info("Terminal stage, emitting COMPLETED")
+                            emit_event(
+                                RunStateChanged(
+                                    run_id=stage_context.run.id,
+                                    new_state=RUN_STATE.COMPLETED,
+                                )
+                            )
+                    db.commit()
                     logger.info("Returning result", result=result)
                     return {
                         "run_id": result[0],
@@ -192,30 +138,30 @@ def run_stage_task(
                     }
                 except Exception as e:
                     logger.error("Exception caught", error=e)
+                    # A stage failing on a database error leaves the session aborted,
+                    # and the state changes below are written with it
+                    db.rollback()
                     if retry_on_failure and self.max_retries > self.request.retries:
                         logger.info(
                             "Attempting retry",
                             retries=self.request.retries + 1,
                             max_retries=self.max_retries,
                         )
-                        api_client.update_stage_progress(
-                            run_external_id=stage_context.run.external_id,
-                            stage=stage_context.stage_class.SLUG,
-                            progress=0,
-                            note=None,
-                        )
-                        emit_event(
-                            RunStageStateChanged(
-                                stage_id=stage_context.stage_id,
-                                new_state=RUN_STAGE_STATE.IN_RETRY,
+                        stage_context.reset_stage_progress()
+                        # Nothing of the task to commit with, so one session of their own
+                        with event_batch():
+                            emit_event(
+                                RunStageStateChanged(
+                                    stage_id=stage_context.stage_id,
+                                    new_state=RUN_STAGE_STATE.IN_RETRY,
+                                )
                             )
-                        )
-                        emit_event(
-                            RunStateChanged(
-                                run_id=stage_context.run.id,
-                                new_state=RUN_STATE.IN_RETRY,
+                            emit_event(
+                                RunStateChanged(
+                                    run_id=stage_context.run.id,
+                                    new_state=RUN_STATE.IN_RETRY,
+                                )
                             )
-                        )
                         logger.info(
                             "Calling retry",
                             run_id=run_id,
@@ -242,29 +188,26 @@ def run_stage_task(
                             max_reruns=max_reruns,
                         )
 
-                        stage_context.sample.is_complete = False
-                        stage_context.sample.is_pending = False
-                        db.add(stage_context.sample)
-                        db.commit()
-
-                        api_client.update_stage_progress(
-                            run_external_id=stage_context.run.external_id,
-                            stage=stage_context.stage_class.SLUG,
-                            progress=0,
-                            note=None,
-                        )
-                        emit_event(
-                            RunStageStateChanged(
-                                stage_id=stage_context.stage_id,
-                                new_state=RUN_STAGE_STATE.IN_RETRY,
+                        stage_context.reset_stage_progress()
+                        with event_batch(db):
+                            stage_context.sample.is_complete = False
+                            stage_context.sample.is_pending = False
+                            db.add(stage_context.sample)
+
+                            emit_event(
+                                RunStageStateChanged(
+                                    stage_id=stage_context.stage_id,
+                                    new_state=RUN_STAGE_STATE.IN_RETRY,
+                                )
                             )
-                        )
-                        emit_event(
-                            RunStateChanged(
-                                run_id=stage_context.run.id,
-                                new_state=RUN_STATE.IN_RETRY,
+                            emit_event(
+                                RunStateChanged(
+                                    run_id=stage_context.run.id,
+                                    new_state=RUN_STATE.IN_RETRY,
+                                )
                             )
-                        )
+                        db.commit()
+
                         api_client.start_run_over(stage_context.run.external_id)
                         self.retry(
                             args=[
@@ -278,30 +221,26 @@ def run_stage_task(
                         )
                     else:
                         logger.info("Task failed permanently")
-                        api_client.update_stage_progress(
-                            run_external_id=stage_context.run.external_id,
-                            stage=stage_context.stage_class.SLUG,
-                            progress=0,
-                            note=None,
-                        )
-                        emit_event(
-                            RunStageStateChanged(
-                                stage_id=stage_context.stage_id,
-                                new_state=RUN_STAGE_STATE.FAILED,
+                        stage_context.reset_stage_progress()
+                        with event_batch(db):
+                            emit_event(
+                                RunStageStateChanged(
+                                    stage_id=stage_context.stage_id,
+                                    new_state=RUN_STAGE_STATE.FAILED,
+                                )
                             )
-                        )
 
-                        stage_context.sample.is_complete = False
-                        stage_context.sample.is_pending = False
-                        db.add(stage_context.sample)
-                        db.commit()
+                            stage_context.sample.is_complete = False
+                            stage_context.sample.is_pending = False
+                            db.add(stage_context.sample)
 
-                        emit_event(
-                            RunStateChanged(
-                                run_id=stage_context.run.id,
-                                new_state=RUN_STATE.FAILED,
+                            emit_event(
+                                RunStateChanged(
+                                    run_id=stage_context.run.id,
+                                    new_state=RUN_STATE.FAILED,
+                                )
                             )
-                        )
+                        db.commit()
                         self.retry(
                             args=[
                                 {
@@ -314,30 +253,88 @@ def run_stage_task(
                         )
 
                 finally:
-                    # Stop the heartbeat thread if it was started
-                    if heartbeat_thread is not None:
-                        logger.debug(f"Stopping heartbeat thread for task {task_id}")
-                        heartbeat_stop_event.set()
-                        # We don't need to join since it's a daemon thread
+                    if heartbeat_registered:
+                        heartbeat_service.unregister(stage_context.stage_id)
 
                     # Finalize generation if needed
                     if generation_id is not None:
-                        app.signature(
-                            "generation.finalize_generation",
-                            args=[generation_id],
-                            queue="generation",
-                            headers={
-                                "enqueued_timestamp": datetime.datetime.now(
-                                    tz=datetime.timezone.utc
-                                ).isoformat()
-                            },
-                        ).apply_async()
-
-        return wrapped
+                        request_finalization(app, generation_id)
+
+        _stage_runners[stage.SLUG] = wrapped
+        return app.task(name=name, bind=True, **kwargs)(wrapped)
 
     return wrapper
 
 
+def fused_stage_task(name: str, app: Celery, stages: List[type[RunStage]], **kwargs):
+    """Register a task that runs the tasks of consecutive `stages` back to back.
+
+    Each stage goes through its states and failure handling as in its own task.
+    Stages completed by an earlier attempt are skipped, and when one fails the
+    stages after it are set back to PENDING for the scheduler.
+    """
+    missing = [stage.SLUG for stage in stages if stage.SLUG not in _stage_runners]
+    if missing:
+        raise ValueError(f"No run stage task for stages: {missing}")
+
+    @app.task(name=name, bind=True, **kwargs)
+    def fused(self, metadata):
+        with managed_session() as db:
+            completed = set(
+                db.scalars(
+                    select(RunStage.stage_slug).where(
+                        RunStage.run_id == metadata["run_id"],
+                        RunStage.state_id
+                        == run_stage_state_id_for(db, RUN_STAGE_STATE.COMPLETED),
+                    )
+                )
+            )
+
+        pending = [stage for stage in stages if stage.SLUG not in completed]
+        result = metadata
+        for index, stage in enumerate(pending):
+            start = time.monotonic()
+            try:
+                result = _stage_runners[stage.SLUG](self, result)
+            except Retry:
+                # The fused task runs again, from the stage that asked for it
+                raise
+            except Exception:
+                _reset_stages(result["run_id"], pending[index + 1 :])
+                raise
+
+            logger.info(
+                "Fused stage completed",
+                task=name,
+                stage=stage.SLUG,
+                duration=time.monotonic() - start,
+            )
+
+        return result
+
+    return fused
+
+
+def _reset_stages(run_id: int, stages: List[type[RunStage]]):
+    if not stages:
+        return
+
+    with managed_session() as db:
+        stage_ids = db.scalars(
+            select(RunStage.id).where(
+                RunStage.run_id == run_id,
+                RunStage.stage_slug.in_([stage.SLUG for stage in stages]),
+            )
+        ).all()
+        with event_batch(db):
+            for stage_id in stage_ids:
+                emit_event(
+                    RunStageStateChanged(
+                        stage_id=stage_id, new_state=RUN_STAGE_STATE.PENDING
+                    )
+                )
+
+
 class StageContext:
     """Context passed to stage execution with DB entities and metadata"""
 
@@ -387,9 +384,26 @@ class StageContext:
             return self.db.scalar(select(Sample).where(Sample.id == self.sample_id))
 
     def update_stage_progress(self, progress: int, note: Optional[str] = None):
+        if DIRECT_STAGE_PROGRESS:
+            get_progress_publisher().publish(self.stage_id, progress, note)
+            return
+
         self.admin_api_client.update_stage_progress(
             run_external_id=self.run.external_id,
             stage=self.stage_class.SLUG,
             progress=progress,
             note=note,
         )
+
+    def reset_stage_progress(self):
+        """Set the progress back to zero, ahead of any pending update."""
+        if DIRECT_STAGE_PROGRESS:
+            get_progress_publisher().set(self.stage_id, 0, None)
+            return
+
+        self.admin_api_client.update_stage_progress(
+            run_external_id=self.run.external_id,
+            stage=self.stage_class.SLUG,
+            progress=0,
+            note=None,
+        )
@@ -0,0 +1,49 @@
+"""
+Tests for batch execution of prompts with the local stand-in.
+"""
+
+from mc_bench.clients.batch import BatchResult, LocalBatchClient
+
+
+class EchoClient:
+    def send_prompt(self, **kwargs):
+        if kwargs["prompt"] == "fail":
+            raise RuntimeError("provider error")
+        return f"{kwargs['model']}: {kwargs['prompt']}"
+
+
+def test_results_by_custom_id_after_polling():
+    client = LocalBatchClient(EchoClient(), polls=3)
+
+    batch_id = client.submit_batch(
+        {
+            "stage-1": {"model": "m", "prompt": "house"},
+            "stage-2": {"model": "m", "prompt": "fail"},
+        }
+    )
+
+    assert client.get_batch_results(batch_id) is None
+    assert client.get_batch_results(batch_id) is None
+    assert client.get_batch_results(batch_id) == {
+        "stage-1": BatchResult(response="m: house"),
+        "stage-2": BatchResult(error="provider error"),
+    }
+
+
+def test_jobs_are_shared_by_the_clients_of_a_process():
+    batch_id = LocalBatchClient(EchoClient()).submit_batch(
+        {"stage-1": {"model": "m", "prompt": "house"}}
+    )
+
+    assert LocalBatchClient(EchoClient()).get_batch_results(batch_id) == {
+        "stage-1": BatchResult(response="m: house"),
+    }
+
+
+def test_cancelled_job_ends_without_results():
+    client = LocalBatchClient(EchoClient(), polls=1000)
+    batch_id = client.submit_batch({"stage-1": {"model": "m", "prompt": "house"}})
+
+    client.cancel_batch(batch_id)
+
+    assert client.get_batch_results(batch_id) == {}
@@ -0,0 +1,141 @@
+"""
+Tests for the Redis pool of precomputed comparison pairs.
+"""
+
+import random
+
+from mc_bench.util import comparison_pool
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def sadd(self, key, *members):
+        self.calls.append(lambda: self.redis.sadd(key, *members))
+
+    def expire(self, key, seconds):
+        self.calls.append(lambda: self.redis.expire(key, seconds))
+
+    def execute(self):
+        return [call() for call in self.calls]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.sets = {}
+        self.strings = {}
+        self.ttls = {}
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def sadd(self, key, *members):
+        members = set(members) - self.sets.get(key, set())
+        self.sets.setdefault(key, set()).update(members)
+        return len(members)
+
+    def spop(self, key, count):
+        members = self.sets.get(key, set())
+        popped = random.sample(sorted(members), min(count, len(members)))
+        members.difference_update(popped)
+        return [member.encode("utf-8") for member in popped]
+
+    def scard(self, key):
+        return len(self.sets.get(key, set()))
+
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+        return True
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        self.ttls[key] = ex
+        return True
+
+    def delete(self, key):
+        self.strings.pop(key, None)
+
+
+def make_pairs(count):
+    return [
+        {
+            "sample_1": f"sample-{i}-a",
+            "sample_1_key": f"renders/{i}-a.glb",
+            "sample_1_model": "model-a",
+            "sample_2": f"sample-{i}-b",
+            "sample_2_key": f"renders/{i}-b.glb",
+            "sample_2_model": "model-b",
+            "build_specification": f"build {i}",
+        }
+        for i in range(count)
+    ]
+
+
+def test_pop_returns_what_is_left_of_a_short_pool():
+    redis = FakeRedis()
+    pairs = make_pairs(3)
+    comparison_pool.push_pairs(redis, 1, pairs, ttl_seconds=600)
+
+    popped = comparison_pool.pop_pairs(redis, 1, 5)
+
+    assert sorted(popped, key=lambda pair: pair["sample_1"]) == pairs
+    assert comparison_pool.pop_pairs(redis, 1, 5) == []
+    assert comparison_pool.pool_size(redis, 1) == 0
+
+
+def test_pop_without_a_count_leaves_the_pool():
+    redis = FakeRedis()
+    comparison_pool.push_pairs(redis, 1, make_pairs(2), ttl_seconds=600)
+
+    assert comparison_pool.pop_pairs(redis, 1, 0) == []
+    assert comparison_pool.pool_size(redis, 1) == 2
+
+
+def test_push_sets_the_ttl_of_the_pool():
+    redis = FakeRedis()
+
+    added = comparison_pool.push_pairs(redis, 1, make_pairs(2), ttl_seconds=600)
+
+    assert added == 2
+    assert redis.ttls[comparison_pool.pool_key(1)] == 600
+
+
+def test_push_counts_only_new_pairs_and_refreshes_the_ttl():
+    redis = FakeRedis()
+    comparison_pool.push_pairs(redis, 1, make_pairs(2), ttl_seconds=600)
+
+    added = comparison_pool.push_pairs(redis, 1, make_pairs(3), ttl_seconds=900)
+
+    assert added == 1
+    assert redis.ttls[comparison_pool.pool_key(1)] == 900
+
+
+def test_push_without_pairs_leaves_the_ttl():
+    redis = FakeRedis()
+
+    assert comparison_pool.push_pairs(redis, 1, [], ttl_seconds=600) == 0
+    assert comparison_pool.pool_key(1) not in redis.ttls
+
+
+def test_refill_below_the_low_watermark_once():
+    redis = FakeRedis()
+    comparison_pool.push_pairs(redis, 1, make_pairs(2), ttl_seconds=600)
+
+    assert comparison_pool.should_refill(redis, 1, low_watermark=3)
+    # A refill is already enqueued until the task releases the lock
+    assert not comparison_pool.should_refill(redis, 1, low_watermark=3)
+
+    comparison_pool.release_refill_lock(redis, 1)
+    assert comparison_pool.should_refill(redis, 1, low_watermark=3)
+
+
+def test_no_refill_at_the_low_watermark():
+    redis = FakeRedis()
+    comparison_pool.push_pairs(redis, 1, make_pairs(3), ttl_seconds=600)
+
+    assert not comparison_pool.should_refill(redis, 1, low_watermark=3)
+    assert comparison_pool.refill_lock_key(1) not in redis.strings
@@ -0,0 +1,57 @@
+"""
+Tests for validation of votes read from the vote stream.
+"""
+
+import uuid
+
+import pytest
+
+from mc_bench.util.comparison_votes import vote_error
+
+
+def make_vote(**overrides):
+    vote = {
+        "token": str(uuid.uuid4()),
+        "metric_id": str(uuid.uuid4()),
+        "ranks": [[1, str(uuid.uuid4())], [2, str(uuid.uuid4())]],
+        "user_id": None,
+        "session_id": str(uuid.uuid4()),
+        "identification_token": str(uuid.uuid4()),
+        "created": "2026-10-19T12:00:00+00:00",
+    }
+    vote.update(overrides)
+    return vote
+
+
+def test_valid_vote():
+    assert vote_error(make_vote()) is None
+    assert vote_error(make_vote(user_id=str(uuid.uuid4()))) is None
+
+
+def test_undecodable_entry():
+    assert vote_error(None) == "undecodable entry"
+
+
+def test_missing_fields():
+    vote = make_vote()
+    del vote["created"]
+    assert vote_error(vote) == "missing fields: ['created']"
+
+
+@pytest.mark.parametrize(
+    "overrides",
+    [
+        {"token": "not-a-uuid"},
+        {"user_id": "not-a-uuid"},
+        {"created": "yesterday"},
+        {"ranks": [["first", str(uuid.uuid4())]]},
+        {"ranks": [[1, None]]},
+        {"ranks": [1, 2]},
+    ],
+)
+def test_invalid_values(overrides):
+    assert vote_error(make_vote(**overrides)).startswith("invalid value")
+
+
+def test_no_ranks():
+    assert vote_error(make_vote(ranks=[])) == "no ranks"
@@ -0,0 +1,63 @@
+"""
+Tests for batched event handling.
+"""
+
+import pytest
+
+from mc_bench import events
+from mc_bench.constants import RUN_STAGE_STATE, RUN_STATE
+from mc_bench.events import emit_event, event_batch, on_event, on_events
+from mc_bench.events.types import RunStageStateChanged, RunStateChanged
+from mc_bench.models.run import _ids_by_new_state
+
+
+@pytest.fixture
+def received(monkeypatch):
+    monkeypatch.setattr(events, "_handlers", {})
+    monkeypatch.setattr(events, "_batch_handlers", {})
+
+    received = []
+    on_events(RunStageStateChanged, lambda batch, db: received.append((batch, db)))
+    on_event(RunStateChanged, lambda event: received.append(event))
+    return received
+
+
+def stage_event(stage_id, state=RUN_STAGE_STATE.COMPLETED):
+    return RunStageStateChanged(stage_id=stage_id, new_state=state)
+
+
+def test_batch_is_handled_once_in_the_given_session(received):
+    db = object()
+    run_event = RunStateChanged(run_id=1, new_state=RUN_STATE.COMPLETED)
+
+    with event_batch(db):
+        emit_event(stage_event(1))
+        with event_batch():
+            emit_event(stage_event(2))
+        emit_event(run_event)
+        assert received == []
+
+    assert received == [([stage_event(1), stage_event(2)], db), run_event]
+
+
+def test_batch_is_dropped_on_error(received):
+    with pytest.raises(RuntimeError):
+        with event_batch(object()):
+            emit_event(stage_event(1))
+            raise RuntimeError()
+
+    assert received == []
+
+
+def test_ids_by_new_state_keeps_the_last_state():
+    assert _ids_by_new_state(
+        [
+            stage_event(1, RUN_STAGE_STATE.IN_PROGRESS),
+            stage_event(2, RUN_STAGE_STATE.IN_PROGRESS),
+            stage_event(1, RUN_STAGE_STATE.COMPLETED),
+        ],
+        "stage_id",
+    ) == {
+        RUN_STAGE_STATE.IN_PROGRESS: [2],
+        RUN_STAGE_STATE.COMPLETED: [1],
+    }
@@ -0,0 +1,62 @@
+"""
+Tests for debounced generation finalization.
+"""
+
+from mc_bench.util.finalization import (
+    clear_finalization_request,
+    request_finalization,
+)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+class FakeApp:
+    def __init__(self):
+        self.enqueued = []
+
+    def signature(self, name, args, **options):
+        app = self
+
+        class Signature:
+            def apply_async(self, countdown=None):
+                app.enqueued.append((name, args, countdown))
+
+        return Signature()
+
+
+def test_requests_are_debounced_until_the_task_starts():
+    app, redis = FakeApp(), FakeRedis()
+
+    assert request_finalization(app, 1, redis=redis, debounce_seconds=10)
+    assert not request_finalization(app, 1, redis=redis, debounce_seconds=10)
+    assert request_finalization(app, 2, redis=redis, debounce_seconds=10)
+
+    clear_finalization_request(1, redis=redis)
+    assert request_finalization(app, 1, redis=redis, debounce_seconds=10)
+
+    assert app.enqueued == [
+        ("generation.finalize_generation", [1], 10),
+        ("generation.finalize_generation", [2], 10),
+        ("generation.finalize_generation", [1], 10),
+    ]
+
+
+def test_no_debounce():
+    app = FakeApp()
+
+    assert request_finalization(app, 1, debounce_seconds=0)
+    assert request_finalization(app, 1, debounce_seconds=0)
+
+    assert app.enqueued == [("generation.finalize_generation", [1], None)] * 2
@@ -0,0 +1,185 @@
+"""
+Tests for fused stage tasks, which run consecutive run stages in one task.
+"""
+
+from contextlib import contextmanager
+
+import pytest
+from celery import Celery
+
+import mc_bench.worker.run_stage as run_stage
+from mc_bench.constants import RUN_STAGE_STATE
+
+
+class FakeScalars(list):
+    def all(self):
+        return list(self)
+
+
+class FakeDb:
+    """Answers the queries of a fused task: the completed stage slugs of the run,
+    then the ids of the stages it resets, or the completed stage slugs again when
+    the task runs again."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+
+    def scalars(self, statement):
+        return FakeScalars(self.results.pop(0))
+
+
+class Stage:
+    def __init__(self, slug):
+        self.SLUG = slug
+
+
+FIRST, SECOND, THIRD = Stage("FIRST"), Stage("SECOND"), Stage("THIRD")
+
+
+@pytest.fixture
+def fused(monkeypatch):
+    """Build a fused task over FIRST, SECOND and THIRD with the given runners."""
+    events = []
+
+    @contextmanager
+    def event_batch(db=None):
+        yield
+
+    monkeypatch.setattr(run_stage, "event_batch", event_batch)
+    monkeypatch.setattr(run_stage, "emit_event", events.append)
+    monkeypatch.setattr(run_stage, "run_stage_state_id_for", lambda db, state: 1)
+
+    def make(runners, completed_slugs=(), stage_ids=(), results=None):
+        db = FakeDb(*(results or [list(completed_slugs), list(stage_ids)]))
+
+        @contextmanager
+        def managed_session():
+            yield db
+
+        monkeypatch.setattr(run_stage, "managed_session", managed_session)
+        for slug, runner in runners.items():
+            monkeypatch.setitem(run_stage._stage_runners, slug, runner)
+
+        app = Celery("tests")
+        task = run_stage.fused_stage_task(
+            "tests.fused", app, [FIRST, SECOND, THIRD], max_retries=3
+        )
+        return task, events
+
+    return make
+
+
+def succeed(name, calls):
+    def runner(task, metadata):
+        calls.append(name)
+        return {**metadata, "stages": metadata.get("stages", []) + [name]}
+
+    return runner
+
+
+def test_runs_stages_in_order(fused):
+    calls = []
+    task, events = fused(
+        {slug: succeed(slug, calls) for slug in ["FIRST", "SECOND", "THIRD"]}
+    )
+
+    result = task.apply(args=[{"run_id": 1, "sample_id": 2}])
+
+    assert result.get() == {
+        "run_id": 1,
+        "sample_id": 2,
+        "stages": ["FIRST", "SECOND", "THIRD"],
+    }
+    assert events == []
+
+
+def test_skips_stages_completed_by_an_earlier_attempt(fused):
+    calls = []
+    task, _ = fused(
+        {slug: succeed(slug, calls) for slug in ["FIRST", "SECOND", "THIRD"]},
+        completed_slugs=["FIRST"],
+    )
+
+    task.apply(args=[{"run_id": 1, "sample_id": 2}]).get()
+
+    assert calls == ["SECOND", "THIRD"]
+
+
+def test_failure_resets_the_following_stages_to_pending(fused):
+    calls = []
+
+    def fail(task, metadata):
+        raise RuntimeError("stage failed")
+
+    task, events = fused(
+        {
+            "FIRST": succeed("FIRST", calls),
+            "SECOND": fail,
+            "THIRD": succeed("THIRD", calls),
+        },
+        stage_ids=[30],
+    )
+
+    result = task.apply(args=[{"run_id": 1, "sample_id": 2}])
+
+    assert isinstance(result.result, RuntimeError)
+    assert calls == ["FIRST"]
+    assert [(event.stage_id, event.new_state) for event in events] == [
+        (30, RUN_STAGE_STATE.PENDING)
+    ]
+
+
+def test_inner_retry_without_retries_fails_the_fused_task(fused):
+    """Stage tasks that fail for good call `self.retry(max_retries=0)`, which
+    raises the original error from under the fused task instead of retrying it."""
+    calls = []
+
+    def fail_for_good(task, metadata):
+        try:
+            raise ValueError("invalid code")
+        except ValueError as e:
+            task.retry(args=[metadata], exc=e, max_retries=0)
+
+    task, events = fused(
+        {
+            "FIRST": fail_for_good,
+            "SECOND": succeed("SECOND", calls),
+            "THIRD": succeed("THIRD", calls),
+        },
+        stage_ids=[20, 30],
+    )
+
+    result = task.apply(args=[{"run_id": 1, "sample_id": 2}])
+
+    assert isinstance(result.result, ValueError)
+    assert result.state == "FAILURE"
+    assert calls == []
+    assert [event.stage_id for event in events] == [20, 30]
+
+
+def test_inner_retry_keeps_the_following_stages(fused):
+    """Eager tasks run their retries at once, so the fused task runs again from
+    SECOND within the same `apply`."""
+    calls = []
+    second = succeed("SECOND", calls)
+
+    def retry_once(task, metadata):
+        if "SECOND" not in calls:
+            calls.append("SECOND")
+            task.retry(args=[metadata], exc=RuntimeError("rate limited"))
+        return second(task, metadata)
+
+    task, events = fused(
+        {
+            "FIRST": succeed("FIRST", calls),
+            "SECOND": retry_once,
+            "THIRD": succeed("THIRD", calls),
+        },
+        results=[[], ["FIRST"], [30]],
+    )
+
+    result = task.apply(args=[{"run_id": 1, "sample_id": 2}])
+
+    assert result.state == "SUCCESS"
+    assert calls == ["FIRST", "SECOND", "SECOND", "THIRD"]
+    assert events == []
@@ -0,0 +1,117 @@
+"""
+Tests for the digest-pinned Docker image cache.
+"""
+
+import docker
+import pytest
+
+from mc_bench.minecraft.server.images import ImageCache
+
+IMAGE = "registry.example.com/builder:latest"
+DIGEST = "sha256:" + "a" * 64
+NEW_DIGEST = "sha256:" + "b" * 64
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        values = dict(mapping or {})
+        if field is not None:
+            values[field] = value
+        self.hashes.setdefault(key, {}).update(
+            {k.encode("utf-8"): str(v).encode("utf-8") for k, v in values.items()}
+        )
+
+
+class FakeRegistryData:
+    def __init__(self, digest):
+        self.id = digest
+
+
+class FakeImages:
+    def __init__(self, digest=DIGEST, present=()):
+        self.digest = digest
+        self.present = set(present)
+        self.pulled = []
+        self.registry_calls = 0
+
+    def get_registry_data(self, image):
+        self.registry_calls += 1
+        if self.digest is None:
+            raise docker.errors.APIError("registry unreachable")
+        return FakeRegistryData(self.digest)
+
+    def get(self, reference):
+        if reference not in self.present:
+            raise docker.errors.ImageNotFound(reference)
+
+    def pull(self, reference):
+        self.pulled.append(reference)
+        self.present.add(reference)
+
+
+class FakeDocker:
+    def __init__(self, images):
+        self.images = images
+
+    def info(self):
+        return {"ID": "host-1"}
+
+
+def make_cache(images, redis=None, refresh_interval=300):
+    return ImageCache(
+        redis or FakeRedis(),
+        refresh_interval=refresh_interval,
+        client=FakeDocker(images),
+    )
+
+
+def test_pins_and_pulls_the_digest_once():
+    images = FakeImages()
+    cache = make_cache(images)
+
+    assert cache.resolve(IMAGE) == f"registry.example.com/builder@{DIGEST}"
+    assert cache.resolve(IMAGE) == f"registry.example.com/builder@{DIGEST}"
+
+    assert images.pulled == [f"registry.example.com/builder@{DIGEST}"]
+    assert images.registry_calls == 1
+    assert cache.pinned() == {IMAGE: f"registry.example.com/builder@{DIGEST}"}
+
+
+def test_refreshes_the_digest_after_the_interval():
+    redis = FakeRedis()
+    make_cache(FakeImages(), redis=redis).resolve(IMAGE)
+
+    images = FakeImages(digest=NEW_DIGEST)
+    cache = make_cache(images, redis=redis, refresh_interval=0)
+
+    assert cache.resolve(IMAGE) == f"registry.example.com/builder@{NEW_DIGEST}"
+    assert images.pulled == [f"registry.example.com/builder@{NEW_DIGEST}"]
+
+
+def test_uses_the_last_known_digest_when_the_registry_fails():
+    redis = FakeRedis()
+    make_cache(FakeImages(), redis=redis).resolve(IMAGE)
+
+    images = FakeImages(digest=None, present=[f"registry.example.com/builder@{DIGEST}"])
+    cache = make_cache(images, redis=redis, refresh_interval=0)
+
+    assert cache.resolve(IMAGE) == f"registry.example.com/builder@{DIGEST}"
+    assert images.pulled == []
+
+
+def test_falls_back_to_the_local_tag_without_a_known_digest():
+    images = FakeImages(digest=None, present=[IMAGE])
+
+    assert make_cache(images).resolve(IMAGE) == IMAGE
+    assert images.pulled == []
+
+
+def test_raises_without_a_digest_or_local_image():
+    with pytest.raises(docker.errors.ImageNotFound):
+        make_cache(FakeImages(digest=None)).resolve(IMAGE)
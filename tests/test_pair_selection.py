@@ -0,0 +1,64 @@
+"""
+Tests for the information-gain pair selection utilities.
+"""
+
+import numpy as np
+
+from mc_bench.util.pair_selection import (
+    MIN_SCORE,
+    information_gain_scores,
+    select_weighted,
+)
+
+
+def _scores(**overrides):
+    features = dict(
+        rating_1=np.array([1000.0]),
+        rating_2=np.array([1000.0]),
+        model_votes_1=np.array([0.0]),
+        model_votes_2=np.array([0.0]),
+        sample_votes_1=np.array([0.0]),
+        sample_votes_2=np.array([0.0]),
+        prompt_votes=np.array([0.0]),
+    )
+    features.update({key: np.array([value]) for key, value in overrides.items()})
+    return information_gain_scores(**features)[0]
+
+
+def test_close_ratings_score_higher():
+    """Evenly matched pairs are more informative than lopsided ones."""
+    assert _scores(rating_2=1000.0) > _scores(rating_2=1400.0)
+
+
+def test_fewer_votes_score_higher():
+    """Pairs with little voting history are more informative."""
+    assert _scores(model_votes_1=0, model_votes_2=0) > _scores(
+        model_votes_1=500, model_votes_2=500
+    )
+    assert _scores(prompt_votes=0) > _scores(prompt_votes=500)
+
+
+def test_scores_have_a_floor():
+    """Even certain outcomes keep a small chance of being picked."""
+    assert _scores(rating_2=5000.0) == MIN_SCORE
+
+
+def test_select_weighted_returns_distinct_indices():
+    scores = np.array([1.0, 2.0, 3.0, 4.0, 5.0])
+    selected = select_weighted(scores, 3, rng=np.random.default_rng(0))
+    assert len(selected) == 3
+    assert len(set(selected.tolist())) == 3
+
+
+def test_select_weighted_caps_count():
+    scores = np.array([1.0, 2.0])
+    assert len(select_weighted(scores, 5)) == 2
+    assert len(select_weighted(scores, 0)) == 0
+
+
+def test_select_weighted_prefers_high_scores():
+    """Heavily weighted candidates are selected far more often."""
+    rng = np.random.default_rng(42)
+    scores = np.array([MIN_SCORE, 1.0])
+    picks = [select_weighted(scores, 1, rng=rng)[0] for _ in range(200)]
+    assert picks.count(1) > 190
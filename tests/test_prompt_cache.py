@@ -0,0 +1,165 @@
+"""
+Tests for reusing provider responses from the prompt cache.
+"""
+
+import io
+
+from minio.error import S3Error
+from sqlalchemy.sql import Update
+
+from mc_bench.models.prompt_cache import PromptCache, PromptResponse, response_hash
+
+
+class FakeObject(io.BytesIO):
+    def release_conn(self):
+        pass
+
+
+class FakeObjectClient:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, bucket_name, object_name, data, length):
+        self.objects[(bucket_name, object_name)] = data.read()
+
+    def get_object(self, bucket_name, object_name):
+        if (bucket_name, object_name) not in self.objects:
+            raise S3Error(
+                code="NoSuchKey",
+                message="missing",
+                resource=object_name,
+                request_id="",
+                host_id="",
+                response=None,
+            )
+        return FakeObject(self.objects[(bucket_name, object_name)])
+
+
+class FakeScalars(list):
+    def all(self):
+        return list(self)
+
+
+class FakeDb:
+    """Keeps the cache entries of one prompt, and answers the queries and updates
+    of the prompt cache from them."""
+
+    def __init__(self):
+        self.entries = []
+        self.locks = 0
+
+    def scalars(self, statement):
+        if statement.column_descriptions[0]["name"] == "response_hash":
+            return FakeScalars(entry.response_hash for entry in self.entries)
+        return FakeScalars(
+            sorted(self.entries, key=lambda entry: (entry.uses, entry.id))
+        )
+
+    def execute(self, statement):
+        if isinstance(statement, Update):
+            entry_id = statement.whereclause.right.value
+            for entry in self.entries:
+                if entry.id == entry_id:
+                    entry.uses += 1
+        else:
+            self.locks += 1
+
+    def add(self, entry):
+        entry.id = len(self.entries) + 1
+        entry.uses = 0
+        self.entries.append(entry)
+
+    def flush(self):
+        pass
+
+
+class FakeProvider:
+    provider_class = "FAKE"
+    config = {"model": "fake", "temperature": 1}
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.prompts = []
+
+    def execute_prompt(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return self.responses.pop(0)
+
+
+def make_cache(responses=2):
+    db = FakeDb()
+    cache = PromptCache(db, "bucket", responses=responses, client=FakeObjectClient())
+    return cache, db
+
+
+def test_asks_the_provider_until_the_prompt_has_enough_responses():
+    cache, db = make_cache(responses=2)
+    provider = FakeProvider(["first", "second"])
+
+    assert cache.execute_prompt(provider, "build a house") == ("first", False)
+    assert cache.execute_prompt(provider, "build a house") == ("second", False)
+    assert cache.execute_prompt(provider, "build a house") == ("first", True)
+
+    assert provider.prompts == ["build a house", "build a house"]
+    assert [entry.response_hash for entry in db.entries] == [
+        response_hash("first"),
+        response_hash("second"),
+    ]
+
+
+def test_reuses_the_least_used_response():
+    cache, db = make_cache(responses=2)
+    provider = FakeProvider(["first", "second"])
+    cache.execute_prompt(provider, "build a house")
+    cache.execute_prompt(provider, "build a house")
+
+    responses = [cache.execute_prompt(provider, "build a house")[0] for _ in range(4)]
+
+    assert responses == ["first", "second", "first", "second"]
+    assert [entry.uses for entry in db.entries] == [2, 2]
+
+
+def test_keeps_a_response_once():
+    cache, db = make_cache(responses=2)
+    provider = FakeProvider(["same", "same", "other"])
+
+    cache.execute_prompt(provider, "build a house")
+    cache.execute_prompt(provider, "build a house")
+    cache.execute_prompt(provider, "build a house")
+
+    assert [entry.response_hash for entry in db.entries] == [
+        response_hash("same"),
+        response_hash("other"),
+    ]
+    assert db.locks == 3
+
+
+def test_does_not_reuse_excluded_responses():
+    cache, db = make_cache(responses=1)
+    provider = FakeProvider(["failed", "fresh"])
+    cache.execute_prompt(provider, "build a house")
+
+    response, cached = cache.execute_prompt(
+        provider, "build a house", exclude={response_hash("failed")}
+    )
+
+    assert (response, cached) == ("fresh", False)
+    assert len(db.entries) == 1
+
+
+def test_missing_object_is_a_miss():
+    cache, db = make_cache(responses=1)
+    db.add(
+        PromptResponse(
+            cache_key="prompt",
+            provider_class="FAKE",
+            config={},
+            bucket="bucket",
+            key="missing",
+            response_hash=response_hash("lost"),
+        )
+    )
+    provider = FakeProvider(["fresh"])
+
+    assert cache.execute_prompt(provider, "build a house") == ("fresh", False)
+    assert db.entries[0].uses == 0
@@ -0,0 +1,98 @@
+"""
+Tests for the failure handling of run stage tasks.
+"""
+
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from celery import Celery
+from sqlalchemy.exc import OperationalError, PendingRollbackError
+
+import mc_bench.worker.run_stage as run_stage
+from mc_bench.constants import RUN_STAGE_STATE, RUN_STATE
+
+
+class FakeDb:
+    """Session that refuses to write after an error until it is rolled back."""
+
+    def __init__(self):
+        self.aborted = False
+
+    def fail(self):
+        self.aborted = True
+        raise OperationalError("UPDATE sample", {}, Exception("connection lost"))
+
+    def check(self):
+        if self.aborted:
+            raise PendingRollbackError("Can't reconnect until invalid transaction")
+
+    def commit(self):
+        self.check()
+
+    def add(self, instance):
+        self.check()
+
+    def rollback(self):
+        self.aborted = False
+
+
+class FakeStageContext:
+    def __init__(self, db, **kwargs):
+        self.db = db
+        self.stage_id = 10
+        self.run = SimpleNamespace(
+            id=1, generation_id=None, samples=[], external_id="x"
+        )
+        self.run_stage = SimpleNamespace(task_id="task")
+        self.sample = SimpleNamespace(is_complete=None, is_pending=None)
+
+    def reset_stage_progress(self):
+        pass
+
+
+def test_database_error_still_fails_the_stage(monkeypatch):
+    db = FakeDb()
+    events = []
+
+    @contextmanager
+    def managed_session():
+        yield db
+
+    @contextmanager
+    def event_batch(session=None):
+        if session is not None:
+            session.check()
+        yield
+
+    monkeypatch.setattr(run_stage, "managed_session", managed_session)
+    monkeypatch.setattr(run_stage, "event_batch", event_batch)
+    monkeypatch.setattr(run_stage, "emit_event", events.append)
+    monkeypatch.setattr(run_stage, "Client", lambda token: None)
+    monkeypatch.setattr(
+        run_stage,
+        "StageContext",
+        lambda admin_api_client, db, **kwargs: FakeStageContext(db, **kwargs),
+    )
+    monkeypatch.setattr(
+        run_stage,
+        "get_heartbeat_service",
+        lambda: SimpleNamespace(register=lambda _: None, unregister=lambda _: None),
+    )
+
+    app = Celery("tests")
+    stage = SimpleNamespace(SLUG="FAILING_STAGE")
+
+    @run_stage.run_stage_task(name="tests.failing", app=app, stage=stage)
+    def failing(stage_context):
+        stage_context.db.fail()
+
+    result = failing.apply(
+        args=[{"run_id": 1, "sample_id": 2}], headers={"token": "token"}
+    )
+
+    assert isinstance(result.result, OperationalError)
+    assert [getattr(event, "new_state", None) for event in events] == [
+        RUN_STAGE_STATE.IN_PROGRESS,
+        RUN_STAGE_STATE.FAILED,
+        RUN_STATE.FAILED,
+    ]
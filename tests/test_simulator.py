@@ -0,0 +1,111 @@
+"""
+Tests for the headless build simulator.
+"""
+
+import gzip
+import io
+
+import pytest
+from nbt import nbt
+
+from mc_bench.minecraft.simulator import BuildSimulator
+
+
+@pytest.fixture(scope="module")
+def simulator():
+    return BuildSimulator("1.21.1").run(
+        [
+            "/fill 0 0 0 4 3 4 minecraft:stone hollow",
+            "/fill 0 0 0 4 0 4 minecraft:dirt replace minecraft:stone",
+            "/setblock 2 1 2 minecraft:oak_stairs[facing=east] [replace]",
+            "/setblock 2 1 2 minecraft:glass [keep]",
+            "/fillbiome 0 0 0 1 1 1 minecraft:desert",
+            "/setblock 1 1 1 minecraft:not_a_block",
+            "/setblock 1 2 1 minecraft:oak_log[axis=q]",
+            "/fill 0 0 0 100 100 100 minecraft:stone",
+        ]
+    )
+
+
+def test_fill_modes(simulator):
+    assert simulator.block_at(0, 0, 0) == "minecraft:dirt"
+    assert simulator.block_at(0, 2, 0) == "minecraft:stone"
+    assert simulator.block_at(1, 2, 1) == "minecraft:air"
+
+
+def test_block_states_are_completed_with_defaults(simulator):
+    assert simulator.block_at(2, 1, 2) == (
+        "minecraft:oak_stairs[facing=east,half=bottom,shape=straight,waterlogged=false]"
+    )
+
+
+def test_biome_fill(simulator):
+    assert simulator.biome_at(1, 1, 1) == "minecraft:desert"
+    assert simulator.biome_at(2, 2, 2) == "minecraft:plains"
+
+
+def test_rejected_commands(simulator):
+    rejected = [command for command, _ in simulator.errors]
+    assert rejected == [
+        "/setblock 1 1 1 minecraft:not_a_block",
+        "/setblock 1 2 1 minecraft:oak_log[axis=q]",
+        "/fill 0 0 0 100 100 100 minecraft:stone",
+    ]
+
+
+def test_artifacts(simulator):
+    assert simulator.summary()["boundingBox"] == {
+        "min": {"x": 0, "y": 0, "z": 0},
+        "max": {"x": 100, "y": 100, "z": 100},
+    }
+    # Rejected commands are recorded too, as the builder sends them all
+    assert [command["kind"] for command in simulator.commands] == [
+        "fill",
+        "fill",
+        "setblock",
+        "setblock",
+        "fill",
+        "setblock",
+        "setblock",
+        "fill",
+    ]
+
+
+def test_schematic(simulator):
+    data = gzip.decompress(simulator.schematic_bytes())
+    schematic = nbt.NBTFile(buffer=io.BytesIO(data))["Schematic"]
+    width, height, length = (
+        schematic[name].value for name in ("Width", "Height", "Length")
+    )
+    assert (width, height, length) == (101, 101, 101)
+
+    def container(name):
+        palette = {tag.name: tag.value for tag in schematic[name]["Palette"].tags}
+        names = {palette_id: state for state, palette_id in palette.items()}
+        # Every palette id fits in a single varint byte here
+        data = schematic[name]["Data"].value
+
+        def at(x, y, z):
+            return names[data[x + z * width + y * width * length]]
+
+        return palette, at
+
+    block_palette, block_at = container("Blocks")
+    assert set(block_palette) == {
+        "minecraft:air",
+        "minecraft:stone",
+        "minecraft:dirt",
+        "minecraft:glass",
+        simulator.block_at(2, 1, 2),
+    }
+    assert block_palette["minecraft:air"] == 0
+    assert block_at(0, 0, 0) == "minecraft:dirt"
+    assert block_at(0, 2, 0) == "minecraft:stone"
+    assert block_at(1, 2, 1) == "minecraft:air"
+    assert block_at(50, 50, 50) == "minecraft:air"
+    assert block_at(2, 1, 2) == simulator.block_at(2, 1, 2)
+
+    biome_palette, biome_at = container("Biomes")
+    assert set(biome_palette) == {"minecraft:plains", "minecraft:desert"}
+    assert biome_at(1, 1, 1) == "minecraft:desert"
+    assert biome_at(2, 2, 2) == "minecraft:plains"
@@ -0,0 +1,67 @@
+"""
+Tests for waiting on prompts run on the prompt runner.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+
+import pytest
+
+from mc_bench.clients.streaming import PromptRunner
+
+
+def test_on_wait_runs_on_the_waiting_thread():
+    runner = PromptRunner()
+    threads = set()
+
+    async def slow_response():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    result = runner.run(
+        slow_response(),
+        on_wait=lambda: threads.add(threading.get_ident()),
+        wait_interval=0.01,
+    )
+
+    assert result == "done"
+    assert threads == {threading.get_ident()}
+
+
+class SoftTimeLimit(Exception):
+    pass
+
+
+def hanging_response(cancelled):
+    async def response():
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    return response()
+
+
+def test_timeout_cancels_the_prompt():
+    runner = PromptRunner()
+    cancelled = threading.Event()
+
+    with pytest.raises(concurrent.futures.TimeoutError):
+        runner.run(hanging_response(cancelled), timeout=0.05)
+
+    assert cancelled.wait(1)
+
+
+def test_exception_while_waiting_cancels_the_prompt():
+    runner = PromptRunner()
+    cancelled = threading.Event()
+
+    def on_wait():
+        raise SoftTimeLimit()
+
+    with pytest.raises(SoftTimeLimit):
+        runner.run(hanging_response(cancelled), on_wait=on_wait, wait_interval=0.01)
+
+    assert cancelled.wait(1)